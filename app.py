@@ -1,19 +1,30 @@
-import pytz
+import argparse
+import datetime
+import functools
+import json
+import shlex
+import sys
 
 from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional
 
 from modules.config import Config
 from modules.database import Database
 from modules.enums import MenuFunctionalities
-from modules.menu import Menu, MenuFunctions
+from modules.menu import Menu, MenuFunctions, Page
+from modules.timezones import TimezoneService
+
+
+# The modules behind the import, export, restore, report, batch, serve,
+# benchmark and startup subcommands are imported by the subcommand that
+# uses them to keep startup short.
 
 
 class Main:
 
     @classmethod
     def main(cls, config_path: Optional[Path] = None,
-             timezone: pytz.BaseTzInfo = None, indent: int = 2):
+             timezone: datetime.tzinfo = None, indent: int = 2):
 
         Config.load_configs(config_path=config_path)
         Database.connect_to_database()
@@ -45,7 +56,12 @@ class Main:
                 )
             elif user_input == \
                     MenuFunctionalities.VIEW_ALL_USERS.value:
-                MenuFunctions.view_all_users(indent=2*indent)
+                cls.__browse_pages(
+                    view_page=functools.partial(
+                        MenuFunctions.view_all_users, indent=2*indent,
+                        page_size=MenuFunctions.PAGE_SIZE
+                    )
+                )
             elif user_input == \
                     MenuFunctionalities.VIEW_UPCOMMING_MOVIES.value:
                 MenuFunctions.view_upcomming_movies(
@@ -53,8 +69,11 @@ class Main:
                 )
             elif user_input == \
                     MenuFunctionalities.VIEW_ALL_MOVIES.value:
-                MenuFunctions.view_all_movies(
-                    timezone=timezone, indent=2*indent
+                cls.__browse_pages(
+                    view_page=functools.partial(
+                        MenuFunctions.view_all_movies, timezone=timezone,
+                        indent=2*indent, page_size=MenuFunctions.PAGE_SIZE
+                    )
                 )
             elif user_input == \
                     MenuFunctionalities.VIEW_WATCHED_MOVIES.value:
@@ -66,17 +85,445 @@ class Main:
             elif user_input == \
                     MenuFunctionalities.SEARCH_MOVIE.value:
                 search_term = input("Input the partial movie title: ")
-                MenuFunctions.search_movie(
+                page_size = MenuFunctions.SEARCH_PAGE_SIZE
+                offset = 0
+                while MenuFunctions.search_movie(
                     search_term=search_term, timezone=timezone,
+                    indent=2*indent, limit=page_size, offset=offset
+                ).count == page_size and \
+                        input("Show more results? (y/n): ") == "y":
+                    offset += page_size
+            elif user_input == \
+                    MenuFunctionalities.RECOMMEND_MOVIES.value:
+                username = input("Username: ")
+                MenuFunctions.recommend_movies(
+                    username=username, timezone=timezone,
                     indent=2*indent
                 )
+            elif user_input == \
+                    MenuFunctionalities.VIEW_MOST_WATCHED_MOVIES.value:
+                MenuFunctions.view_most_watched_movies(indent=2*indent)
+            elif user_input == \
+                    MenuFunctionalities.VIEW_MOST_ACTIVE_USERS.value:
+                MenuFunctions.view_most_active_users(indent=2*indent)
+            elif user_input == MenuFunctionalities.\
+                    VIEW_WATCHES_PER_RELEASE_MONTH.value:
+                MenuFunctions.view_watches_per_release_month(indent=2*indent)
             else:
                 print("Invalid input please try again.")
 
+    @staticmethod
+    def __browse_pages(view_page: Callable[..., Page] = None) -> None:
+        page = view_page()
+        while page.count > 0:
+            choice = input("Next page (n), previous page (p) "
+                           "or back to menu (q): ")
+            if choice == "n":
+                next_page = view_page(after=page.last_key)
+            elif choice == "p":
+                next_page = view_page(before=page.first_key)
+            else:
+                break
+            if next_page.count == 0:
+                print("No more pages.")
+            else:
+                page = next_page
+
+    @classmethod
+    def import_data(cls, table: str = None, path: Path = None,
+                    file_format: Optional[str] = None,
+                    chunk_size: Optional[int] = None,
+                    config_path: Optional[Path] = None,
+                    timezone: datetime.tzinfo = None) -> None:
+        from modules.importer import Importer
+
+        if chunk_size is None:
+            chunk_size = Importer.DEFAULT_CHUNK_SIZE
+
+        Config.load_configs(config_path=config_path)
+        Database.connect_to_database()
+
+        report = Importer.import_file(
+            table=table, path=path, file_format=file_format,
+            chunk_size=chunk_size, timezone=timezone
+        )
+        print(report)
+
+    @classmethod
+    def export_data(cls, directory: Path = None,
+                    file_format: Optional[str] = None,
+                    columnar: bool = False, compress: bool = True,
+                    chunk_size: Optional[int] = None,
+                    config_path: Optional[Path] = None) -> None:
+        from modules.exporter import Exporter
+
+        if file_format is None:
+            file_format = "jsonl"
+        if chunk_size is None:
+            chunk_size = Exporter.DEFAULT_CHUNK_SIZE
+
+        Config.load_configs(config_path=config_path)
+        Database.connect_to_database()
+
+        report = Exporter.export(
+            directory=directory, file_format=file_format, compress=compress,
+            columnar=columnar, chunk_size=chunk_size
+        )
+        print(report)
+
+    @classmethod
+    def restore_data(cls, directory: Path = None,
+                     chunk_size: Optional[int] = None,
+                     config_path: Optional[Path] = None) -> None:
+        from modules.importer import Importer
+
+        if chunk_size is None:
+            chunk_size = Importer.DEFAULT_CHUNK_SIZE
+
+        Config.load_configs(config_path=config_path)
+        Database.connect_to_database()
+
+        for report in Importer.restore(directory=directory,
+                                       chunk_size=chunk_size):
+            print(report)
+
+    @classmethod
+    def report(cls, output_path: Optional[Path] = None,
+               workers: Optional[int] = None,
+               shard_size: Optional[int] = None,
+               config_path: Optional[Path] = None) -> None:
+        from modules.reports import ReportRunner
+
+        if shard_size is None:
+            shard_size = ReportRunner.DEFAULT_SHARD_SIZE
+
+        Config.load_configs(config_path=config_path)
+        Config.WATCHLIST_ENGINE = {**Config.WATCHLIST_ENGINE,
+                                   "enabled": False}
+        Database.connect_to_database(read_only=True)
+
+        runner = ReportRunner(workers=workers, shard_size=shard_size,
+                              config_path=config_path)
+        try:
+            if output_path is None:
+                summary = runner.write_watched_movies(output=sys.stdout)
+            else:
+                with open(file=output_path, mode="w") as output_file:
+                    summary = runner.write_watched_movies(output=output_file)
+        finally:
+            Database.close_database()
+        print(summary, file=sys.stderr)
+
+    @classmethod
+    def batch(cls, path: Optional[Path] = None,
+              batch_size: Optional[int] = None,
+              config_path: Optional[Path] = None,
+              timezone: datetime.tzinfo = None) -> bool:
+        from modules.batch import BatchRunner
+
+        if batch_size is None:
+            batch_size = BatchRunner.DEFAULT_BATCH_SIZE
+
+        Config.load_configs(config_path=config_path)
+        Database.connect_to_database()
+
+        runner = BatchRunner(timezone=timezone, batch_size=batch_size)
+        if path is None:
+            return runner.run(lines=sys.stdin)
+        with open(file=path, mode="r") as input_file:
+            return runner.run(lines=input_file)
+
+    @classmethod
+    def run(cls, command: str = None, arguments: List[str] = None,
+            config_path: Optional[Path] = None,
+            timezone: datetime.tzinfo = None) -> bool:
+        from modules.batch import BatchRunner
+
+        Config.load_configs(config_path=config_path)
+        Database.connect_to_database()
+
+        runner = BatchRunner(timezone=timezone)
+        return runner.run(lines=[shlex.join([command, *arguments])])
+
+    @classmethod
+    def serve(cls, host: Optional[str] = None, port: Optional[int] = None,
+              workers: Optional[int] = None, verbose: bool = False,
+              config_path: Optional[Path] = None,
+              timezone: datetime.tzinfo = None) -> None:
+        from modules.server import ApiServer
+
+        if host is None:
+            host = ApiServer.DEFAULT_HOST
+        if port is None:
+            port = ApiServer.DEFAULT_PORT
+
+        Config.load_configs(config_path=config_path)
+        Database.connect_to_database()
+
+        server = ApiServer(host=host, port=port, timezone=timezone,
+                           max_workers=workers, verbose=verbose)
+        print(f"Serving on http://{host}:{server.server_port}",
+              file=sys.stderr)
+        # The database reports failed inserts on stdout, which belongs to
+        # nobody while serving.
+        sys.stdout = sys.stderr
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            Database.close_database()
+
+    @classmethod
+    def benchmark(cls, movies: Optional[int] = None,
+                  users: Optional[int] = None,
+                  watch_events: Optional[int] = None,
+                  iterations: Optional[int] = None,
+                  database_path: Optional[Path] = None,
+                  output_path: Optional[Path] = None,
+                  config_path: Optional[Path] = None,
+                  timezone: datetime.tzinfo = None) -> None:
+        from modules.benchmark import Benchmark
+
+        # Generating into an existing database would mix its rows into the
+        # measurements, or destroy them.
+        if database_path is not None and database_path.exists():
+            raise ValueError(f"{database_path} already exists")
+
+        scale = {
+            "movies": movies, "users": users, "watch_events": watch_events,
+            "iterations": iterations,
+        }
+        scale = {name: value for name, value in scale.items()
+                 if value is not None}
+
+        # Only the performance profile is taken from the config, the
+        # benchmark always runs on its own database.
+        Config.load_configs(config_path=config_path)
+
+        benchmark = Benchmark(timezone=timezone, **scale)
+        results = benchmark.run(database_path=database_path)
+        Benchmark.dump(results=results, output_path=output_path)
+
+    @classmethod
+    def startup(cls, runs: Optional[int] = None, top: Optional[int] = None,
+                budget_ms: Optional[float] = None,
+                config_path: Optional[Path] = None) -> bool:
+        from modules.startup import StartupProfiler
+
+        if runs is None:
+            runs = StartupProfiler.DEFAULT_RUNS
+        if top is None:
+            top = StartupProfiler.DEFAULT_TOP
+
+        profiler = StartupProfiler(runs=runs, top=top,
+                                   config_path=config_path)
+        report = profiler.run()
+        print(json.dumps(report, indent=2))
+        if budget_ms is not None and report["process_ms"] > budget_ms:
+            print(f"Startup took {report['process_ms']:.1f}ms, over the "
+                  f"budget of {budget_ms:.1f}ms.", file=sys.stderr)
+            return False
+        return True
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="A simple cli-based movie watchlist application."
+    )
+    parser.add_argument("--config", type=Path, default=None,
+                        help="Path to the config file.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    import_parser = subparsers.add_parser(
+        "import", help="Bulk import users, movies or watch events."
+    )
+    import_parser.add_argument("table",
+                               help="users, movies or watch_list.")
+    import_parser.add_argument("path", type=Path)
+    import_parser.add_argument("--format", dest="file_format", default=None,
+                               help="Input format, csv or jsonl, guessed "
+                                    "from the file extension when omitted.")
+    import_parser.add_argument("--chunk-size", type=int, default=None,
+                               help="Number of rows per transaction.")
+
+    export_parser = subparsers.add_parser(
+        "export", help="Export a consistent snapshot of all tables."
+    )
+    export_parser.add_argument("directory", type=Path)
+    export_parser.add_argument("--format", dest="file_format", default=None,
+                               help="Output format, csv or jsonl, jsonl "
+                                    "when omitted.")
+    export_parser.add_argument("--columnar", action="store_true",
+                               help="Write watch events as .npy arrays.")
+    export_parser.add_argument("--no-compress", dest="compress",
+                               action="store_false",
+                               help="Do not gzip the csv or jsonl files.")
+    export_parser.add_argument("--chunk-size", type=int, default=None,
+                               help="Number of rows fetched at a time.")
+
+    restore_parser = subparsers.add_parser(
+        "restore", help="Load an export into an empty database."
+    )
+    restore_parser.add_argument("directory", type=Path)
+    restore_parser.add_argument("--chunk-size", type=int, default=None,
+                                help="Number of rows per transaction.")
+
+    report_parser = subparsers.add_parser(
+        "report", help="Write the watched movies of every user as JSON "
+                       "lines, read by parallel worker processes."
+    )
+    report_parser.add_argument("--output", type=Path, default=None,
+                               help="Output file, stdout when omitted.")
+    report_parser.add_argument("--workers", type=int, default=None,
+                               help="Number of worker processes, the "
+                                    "number of cores when omitted.")
+    report_parser.add_argument("--shard-size", type=int, default=None,
+                               help="Number of users per shard.")
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Run commands from a file or stdin, one per line, "
+                      "and print one JSON result per command."
+    )
+    batch_parser.add_argument("path", type=Path, nargs="?", default=None,
+                              help="Command file, stdin when omitted.")
+    batch_parser.add_argument("--batch-size", type=int, default=None,
+                              help="Number of commands per transaction.")
+
+    run_parser = subparsers.add_parser(
+        "run", help="Run a single command and print its JSON result."
+    )
+    run_parser.add_argument("run_command", metavar="command",
+                            help="A lower cased menu entry, e.g. add_user.")
+    run_parser.add_argument("arguments", nargs="*")
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve the watchlist as a local HTTP/JSON API."
+    )
+    serve_parser.add_argument("--host", default=None,
+                              help="Address to listen on, 127.0.0.1 when "
+                                   "omitted.")
+    serve_parser.add_argument("--port", type=int, default=None,
+                              help="Port to listen on, 8000 when omitted.")
+    serve_parser.add_argument("--workers", type=int, default=None,
+                              help="Number of request threads, 64 when "
+                                   "omitted.")
+    serve_parser.add_argument("--verbose", action="store_true",
+                              help="Log every request to stderr.")
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="Time the database and menu hot paths on a "
+                          "synthetic database and print JSON results."
+    )
+    benchmark_parser.add_argument("--movies", type=int, default=None)
+    benchmark_parser.add_argument("--users", type=int, default=None)
+    benchmark_parser.add_argument("--watch-events", type=int, default=None)
+    benchmark_parser.add_argument("--iterations", type=int, default=None)
+    benchmark_parser.add_argument("--database", type=Path, default=None,
+                                  help="Where to build the synthetic "
+                                       "database, a temporary file when "
+                                       "omitted. Must not exist yet.")
+    benchmark_parser.add_argument("--output", type=Path, default=None,
+                                  help="JSON output file, stdout when "
+                                       "omitted.")
+
+    startup_parser = subparsers.add_parser(
+        "startup", help="Measure the time to start the application and "
+                        "connect to the database, with the slowest "
+                        "imports as reported by -X importtime."
+    )
+    startup_parser.add_argument("--runs", type=int, default=None,
+                                help="Number of fresh interpreters, the "
+                                     "report holds medians.")
+    startup_parser.add_argument("--top", type=int, default=None,
+                                help="Number of slowest imports to list.")
+    startup_parser.add_argument("--budget-ms", type=float, default=None,
+                                help="Exit with an error when starting a "
+                                     "process takes longer.")
+
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
     indent = 2
 
-    timezone = pytz.timezone("Iran")
+    arguments = parse_arguments()
+
+    # The subcommands load the config again, it is only read here for the
+    # timezone.
+    Config.load_configs(config_path=arguments.config)
+    timezone = TimezoneService.get_default_timezone()
 
-    Main.main(timezone=timezone, indent=indent)
+    if arguments.command == "import":
+        try:
+            Main.import_data(
+                table=arguments.table, path=arguments.path,
+                file_format=arguments.file_format,
+                chunk_size=arguments.chunk_size,
+                config_path=arguments.config, timezone=timezone
+            )
+        except ValueError as error:
+            sys.exit(f"import: {error}")
+    elif arguments.command == "export":
+        try:
+            Main.export_data(
+                directory=arguments.directory,
+                file_format=arguments.file_format,
+                columnar=arguments.columnar, compress=arguments.compress,
+                chunk_size=arguments.chunk_size, config_path=arguments.config
+            )
+        except ValueError as error:
+            sys.exit(f"export: {error}")
+    elif arguments.command == "restore":
+        try:
+            Main.restore_data(
+                directory=arguments.directory,
+                chunk_size=arguments.chunk_size, config_path=arguments.config
+            )
+        except ValueError as error:
+            sys.exit(f"restore: {error}")
+    elif arguments.command == "report":
+        Main.report(
+            output_path=arguments.output, workers=arguments.workers,
+            shard_size=arguments.shard_size, config_path=arguments.config
+        )
+    elif arguments.command == "batch":
+        succeeded = Main.batch(
+            path=arguments.path, batch_size=arguments.batch_size,
+            config_path=arguments.config, timezone=timezone
+        )
+        sys.exit(0 if succeeded else 1)
+    elif arguments.command == "run":
+        succeeded = Main.run(
+            command=arguments.run_command, arguments=arguments.arguments,
+            config_path=arguments.config, timezone=timezone
+        )
+        sys.exit(0 if succeeded else 1)
+    elif arguments.command == "serve":
+        Main.serve(
+            host=arguments.host, port=arguments.port,
+            workers=arguments.workers, verbose=arguments.verbose,
+            config_path=arguments.config, timezone=timezone
+        )
+    elif arguments.command == "benchmark":
+        try:
+            Main.benchmark(
+                movies=arguments.movies, users=arguments.users,
+                watch_events=arguments.watch_events,
+                iterations=arguments.iterations,
+                database_path=arguments.database,
+                output_path=arguments.output, config_path=arguments.config,
+                timezone=timezone
+            )
+        except ValueError as error:
+            sys.exit(f"benchmark: {error}")
+    elif arguments.command == "startup":
+        succeeded = Main.startup(
+            runs=arguments.runs, top=arguments.top,
+            budget_ms=arguments.budget_ms, config_path=arguments.config
+        )
+        sys.exit(0 if succeeded else 1)
+    else:
+        Main.main(config_path=arguments.config, timezone=timezone,
+                  indent=indent)
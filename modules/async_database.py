@@ -0,0 +1,214 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Optional, Tuple, Union
+
+from modules.config import Config
+from modules.database import Database
+
+
+class AsyncDatabase:
+
+    DEFAULT_BATCH_SIZE = 100
+    # Batches a query may read ahead of a slow consumer.
+    MAX_PENDING_BATCHES = 2
+
+    __executor = None
+
+    @classmethod
+    async def connect_to_database(cls, read_only: bool = False,
+                                  max_workers: Optional[int] = None) -> None:
+        # Every worker keeps a reader connection of the pool, so there are
+        # never more workers than readers. An in-memory database can only
+        # be used by the thread that opened it.
+        if Config.DATABASE_PATH == ":memory:":
+            max_workers = 1
+        elif max_workers is None:
+            max_workers = Config.POOL_SIZE
+        cls.__executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="database"
+        )
+        await cls.__run(Database.connect_to_database, read_only=read_only)
+
+    @classmethod
+    async def close_database(cls) -> None:
+        if cls.__executor is None:
+            return None
+        await cls.__run(Database.close_database)
+        cls.__executor.shutdown(wait=True)
+        cls.__executor = None
+
+    @classmethod
+    async def get_user_id_by_username(cls, username: str = None
+                                      ) -> Union[int, None]:
+        return await cls.__run(Database.get_user_id_by_username,
+                               username=username)
+
+    @classmethod
+    async def get_movie_id_by_title(cls, title: str = None
+                                    ) -> Union[int, None]:
+        return await cls.__run(Database.get_movie_id_by_title, title=title)
+
+    @classmethod
+    async def insert_user_to_users(cls, username: str = None) -> bool:
+        return await cls.__run(Database.insert_user_to_users,
+                               username=username)
+
+    @classmethod
+    async def insert_movie_to_movies(cls, title: str = None,
+                                     release_date_timestamp: float = None,
+                                     release_date: Optional[str] = None
+                                     ) -> bool:
+        return await cls.__run(Database.insert_movie_to_movies, title=title,
+                               release_date_timestamp=release_date_timestamp,
+                               release_date=release_date)
+
+    @classmethod
+    async def insert_watched_movie_to_watch_list(
+        cls, username: str = None, title: str = None,
+        watched_at: Optional[float] = None
+    ) -> bool:
+        return await cls.__run(Database.insert_watched_movie_to_watch_list,
+                               username=username, title=title,
+                               watched_at=watched_at)
+
+    @classmethod
+    async def submit_watched_movie(cls, username: str = None,
+                                   title: str = None,
+                                   watched_at: Optional[float] = None
+                                   ) -> bool:
+        return await cls.__run(Database.submit_watched_movie,
+                               username=username, title=title,
+                               watched_at=watched_at)
+
+    @classmethod
+    async def bulk_insert_users_to_users(cls,
+                                         usernames: Iterable[str] = None
+                                         ) -> int:
+        return await cls.__run(Database.bulk_insert_users_to_users,
+                               usernames=usernames)
+
+    @classmethod
+    async def bulk_insert_movies_to_movies(
+        cls, movies: Iterable[Tuple[str, float, Optional[str]]] = None
+    ) -> int:
+        return await cls.__run(Database.bulk_insert_movies_to_movies,
+                               movies=movies)
+
+    @classmethod
+    async def bulk_insert_watched_movies_to_watch_list(
+        cls, watched_movies: Iterable[Tuple] = None
+    ) -> int:
+        return await cls.__run(
+            Database.bulk_insert_watched_movies_to_watch_list,
+            watched_movies=watched_movies
+        )
+
+    # The select methods take the same keyword arguments as their
+    # Database counterparts and yield rows instead of returning a cursor.
+
+    @classmethod
+    def select_users_from_users(cls, batch_size: int = DEFAULT_BATCH_SIZE,
+                                **kwargs) -> AsyncIterator[sqlite3.Row]:
+        return cls.__stream(Database.select_users_from_users,
+                            batch_size=batch_size, **kwargs)
+
+    @classmethod
+    def select_movies_from_movies(cls, batch_size: int = DEFAULT_BATCH_SIZE,
+                                  **kwargs) -> AsyncIterator[sqlite3.Row]:
+        return cls.__stream(Database.select_movies_from_movies,
+                            batch_size=batch_size, **kwargs)
+
+    @classmethod
+    def select_upcomming_releases(cls, batch_size: int = DEFAULT_BATCH_SIZE,
+                                  **kwargs) -> AsyncIterator[sqlite3.Row]:
+        return cls.__stream(Database.select_upcomming_releases,
+                            batch_size=batch_size, **kwargs)
+
+    @classmethod
+    def select_user_watched_movies(cls,
+                                   batch_size: int = DEFAULT_BATCH_SIZE,
+                                   **kwargs) -> AsyncIterator[sqlite3.Row]:
+        return cls.__stream(Database.select_user_watched_movies,
+                            batch_size=batch_size, **kwargs)
+
+    @classmethod
+    def select_movie_watchers(cls, batch_size: int = DEFAULT_BATCH_SIZE,
+                              **kwargs) -> AsyncIterator[sqlite3.Row]:
+        return cls.__stream(Database.select_movie_watchers,
+                            batch_size=batch_size, **kwargs)
+
+    @classmethod
+    def select_searched_movies(cls, batch_size: int = DEFAULT_BATCH_SIZE,
+                               **kwargs) -> AsyncIterator[sqlite3.Row]:
+        return cls.__stream(Database.select_searched_movies,
+                            batch_size=batch_size, **kwargs)
+
+    @classmethod
+    def select_watch_history(cls, batch_size: int = DEFAULT_BATCH_SIZE,
+                             **kwargs) -> AsyncIterator[sqlite3.Row]:
+        return cls.__stream(Database.select_watch_history,
+                            batch_size=batch_size, **kwargs)
+
+    @classmethod
+    def select_recently_watched(cls, batch_size: int = DEFAULT_BATCH_SIZE,
+                                **kwargs) -> AsyncIterator[sqlite3.Row]:
+        return cls.__stream(Database.select_recently_watched,
+                            batch_size=batch_size, **kwargs)
+
+    @classmethod
+    async def __run(cls, function: Callable = None, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            cls.__executor, functools.partial(function, **kwargs)
+        )
+
+    @classmethod
+    async def __stream(cls, select: Callable[..., sqlite3.Cursor] = None,
+                       batch_size: int = DEFAULT_BATCH_SIZE,
+                       **kwargs) -> AsyncIterator[sqlite3.Row]:
+        # A cursor belongs to the reader connection of the worker that ran
+        # the query, so one worker executes and fetches the whole query
+        # and hands batches over through a bounded queue.
+        loop = asyncio.get_running_loop()
+        batches = asyncio.Queue(maxsize=cls.MAX_PENDING_BATCHES)
+        stopped = threading.Event()
+
+        def put(item) -> None:
+            asyncio.run_coroutine_threadsafe(batches.put(item), loop).result()
+
+        def produce() -> None:
+            cursor = None
+            try:
+                cursor = select(**kwargs)
+                while not stopped.is_set():
+                    rows = cursor.fetchmany(batch_size)
+                    put(rows)
+                    if len(rows) == 0:
+                        break
+            except Exception as error:
+                put(error)
+            finally:
+                if cursor is not None:
+                    cursor.close()
+
+        producer = loop.run_in_executor(cls.__executor, produce)
+        try:
+            while True:
+                rows = await batches.get()
+                if isinstance(rows, Exception):
+                    raise rows
+                if len(rows) == 0:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            # The consumer may stop early, the worker is unblocked and
+            # told to stop before the iterator closes.
+            stopped.set()
+            while not producer.done():
+                while not batches.empty():
+                    batches.get_nowait()
+                await asyncio.wait({producer}, timeout=0.01)
@@ -0,0 +1,225 @@
+import contextlib
+import datetime
+import itertools
+import json
+import shlex
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from modules.database import Database
+from modules.enums import MenuFunctionalities
+from modules.menu import MenuFunctions
+
+
+@dataclass
+class BatchCommand:
+
+    line: int
+    command: str
+    arguments: Dict = field(default_factory=dict)
+
+
+class BatchRunner:
+
+    DEFAULT_BATCH_SIZE = 1000
+
+    # Commands are the lower cased MenuFunctionalities names, the
+    # parameters are listed in the order they are given on a text line.
+    PARAMETERS = {
+        MenuFunctionalities.ADD_USER: ("username", ),
+        MenuFunctionalities.ADD_MOVIE: ("title", "release_date"),
+        MenuFunctionalities.WATCH_A_MOVIE: ("username", "title"),
+        MenuFunctionalities.VIEW_ALL_USERS: ("limit", ),
+        MenuFunctionalities.VIEW_ALL_MOVIES: ("limit", ),
+        MenuFunctionalities.VIEW_UPCOMMING_MOVIES: ("limit", "days",
+                                                    "month"),
+        MenuFunctionalities.VIEW_WATCHED_MOVIES: ("username", ),
+        MenuFunctionalities.SEARCH_MOVIE: ("search_term", "limit"),
+        MenuFunctionalities.RECOMMEND_MOVIES: ("username", "limit"),
+        MenuFunctionalities.VIEW_MOST_WATCHED_MOVIES: ("limit", ),
+        MenuFunctionalities.VIEW_MOST_ACTIVE_USERS: ("limit", ),
+        MenuFunctionalities.VIEW_WATCHES_PER_RELEASE_MONTH: (),
+    }
+    COMMANDS = tuple(functionality.name.lower()
+                     for functionality in PARAMETERS)
+
+    def __init__(self, timezone: datetime.tzinfo = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 output: Optional[TextIO] = None):
+        self.timezone = timezone
+        self.batch_size = batch_size
+        self.output = sys.stdout if output is None else output
+        self.succeeded = 0
+        self.failed = 0
+
+    def run(self, lines: Iterable[str] = None) -> bool:
+        # The messages Database prints for duplicates and unknown names
+        # go to stderr, stdout only carries one JSON result per command.
+        commands = self.parse_lines(lines=lines)
+        with contextlib.redirect_stdout(sys.stderr):
+            while batch := list(itertools.islice(commands,
+                                                 self.batch_size)):
+                self.__emit(results=self.__run_batch(batch=batch))
+        return self.failed == 0
+
+    @classmethod
+    def parse_lines(cls, lines: Iterable[str] = None
+                    ) -> Iterator[BatchCommand]:
+        for number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                yield cls.parse_line(line=line, number=number)
+            except ValueError as error:
+                yield BatchCommand(line=number, command=None,
+                                   arguments={"error": str(error)})
+
+    @classmethod
+    def parse_line(cls, line: str = None, number: int = 0) -> BatchCommand:
+        # A line is either a JSON object with a "command" key or a shell
+        # like line with positional arguments.
+        if line.startswith("{"):
+            try:
+                arguments = json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(f"Invalid JSON: {error}")
+            command = arguments.pop("command", None)
+            functionality = cls.__get_functionality(command=command)
+            unknown = set(arguments) - set(cls.PARAMETERS[functionality])
+            if unknown:
+                raise ValueError(f"Unknown arguments for {command}: "
+                                 f"{', '.join(sorted(unknown))}")
+        else:
+            command, *values = shlex.split(line)
+            functionality = cls.__get_functionality(command=command)
+            parameters = cls.PARAMETERS[functionality]
+            if len(values) > len(parameters):
+                raise ValueError(f"{command} takes at most "
+                                 f"{len(parameters)} arguments")
+            arguments = dict(zip(parameters, values))
+        return BatchCommand(line=number, command=command,
+                            arguments=arguments)
+
+    @classmethod
+    def __get_functionality(cls, command: str = None) -> MenuFunctionalities:
+        if command not in cls.COMMANDS:
+            raise ValueError(f"Unknown command {command}, expected one of "
+                             f"{', '.join(cls.COMMANDS)}")
+        return MenuFunctionalities[command.upper()]
+
+    def __run_batch(self, batch: List[BatchCommand] = None) -> List[Dict]:
+        # Results are only emitted once the transaction of their batch has
+        # been committed. A command that fails leaves the rest of its
+        # batch alone, a failed commit fails the whole batch.
+        try:
+            with Database.transaction():
+                results = [self.__run_command(command=command)
+                           for command in batch]
+        except sqlite3.Error as error:
+            results = [{"line": command.line, "command": command.command,
+                        "ok": False, "error": str(error)}
+                       for command in batch]
+        return results
+
+    def __run_command(self, command: BatchCommand = None) -> Dict:
+        result = {"line": command.line, "command": command.command}
+        if command.command is None:
+            result.update(ok=False, error=command.arguments["error"])
+            return result
+        try:
+            result.update(ok=True, result=self.execute(
+                command=command.command, **command.arguments
+            ))
+        except (KeyError, TypeError, ValueError, sqlite3.Error) as error:
+            result.update(ok=False, error=f"{type(error).__name__}: {error}")
+        return result
+
+    def execute(self, command: str = None, **arguments):
+        functionality = self.__get_functionality(command=command)
+        limit = arguments.get("limit")
+        limit = None if limit in (None, "") else int(limit)
+
+        if functionality == MenuFunctionalities.ADD_USER:
+            return {"inserted": MenuFunctions.add_user(
+                username=arguments["username"]
+            )}
+        if functionality == MenuFunctionalities.ADD_MOVIE:
+            return {"inserted": MenuFunctions.add_movie(
+                title=arguments["title"],
+                release_date_string=arguments["release_date"],
+                timezone=self.timezone
+            )}
+        if functionality == MenuFunctionalities.WATCH_A_MOVIE:
+            return {"inserted": MenuFunctions.watch_movie(
+                username=arguments["username"], title=arguments["title"]
+            )}
+        if functionality == MenuFunctionalities.VIEW_ALL_USERS:
+            cursor = Database.select_users_from_users(
+                order=True, order_by="username", ascending=True,
+                limit=limit
+            )
+        elif functionality == MenuFunctionalities.VIEW_ALL_MOVIES:
+            cursor = Database.select_movies_from_movies(
+                upcomming=False, order=True, order_by="title",
+                ascending=True, limit=limit
+            )
+        elif functionality == MenuFunctionalities.VIEW_UPCOMMING_MOVIES:
+            days = arguments.get("days")
+            month = arguments.get("month")
+            if days not in (None, ""):
+                days = int(days)
+            elif month is None:
+                days = MenuFunctions.UPCOMMING_DAYS
+            else:
+                days = None
+            if limit is None:
+                limit = MenuFunctions.UPCOMMING_LIMIT
+            cursor = Database.select_upcomming_releases(
+                timezone=self.timezone, days=days, month=month, limit=limit
+            )
+        elif functionality == MenuFunctionalities.VIEW_WATCHED_MOVIES:
+            cursor = Database.select_user_watched_movies(
+                username=arguments["username"], order=True,
+                order_by="title", ascending=True
+            )
+        elif functionality == MenuFunctionalities.SEARCH_MOVIE:
+            cursor = Database.select_searched_movies(
+                search_term=arguments["search_term"], order=True,
+                order_by="rank", ascending=True, limit=limit
+            )
+            # Rows tell matches from suggestions for a misspelled term.
+            rows = [dict(row, fuzzy=False) for row in cursor.fetchall()]
+            if rows:
+                return rows
+            # Nothing contains the search term, maybe it is misspelled.
+            cursor = Database.select_fuzzy_matched_movies(
+                search_term=arguments["search_term"],
+                limit=MenuFunctions.SUGGESTION_LIMIT if limit is None
+                else limit
+            )
+            return [dict(row, fuzzy=True) for row in cursor.fetchall()]
+        elif functionality == MenuFunctionalities.RECOMMEND_MOVIES:
+            if limit is None:
+                limit = MenuFunctions.RECOMMENDATION_LIMIT
+            cursor = Database.select_recommended_movies(
+                username=arguments["username"], limit=limit
+            )
+        elif functionality == MenuFunctionalities.VIEW_MOST_WATCHED_MOVIES:
+            cursor = Database.select_most_watched_movies(limit=limit)
+        elif functionality == MenuFunctionalities.VIEW_MOST_ACTIVE_USERS:
+            cursor = Database.select_most_active_users(limit=limit)
+        else:
+            cursor = Database.select_watch_counts_by_release_month()
+        return [dict(row) for row in cursor.fetchall()]
+
+    def __emit(self, results: List[Dict] = None) -> None:
+        for result in results:
+            if result["ok"]:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self.output.write(json.dumps(result) + "\n")
+        self.output.flush()
@@ -0,0 +1,423 @@
+import contextlib
+import datetime
+import io
+import json
+import math
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from modules.config import Config
+from modules.database import Database
+from modules.menu import MenuFunctions
+
+
+class Benchmark:
+
+    DEFAULT_MOVIES = 10000
+    DEFAULT_USERS = 1000
+    DEFAULT_WATCH_EVENTS = 100000
+    DEFAULT_ITERATIONS = 50
+    GENERATION_CHUNK_SIZE = 50000
+    # Watch events per iteration of the ingest measurements.
+    INGEST_BURST_SIZE = 100
+
+    SECONDS_PER_DAY = 86400
+    # Synthetic movies are released from fifty years ago up to two years
+    # ahead, so a few percent of them are upcomming.
+    RELEASE_DAYS_BEFORE = 50 * 365
+    RELEASE_DAYS_AFTER = 2 * 365
+    # Synthetic watch events are spread over the last year.
+    WATCH_DAYS_BEFORE = 365
+
+    def __init__(self, movies: int = DEFAULT_MOVIES,
+                 users: int = DEFAULT_USERS,
+                 watch_events: int = DEFAULT_WATCH_EVENTS,
+                 iterations: int = DEFAULT_ITERATIONS,
+                 timezone: datetime.tzinfo = None, seed: int = 0):
+        self.movies = movies
+        self.users = users
+        self.watch_events = watch_events
+        self.iterations = iterations
+        self.timezone = timezone
+        self.random = random.Random(seed)
+        self.results: Dict[str, Dict] = {}
+
+    def run(self, database_path: Optional[Path] = None) -> Dict:
+        with contextlib.ExitStack() as stack:
+            if database_path is None:
+                directory = stack.enter_context(tempfile.TemporaryDirectory())
+                database_path = Path(directory) / "benchmark.db"
+            Config.DATABASE_PATH = str(database_path)
+            Database.connect_to_database()
+            stack.callback(Database.close_database)
+
+            self.__generate()
+            self.__benchmark_database()
+            self.__benchmark_menu_functions()
+
+        return {
+            "scale": {
+                "movies": self.movies,
+                "users": self.users,
+                "watch_events": self.watch_events,
+                "iterations": self.iterations,
+            },
+            "environment": {
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+            },
+            "results": self.results,
+        }
+
+    def __generate(self) -> None:
+        now = time.time()
+        release_start = now - self.RELEASE_DAYS_BEFORE * self.SECONDS_PER_DAY
+        release_end = now + self.RELEASE_DAYS_AFTER * self.SECONDS_PER_DAY
+
+        def users() -> Iterator[str]:
+            return (f"user{index}" for index in range(self.users))
+
+        def movies() -> Iterator[Tuple[str, float, None]]:
+            for index in range(self.movies):
+                release_timestamp = self.random.uniform(release_start,
+                                                        release_end)
+                yield (f"movie {index}", release_timestamp, None)
+
+        def watch_events() -> Iterator[Tuple[str, str, float]]:
+            watch_start = now - \
+                self.WATCH_DAYS_BEFORE * self.SECONDS_PER_DAY
+            for _ in range(self.watch_events):
+                user_index = self.random.randrange(self.users)
+                movie_index = self.random.randrange(self.movies)
+                watched_at = self.random.uniform(watch_start, now)
+                yield (f"user{user_index}", f"movie {movie_index}",
+                       watched_at)
+
+        self.__measure_bulk(name="generate.bulk_insert_users_to_users",
+                            rows=users(),
+                            insert=Database.bulk_insert_users_to_users)
+        self.__measure_bulk(name="generate.bulk_insert_movies_to_movies",
+                            rows=movies(),
+                            insert=Database.bulk_insert_movies_to_movies)
+        self.__measure_bulk(
+            name="generate.bulk_insert_watched_movies_to_watch_list",
+            rows=watch_events(),
+            insert=Database.bulk_insert_watched_movies_to_watch_list
+        )
+
+    def __benchmark_database(self) -> None:
+        today_timestamp = time.time()
+        counter = iter(range(self.iterations * 3))
+
+        def insert_user() -> None:
+            Database.insert_user_to_users(username=f"new user{next(counter)}")
+
+        def insert_movie() -> None:
+            Database.insert_movie_to_movies(
+                title=f"new movie {next(counter)}",
+                release_date_timestamp=today_timestamp
+            )
+
+        def insert_watched_movie() -> None:
+            Database.insert_watched_movie_to_watch_list(
+                username=self.__random_username(),
+                title=self.__random_title()
+            )
+
+        def select_upcomming_movies() -> int:
+            return self.__consume(Database.select_movies_from_movies(
+                upcomming=True, today_timestamp=today_timestamp,
+                order=True, order_by="date", ascending=True
+            ))
+
+        def select_upcomming_releases() -> int:
+            return self.__consume(Database.select_upcomming_releases(
+                timezone=self.timezone, days=MenuFunctions.UPCOMMING_DAYS,
+                limit=MenuFunctions.UPCOMMING_LIMIT
+            ))
+
+        def select_all_movies() -> int:
+            return self.__consume(Database.select_movies_from_movies(
+                upcomming=False, order=True, order_by="title",
+                ascending=True
+            ))
+
+        def select_movies_page() -> int:
+            return self.__consume(Database.select_movies_from_movies(
+                upcomming=False, order=True, order_by="title",
+                ascending=True, after=(self.__random_title(), 0),
+                limit=MenuFunctions.PAGE_SIZE
+            ))
+
+        def select_user_watched_movies() -> int:
+            return self.__consume(Database.select_user_watched_movies(
+                username=self.__random_username(), order=True,
+                order_by="title", ascending=True
+            ))
+
+        def select_searched_movies() -> int:
+            return self.__consume(Database.select_searched_movies(
+                search_term=self.__random_title()[:-1], order=True,
+                order_by="rank", ascending=True,
+                limit=MenuFunctions.SEARCH_PAGE_SIZE
+            ))
+
+        def resolve_misspelled_title() -> None:
+            title = self.__random_title()
+            Database.resolve_movie_title(title=title[1:])
+
+        def select_fuzzy_matched_movies() -> int:
+            title = self.__random_title()
+            return self.__consume(Database.select_fuzzy_matched_movies(
+                search_term=title[:2] + title[3:]
+            ))
+
+        def select_watch_history_last_week() -> int:
+            return self.__consume(Database.select_watch_history(
+                username=self.__random_username(),
+                start=today_timestamp - 7 * self.SECONDS_PER_DAY
+            ))
+
+        def select_recently_watched() -> int:
+            return self.__consume(Database.select_recently_watched())
+
+        def select_most_watched_movies() -> int:
+            return self.__consume(Database.select_most_watched_movies(
+                limit=MenuFunctions.TOP_LIST_SIZE
+            ))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.__measure(name="database.insert_user_to_users",
+                           function=insert_user)
+            self.__measure(name="database.insert_movie_to_movies",
+                           function=insert_movie)
+            self.__measure(
+                name="database.insert_watched_movie_to_watch_list",
+                function=insert_watched_movie
+            )
+        self.__measure(name="database.select_movies_from_movies.upcomming",
+                       function=select_upcomming_movies)
+        self.__measure(name="database.select_upcomming_releases",
+                       function=select_upcomming_releases)
+        self.__measure(name="database.select_movies_from_movies.all",
+                       function=select_all_movies)
+        self.__measure(name="database.select_movies_from_movies.page",
+                       function=select_movies_page)
+        self.__measure(name="database.select_user_watched_movies",
+                       function=select_user_watched_movies)
+        self.__measure(name="database.select_searched_movies",
+                       function=select_searched_movies)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.__measure(name="database.resolve_movie_title.misspelled",
+                           function=resolve_misspelled_title)
+        self.__measure(name="database.select_fuzzy_matched_movies",
+                       function=select_fuzzy_matched_movies)
+        self.__measure(name="database.select_most_watched_movies",
+                       function=select_most_watched_movies)
+        self.__measure(name="database.select_watch_history.last_week",
+                       function=select_watch_history_last_week)
+        self.__measure(name="database.select_recently_watched",
+                       function=select_recently_watched)
+        self.__benchmark_ingest()
+        self.__benchmark_watchlist_engine()
+
+    def __benchmark_ingest(self) -> None:
+        # Bursts of watch events, committed one by one and through the
+        # write-behind queue in grouped transactions.
+        def insert_burst() -> int:
+            for _ in range(self.INGEST_BURST_SIZE):
+                Database.insert_watched_movie_to_watch_list(
+                    username=self.__random_username(),
+                    title=self.__random_title()
+                )
+            return self.INGEST_BURST_SIZE
+
+        def submit_burst() -> int:
+            for _ in range(self.INGEST_BURST_SIZE):
+                Database.submit_watched_movie(
+                    username=self.__random_username(),
+                    title=self.__random_title()
+                )
+            Database.flush_watched_movies()
+            return self.INGEST_BURST_SIZE
+
+        write_behind = Config.WRITE_BEHIND
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.__measure(name="ingest.insert_watched_movie.burst",
+                           function=insert_burst)
+            Config.WRITE_BEHIND = {**write_behind, "enabled": True,
+                                   "durability": "queue"}
+            Database.connect_to_database()
+            try:
+                self.__measure(name="ingest.submit_watched_movie.burst",
+                               function=submit_burst)
+            finally:
+                Config.WRITE_BEHIND = write_behind
+                Database.connect_to_database()
+
+    def __benchmark_watchlist_engine(self) -> None:
+        # Watch list reads through SQLite and from the in-memory engine,
+        # with the time to load it and the memory it holds.
+        def select_user_watched_movies() -> int:
+            return self.__consume(Database.select_user_watched_movies(
+                username=self.__random_username(), order=True,
+                order_by="title", ascending=True
+            ))
+
+        def select_movie_watchers() -> int:
+            return self.__consume(Database.select_movie_watchers(
+                title=self.__random_title()
+            ))
+
+        def has_watched_movie() -> None:
+            Database.has_watched_movie(username=self.__random_username(),
+                                       title=self.__random_title())
+
+        def measure_reads(variant: str = None) -> None:
+            self.__measure(
+                name=f"watchlist.select_user_watched_movies.{variant}",
+                function=select_user_watched_movies
+            )
+            self.__measure(name=f"watchlist.select_movie_watchers.{variant}",
+                           function=select_movie_watchers)
+            self.__measure(name=f"watchlist.has_watched_movie.{variant}",
+                           function=has_watched_movie)
+
+        watchlist_engine = Config.WATCHLIST_ENGINE
+        measure_reads(variant="sqlite")
+        Config.WATCHLIST_ENGINE = {**watchlist_engine, "enabled": True}
+        try:
+            start_time = time.perf_counter()
+            Database.connect_to_database()
+            self.results["watchlist.load"] = self.__summarize(
+                durations=[time.perf_counter() - start_time]
+            )
+            measure_reads(variant="engine")
+            self.results["watchlist.memory"] = \
+                Database.get_watchlist_engine_memory_usage()
+        finally:
+            Config.WATCHLIST_ENGINE = watchlist_engine
+            Database.connect_to_database()
+
+    def __benchmark_menu_functions(self) -> None:
+        def view_all_movies() -> None:
+            MenuFunctions.view_all_movies(
+                timezone=self.timezone, page_size=MenuFunctions.PAGE_SIZE,
+                after=(self.__random_title(), 0)
+            )
+
+        def view_upcomming_movies() -> None:
+            MenuFunctions.view_upcomming_movies(timezone=self.timezone)
+
+        def view_watched_movies() -> None:
+            MenuFunctions.view_watched_movies(
+                username=self.__random_username(), timezone=self.timezone
+            )
+
+        def search_movie() -> None:
+            MenuFunctions.search_movie(
+                search_term=self.__random_title()[:-1],
+                timezone=self.timezone
+            )
+
+        # Rendering is measured up to the print calls, the terminal
+        # itself is left out.
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            for name, function in (
+                ("menu.view_all_movies.page", view_all_movies),
+                ("menu.view_upcomming_movies", view_upcomming_movies),
+                ("menu.view_watched_movies", view_watched_movies),
+                ("menu.search_movie", search_movie),
+            ):
+                def render() -> None:
+                    function()
+                    output.seek(0)
+                    output.truncate()
+
+                self.__measure(name=name, function=render)
+
+    def __measure(self, name: str = None,
+                  function: Callable[[], Optional[int]] = None) -> None:
+        durations = [0.0] * self.iterations
+        rows = 0
+        for index in range(self.iterations):
+            start_time = time.perf_counter()
+            result = function()
+            durations[index] = time.perf_counter() - start_time
+            if result is not None:
+                rows += result
+        self.results[name] = self.__summarize(durations=durations,
+                                              rows=rows)
+
+    def __measure_bulk(self, name: str = None, rows: Iterator = None,
+                       insert: Callable[[List], int] = None) -> None:
+        durations = []
+        count = 0
+        while True:
+            chunk = [row for _, row in
+                     zip(range(self.GENERATION_CHUNK_SIZE), rows)]
+            if len(chunk) == 0:
+                break
+            start_time = time.perf_counter()
+            insert(chunk)
+            durations.append(time.perf_counter() - start_time)
+            count += len(chunk)
+        self.results[name] = self.__summarize(durations=durations,
+                                              rows=count)
+
+    @classmethod
+    def __summarize(cls, durations: List[float] = None,
+                    rows: int = 0) -> Dict:
+        total = sum(durations)
+        summary = {
+            "count": len(durations),
+            "total_seconds": total,
+            "mean_ms": 1000 * total / max(len(durations), 1),
+            "p50_ms": 1000 * cls.__percentile(durations, 50),
+            "p95_ms": 1000 * cls.__percentile(durations, 95),
+            "p99_ms": 1000 * cls.__percentile(durations, 99),
+            "operations_per_second":
+                len(durations) / total if total > 0 else None,
+        }
+        if rows > 0:
+            summary["rows"] = rows
+            summary["rows_per_second"] = rows / total if total > 0 else None
+        return summary
+
+    @staticmethod
+    def __percentile(values: List[float] = None,
+                     percentile: float = None) -> float:
+        # Nearest rank percentile.
+        if len(values) == 0:
+            return 0.0
+        ordered = sorted(values)
+        rank = math.ceil(percentile / 100 * len(ordered))
+        return ordered[max(rank, 1) - 1]
+
+    @staticmethod
+    def __consume(cursor: sqlite3.Cursor = None) -> int:
+        count = 0
+        while rows := cursor.fetchmany(1000):
+            count += len(rows)
+        return count
+
+    def __random_username(self) -> str:
+        return f"user{self.random.randrange(self.users)}"
+
+    def __random_title(self) -> str:
+        return f"movie {self.random.randrange(self.movies)}"
+
+    @staticmethod
+    def dump(results: Dict = None, output_path: Optional[Path] = None
+             ) -> None:
+        if output_path is None:
+            print(json.dumps(results, indent=2))
+            return None
+        with open(file=output_path, mode="w") as output_file:
+            json.dump(results, fp=output_file, indent=2)
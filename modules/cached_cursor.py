@@ -0,0 +1,35 @@
+from typing import List
+
+
+class CachedCursor:
+
+    # Serves cached rows through the part of the cursor interface the
+    # callers of Database select methods use.
+
+    def __init__(self, rows: List = None):
+        self.__rows = rows
+        self.__position = 0
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size: int = 1) -> List:
+        rows = self.__rows[self.__position:self.__position + size]
+        self.__position += len(rows)
+        return rows
+
+    def fetchall(self) -> List:
+        return self.fetchmany(len(self.__rows))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self) -> None:
+        self.__position = len(self.__rows)
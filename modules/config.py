@@ -8,7 +8,48 @@ class Config:
     DEFAULT_CONFIG_PATH = Path("./config.json").resolve()
     DEFAULT_DATABASE_PATH = Path("./data/data.db").resolve()
 
+    DEFAULT_PERFORMANCE_PROFILE = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000
+    }
+
+    DEFAULT_INSTRUMENTATION = {
+        "enabled": False,
+        "slow_query_threshold_ms": 50,
+        "log_path": None
+    }
+
+    # Watch events are written in grouped transactions by a background
+    # thread when enabled, see WriteBehindQueue for the durability levels.
+    DEFAULT_WRITE_BEHIND = {
+        "enabled": False,
+        "max_batch_size": 1000,
+        "max_delay_ms": 20,
+        "max_queue_size": 100000,
+        "durability": "commit"
+    }
+
+    # Watch lists are answered from memory when enabled, see
+    # WatchlistEngine.
+    DEFAULT_WATCHLIST_ENGINE = {
+        "enabled": False
+    }
+
+    DEFAULT_POOL_SIZE = 8
+    # Dates are entered and shown in this zone.
+    DEFAULT_TIMEZONE = "Iran"
+
     DATABASE_PATH = None
+    POOL_SIZE = DEFAULT_POOL_SIZE
+    TIMEZONE = DEFAULT_TIMEZONE
+    PERFORMANCE_PROFILE = None
+    INSTRUMENTATION = DEFAULT_INSTRUMENTATION
+    WRITE_BEHIND = DEFAULT_WRITE_BEHIND
+    WATCHLIST_ENGINE = DEFAULT_WATCHLIST_ENGINE
 
     @classmethod
     def load_configs(cls, config_path: Optional[Path] = None) -> None:
@@ -19,3 +60,21 @@ class Config:
         cls.DATABASE_PATH = config_data.get(
             "database_path", cls.DEFAULT_DATABASE_PATH
         )
+        cls.POOL_SIZE = config_data.get("pool_size", cls.DEFAULT_POOL_SIZE)
+        cls.TIMEZONE = config_data.get("timezone", cls.DEFAULT_TIMEZONE)
+        cls.INSTRUMENTATION = {
+            **cls.DEFAULT_INSTRUMENTATION,
+            **config_data.get("instrumentation", {})
+        }
+        cls.WRITE_BEHIND = {
+            **cls.DEFAULT_WRITE_BEHIND,
+            **config_data.get("write_behind", {})
+        }
+        cls.WATCHLIST_ENGINE = {
+            **cls.DEFAULT_WATCHLIST_ENGINE,
+            **config_data.get("watchlist_engine", {})
+        }
+        cls.PERFORMANCE_PROFILE = {
+            **cls.DEFAULT_PERFORMANCE_PROFILE,
+            **config_data.get("performance", {})
+        }
@@ -1,94 +1,291 @@
+import contextlib
+import datetime
+import itertools
+import operator
+import re
 import sqlite3
-from typing import Union
-
-from pypika import Column, Order, Parameter, Query, Table, JoinType
-from pypika.functions import Lower
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from modules.cached_cursor import CachedCursor
 from modules.config import Config
+from modules.database_listener import DatabaseListener
+from modules.identity_cache import IdentityCache
+from modules.instrumentation import Instrumentation, InstrumentedConnection
+from modules.lazy_import import LazyImport
+from modules.migrations import Migrations
+from modules.pool import ConnectionPool
+from modules.recommender import Recommender
+from modules.release_calendar import ReleaseCalendar
+from modules.statements import Statements
+from modules.title_index import TitleIndex
+from modules.watchlist_engine import WatchlistEngine
+from modules.write_behind import WriteBehindQueue
+
+# Pypika is only needed the first time a statement is built.
+Field = LazyImport("pypika", "Field")
+JoinType = LazyImport("pypika", "JoinType")
+Order = LazyImport("pypika", "Order")
+Parameter = LazyImport("pypika", "Parameter")
+Query = LazyImport("pypika", "Query")
+Table = LazyImport("pypika", "Table")
+Count = LazyImport("pypika.functions", "Count")
+Lower = LazyImport("pypika.functions", "Lower")
+RowValue = LazyImport("pypika.terms", "Tuple")
+# Importing secrets loads hashlib and random, connecting is early enough.
+token_hex = LazyImport("secrets", "token_hex")
 
 
 class Database:
 
-    __connection = None
+    CACHED_STATEMENTS = 256
+
+    JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+    TEMP_STORES = ("DEFAULT", "FILE", "MEMORY")
+
+    IDENTITY_CACHE_SIZE = 100000
+    WATCH_EVENTS_PAGE_SIZE = 100
+    # Titles compared when resolving a misspelled one.
+    FUZZY_CANDIDATES = 5
+    # Columns of exported and restored rows, ids included.
+    TABLE_COLUMNS = {
+        "users": ("id", "username"),
+        "movies": ("id", "title", "release_timestamp", "release_date"),
+        "watch_list": ("user_id", "movie_id", "watched_at"),
+    }
+
+    __pool = None
+    __connection_id = None
+    __write_behind = None
+    __full_text_search_enabled = False
+    # Only ids that exist are cached, so inserts never make an entry stale.
+    # Inserts of a title that is already cached still invalidate it, see
+    # insert_movie_to_movies.
+    __user_ids = IdentityCache(max_size=IDENTITY_CACHE_SIZE)
+    __movie_ids = IdentityCache(max_size=IDENTITY_CACHE_SIZE)
+    # The recommender is built from watch_list on first use and kept up to
+    # date by watch events afterwards.
+    __recommender = Recommender()
+    __release_calendar = ReleaseCalendar()
+    # Typo tolerant title lookups, built on first use like the recommender.
+    __title_index = TitleIndex()
+    # Answers watch list reads from memory when enabled in the config. It
+    # is loaded on connecting and reloaded on first use after a reset.
+    __watchlist_engine = WatchlistEngine()
+    __listeners: List[DatabaseListener] = [__recommender, __release_calendar,
+                                           __title_index, __watchlist_engine]
 
     @classmethod
-    def connect_to_database(cls) -> None:
-        cls.__connection = sqlite3.connect(database=Config.DATABASE_PATH)
-        cls.__connection.row_factory = sqlite3.Row
-        cls.__create_tables()
+    def connect_to_database(cls, read_only: bool = False) -> None:
+        if cls.__pool is not None:
+            cls.close_database()
+        cls.clear_identity_caches()
+        cls.__notify_reset()
+        Instrumentation.configure(**Config.INSTRUMENTATION)
+        # Separate connections to an in-memory database would each see an
+        # empty database, so there every read goes through the writer.
+        if Config.DATABASE_PATH == ":memory:":
+            max_readers = 0
+        else:
+            max_readers = Config.POOL_SIZE
+        cls.__connection_id = token_hex(8)
+        cls.__pool = ConnectionPool(
+            factory=(lambda: cls.__open_connection(read_only=read_only)),
+            max_readers=max_readers,
+            on_rollback=cls.__on_rollback,
+            on_external_write=cls.__notify_reset
+        )
+        if read_only:
+            cls.__full_text_search_enabled = \
+                cls.__has_table(name="movies_fts")
+        else:
+            cls.__create_tables()
+            # The writer thread could not use an in-memory database.
+            if Config.WRITE_BEHIND["enabled"] and max_readers > 0:
+                cls.__write_behind = WriteBehindQueue(
+                    write=cls.__write_watched_movies,
+                    max_batch_size=Config.WRITE_BEHIND["max_batch_size"],
+                    max_delay_ms=Config.WRITE_BEHIND["max_delay_ms"],
+                    max_queue_size=Config.WRITE_BEHIND["max_queue_size"],
+                    durability=Config.WRITE_BEHIND["durability"]
+                )
+                cls.__write_behind.start()
+        if Config.WATCHLIST_ENGINE["enabled"]:
+            cls.__get_watchlist_engine()
+        # Threads serving requests need readers, the connecting one rarely
+        # reads again.
+        cls.__pool.release_reader()
 
     @classmethod
-    def __create_tables(cls) -> None:
-        cls.__create_users_table()
-        cls.__create_movies_table()
-        cls.__create_watch_list_table()
-        cls.__create_index_on_movies()
-
-    @classmethod
-    def __create_users_table(cls) -> None:
-        table = Table("users")
-        columns = [
-            Column(column_name="id", column_type="INTEGER"),
-            Column(column_name="username", column_type="TEXT")
-        ]
-        query = Query.create_table(table=table).if_not_exists().\
-            columns(*columns).primary_key("id").unique("username")
-        with cls.__connection:
-            cls.__connection.execute(query.get_sql())
-
-    @classmethod
-    def __create_movies_table(cls) -> None:
-        table = Table(name="movies")
-        columns = [
-            Column(column_name="id", column_type="INTEGER"),
-            Column(column_name="title", column_type="TEXT"),
-            Column(column_name="release_timestamp", column_type="REAL"),
-        ]
-        query = Query.create_table(table).if_not_exists().\
-            columns(*columns).primary_key("id").\
-            unique("title", "release_timestamp")
-        with cls.__connection:
-            cls.__connection.execute(query.get_sql())
-
-    @classmethod
-    def __create_watch_list_table(cls) -> None:
-        table = Table("watch_list")
-        columns = [
-            Column(column_name="user_id", column_type="INTEGER"),
-            Column(column_name="movie_id", column_type="INTEGER")
-        ]
-        query = Query.create_table(table=table).if_not_exists().\
-            columns(*columns).\
-            unique("user_id", "movie_id")
-        # There is a bug in pypika to have more than one foreign keys
-        # We bypass this bug as the following
-        query_string = query.get_sql()
-        query_string = query_string[:-1] +\
-            ', FOREIGN KEY ("user_id") REFERENCES "users" ("id")' +\
-            ', FOREIGN KEY ("movie_id") REFERENCES "movies" ("id")' +\
-            ')'
-        with cls.__connection:
-            cls.__connection.execute(query_string)
-
-    @classmethod
-    def __create_index_on_movies(cls) -> None:
-        # Pypika does not support create index at the moment.
-        query = (
-            "CREATE INDEX IF NOT EXISTS idx_movies_release_timestamp "
-            "ON movies(release_timestamp)"
+    def close_database(cls) -> None:
+        # Queued watch events are written before the connections close.
+        if cls.__write_behind is not None:
+            write_behind, cls.__write_behind = cls.__write_behind, None
+            write_behind.close()
+        if cls.__pool is not None:
+            cls.__pool.close()
+            cls.__pool = None
+
+    @classmethod
+    @contextlib.contextmanager
+    def transaction(cls) -> Iterator[None]:
+        # Every write inside the block joins one transaction, which is
+        # committed at the end or rolled back on an exception.
+        with cls.__pool.writer():
+            yield None
+
+    @classmethod
+    def clear_identity_caches(cls) -> None:
+        # Ids cached inside a rolled back transaction no longer exist.
+        cls.__user_ids.clear()
+        cls.__movie_ids.clear()
+
+    @classmethod
+    def backup_database(cls, path: Path = None) -> None:
+        # Copies a consistent snapshot with the online backup api. The
+        # copy is done in one step inside a read transaction, so it never
+        # mixes two states and writers go on meanwhile in WAL mode.
+        target = sqlite3.connect(database=str(path))
+        try:
+            cls.__pool.reader().backup(target)
+        finally:
+            target.close()
+
+    @classmethod
+    def release_reader(cls) -> None:
+        # For threads that read now and then, see ConnectionPool.
+        if cls.__pool is not None:
+            cls.__pool.release_reader()
+
+    @classmethod
+    def get_data_version(cls) -> str:
+        # Changes whenever a write to the database is committed, by this
+        # process or another, and with every connect, so it can tag
+        # cached results.
+        generation, data_version = cls.__pool.get_version()
+        return f"{cls.__connection_id}.{generation}.{data_version}"
+
+    @classmethod
+    def add_listener(cls, listener: DatabaseListener = None) -> None:
+        cls.__listeners.append(listener)
+
+    @classmethod
+    def remove_listener(cls, listener: DatabaseListener = None) -> None:
+        cls.__listeners.remove(listener)
+
+    @classmethod
+    def __notify_reset(cls) -> None:
+        for listener in cls.__listeners:
+            listener.on_reset()
+
+    @classmethod
+    def __on_rollback(cls) -> None:
+        cls.clear_identity_caches()
+        cls.__notify_reset()
+
+    @classmethod
+    def __open_connection(cls, read_only: bool = False) -> sqlite3.Connection:
+        if read_only:
+            # Reporting processes never write, so they skip migrations and
+            # can not take the write lock by accident.
+            database = Path(Config.DATABASE_PATH).resolve().as_uri() + \
+                "?mode=ro"
+        else:
+            database = Config.DATABASE_PATH
+        # Queries are only timed when instrumentation is enabled, plain
+        # connections pay nothing for it.
+        if Instrumentation.enabled:
+            factory = InstrumentedConnection
+        else:
+            factory = sqlite3.Connection
+        connection = sqlite3.connect(
+            database=database, uri=read_only,
+            cached_statements=cls.CACHED_STATEMENTS,
+            check_same_thread=False, factory=factory
         )
-        with cls.__connection:
-            cls.__connection.execute(query)
+        connection.row_factory = sqlite3.Row
+        cls.__apply_performance_profile(connection=connection,
+                                        read_only=read_only)
+        return connection
+
+    @classmethod
+    def __apply_performance_profile(cls,
+                                    connection: sqlite3.Connection = None,
+                                    read_only: bool = False) -> None:
+        profile = Config.PERFORMANCE_PROFILE
+        if profile is None:
+            profile = Config.DEFAULT_PERFORMANCE_PROFILE
+
+        # Pragmas can not be parameterized, so values are validated here.
+        pragmas = {
+            "busy_timeout": int(profile["busy_timeout"]),
+            "synchronous": cls.__validate_pragma_value(
+                name="synchronous", value=profile["synchronous"],
+                allowed_values=cls.SYNCHRONOUS_LEVELS
+            ),
+            "mmap_size": int(profile["mmap_size"]),
+            "cache_size": int(profile["cache_size"]),
+            "temp_store": cls.__validate_pragma_value(
+                name="temp_store", value=profile["temp_store"],
+                allowed_values=cls.TEMP_STORES
+            ),
+        }
+        # Journal mode is persistent in the database file and can only be
+        # changed by a connection that is allowed to write.
+        if not read_only:
+            pragmas["journal_mode"] = cls.__validate_pragma_value(
+                name="journal_mode", value=profile["journal_mode"],
+                allowed_values=cls.JOURNAL_MODES
+            )
+
+        for name, value in pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}").fetchall()
+
+    @staticmethod
+    def __validate_pragma_value(name: str = None, value: str = None,
+                                allowed_values: Tuple[str, ...] = None
+                                ) -> str:
+        value = str(value).upper()
+        if value not in allowed_values:
+            raise ValueError(f"Invalid {name} {value}, expected one of "
+                             f"{', '.join(allowed_values)}")
+        return value
+
+    @classmethod
+    def __create_tables(cls) -> None:
+        with cls.__pool.writer() as connection:
+            Migrations.migrate(connection=connection)
+        cls.__full_text_search_enabled = cls.__has_table(name="movies_fts")
+
+    @classmethod
+    def __has_table(cls, name: str = None) -> bool:
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+        cursor = cls.__pool.reader().execute(query, (name, ))
+        # Fetching every row finishes the statement, an unfinished one
+        # would pin this reader to an old snapshot of the database.
+        return len(cursor.fetchall()) > 0
 
     @classmethod
+    @Instrumentation.timed
     def get_user_id_by_username(cls, username: str = None) -> Union[int, None]:
-        table = Table(name="users")
-        query = Query.from_(table=table).select(table.id).\
-            where(table.username == Parameter("?"))
+        user_id = cls.__user_ids.get(username)
+        if user_id is not None:
+            return user_id
+
+        def build() -> str:
+            table = Table(name="users")
+            query = Query.from_(table=table).select(table.id).\
+                where(table.username == Parameter("?"))
+            return query.get_sql()
+
+        query_string = Statements.get(key="get_user_id_by_username",
+                                      builder=build)
         parameters = (username, )
 
-        cursor = cls.__connection.cursor()
-        cursor.execute(query.get_sql(), parameters)
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
         selected_users = cursor.fetchall()
 
         if len(selected_users) == 0:
@@ -96,221 +293,1230 @@ class Database:
             user_id = None
         else:
             user_id = selected_users[0]["id"]
+            cls.__user_ids.put(username, user_id)
 
         return user_id
 
     @classmethod
+    @Instrumentation.timed
     def get_movie_id_by_title(cls, title: str = None) -> Union[int, None]:
-        table = Table("movies")
-        query = Query.from_(table=table).select(table.id).\
-            where(table.title == Parameter("?"))
+        movie_id = cls.__find_movie_id(title=title)
+        if movie_id is None:
+            print(f"{title} not found in database.")
+        return movie_id
+
+    @classmethod
+    def __find_movie_id(cls, title: str = None) -> Union[int, None]:
+        movie_id = cls.__movie_ids.get(title)
+        if movie_id is not None:
+            return movie_id
+
+        def build() -> str:
+            table = Table("movies")
+            query = Query.from_(table=table).select(table.id).\
+                where(table.title == Parameter("?"))
+            return query.get_sql()
+
+        query_string = Statements.get(key="get_movie_id_by_title",
+                                      builder=build)
         parameters = (title, )
 
-        cursor = cls.__connection.cursor()
-        cursor.execute(query.get_sql(), parameters)
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
         selected_movies = cursor.fetchall()
 
         if len(selected_movies) == 0:
-            print(f"{title} not found in database.")
             movie_id = None
         else:
             movie_id = selected_movies[0]["id"]
+            cls.__movie_ids.put(title, movie_id)
 
         return movie_id
 
     @classmethod
-    def insert_user_to_users(cls, username: str = None) -> None:
-        table = Table("users")
+    @Instrumentation.timed
+    def insert_user_to_users(cls, username: str = None) -> bool:
+        def build_check() -> str:
+            table = Table("users")
+            check_query = Query.from_(table=table).select("*").\
+                where(table.username == Parameter("?"))
+            return check_query.get_sql()
 
-        check_query = Query.from_(table=table).select("*").\
-            where(table.username == Parameter("?"))
-        check_parameters = (username, )
-        check_cursor = cls.__connection.cursor()
-        check_cursor.execute(check_query.get_sql(), check_parameters)
-        check_cursor_data = check_cursor.fetchall()
-        if len(check_cursor_data) > 0:
-            print(f"{username} has already been added to users table!")
-            return None
+        def build() -> str:
+            table = Table("users")
+            query = Query.into(table=table).columns("username").\
+                insert(Parameter("?"))
+            return query.get_sql()
 
-        query = Query.into(table=table).columns("username").\
-            insert(Parameter("?"))
+        check_query_string = Statements.get(
+            key="insert_user_to_users.check", builder=build_check
+        )
+        check_parameters = (username, )
+        query_string = Statements.get(key="insert_user_to_users",
+                                      builder=build)
         parameters = (username, )
-        with cls.__connection:
-            cls.__connection.execute(query.get_sql(), parameters)
+
+        with cls.__pool.writer() as connection:
+            check_cursor = connection.cursor()
+            check_cursor.execute(check_query_string, check_parameters)
+            check_cursor_data = check_cursor.fetchall()
+            if len(check_cursor_data) > 0:
+                print(f"{username} has already been added to users table!")
+                return False
+
+            cursor = connection.execute(query_string, parameters)
+            cls.__user_ids.put(username, cursor.lastrowid)
+            for listener in cls.__listeners:
+                listener.on_user_inserted(user_id=cursor.lastrowid,
+                                          username=username)
+        return True
 
     @classmethod
+    @Instrumentation.timed
     def insert_movie_to_movies(cls, title: str = None,
-                               release_date_timestamp: float = None) -> None:
-        table = Table(name="movies")
+                               release_date_timestamp: float = None,
+                               release_date: Optional[str] = None) -> bool:
+        def build_check() -> str:
+            table = Table(name="movies")
+            check_query = Query.from_(table=table).select("*").\
+                where(table.title == Parameter("?"))
+            return check_query.get_sql()
+
+        def build() -> str:
+            table = Table(name="movies")
+            query = Query.into(table=table).\
+                columns("title", "release_timestamp", "release_date").\
+                insert(Parameter("?"), Parameter("?"), Parameter("?"))
+            return query.get_sql()
 
-        check_query = Query.from_(table=table).select("*").\
-            where(table.title == Parameter("?"))
+        check_query_string = Statements.get(
+            key="insert_movie_to_movies.check", builder=build_check
+        )
         check_parameters = (title, )
-        check_cursor = cls.__connection.cursor()
-        check_cursor.execute(check_query.get_sql(), check_parameters)
-        check_cursor_data = check_cursor.fetchall()
-        if len(check_cursor_data) > 0:
-            for movie in check_cursor_data:
-                timestamp_error = \
-                    abs(movie["release_timestamp"] - release_date_timestamp)
-                if timestamp_error < 0.1:
-                    print(f"{title} has already been added to movies table!")
-                    return None
-
-        query = Query.into(table=table).\
-            columns("title", "release_timestamp").\
-            insert(Parameter("?"), Parameter("?"))
-        parameters = (title, release_date_timestamp)
-        with cls.__connection:
-            cls.__connection.execute(query.get_sql(), parameters)
+        query_string = Statements.get(key="insert_movie_to_movies",
+                                      builder=build)
+        parameters = (title, release_date_timestamp, release_date)
+
+        with cls.__pool.writer() as connection:
+            check_cursor = connection.cursor()
+            check_cursor.execute(check_query_string, check_parameters)
+            check_cursor_data = check_cursor.fetchall()
+            if len(check_cursor_data) > 0:
+                for movie in check_cursor_data:
+                    timestamp_error = abs(
+                        movie["release_timestamp"] - release_date_timestamp
+                    )
+                    if timestamp_error < 0.1:
+                        print(f"{title} has already been added to "
+                              "movies table!")
+                        return False
+
+            cursor = connection.execute(query_string, parameters)
+            # With several movies of one title, the new one may now be
+            # the one get_movie_id_by_title resolves to.
+            if len(check_cursor_data) > 0:
+                cls.__movie_ids.invalidate(title)
+            else:
+                cls.__movie_ids.put(title, cursor.lastrowid)
+            for listener in cls.__listeners:
+                listener.on_movie_inserted(
+                    movie_id=cursor.lastrowid, title=title,
+                    release_timestamp=release_date_timestamp,
+                    release_date=release_date
+                )
+        return True
 
     @classmethod
+    @Instrumentation.timed
     def insert_watched_movie_to_watch_list(cls, username: str = None,
-                                           title: str = None) -> None:
+                                           title: str = None,
+                                           watched_at: Optional[float] = None
+                                           ) -> bool:
+        if watched_at is None:
+            watched_at = time.time()
         user_id = cls.get_user_id_by_username(username=username)
         movie_id = cls.get_movie_id_by_title(title=title)
 
         if user_id is None or movie_id is None:
-            return None
+            return False
 
-        table = Table(name="watch_list")
+        def build() -> str:
+            table = Table(name="watch_list")
+            query = Query.into(table=table).\
+                columns("user_id", "movie_id", "watched_at").\
+                insert(Parameter("?"), Parameter("?"), Parameter("?"))
+            # Pypika does not support on conflict for sqlite at the moment.
+            # The unique constraint replaces a separate duplicate check.
+            return query.get_sql() + " ON CONFLICT DO NOTHING"
 
-        check_query = Query.from_(table=table).select("*").\
-            where((table.user_id == Parameter("?")) &
-                  (table.movie_id == Parameter("?")))
-        check_parameters = (user_id, movie_id)
+        query_string = Statements.get(
+            key="insert_watched_movie_to_watch_list", builder=build
+        )
+        parameters = (user_id, movie_id, watched_at)
 
-        check_cursor = cls.__connection.cursor()
-        check_cursor.execute(check_query.get_sql(), check_parameters)
-        check_cursor_data = check_cursor.fetchall()
-        if len(check_cursor_data) > 0:
-            print(f"{username} has already watched {title}!")
-            return None
+        with cls.__pool.writer() as connection:
+            cursor = connection.execute(query_string, parameters)
+            if cursor.rowcount == 0:
+                print(f"{username} has already watched {title}!")
+                return False
+            for listener in cls.__listeners:
+                listener.on_watched_movie_inserted(user_id=user_id,
+                                                   movie_id=movie_id)
+        return True
 
-        query = Query.into(table=table).\
-            columns("user_id", "movie_id").\
-            insert(Parameter("?"), Parameter("?"))
-        parameters = (user_id, movie_id)
+    @classmethod
+    def submit_watched_movie(cls, username: str = None, title: str = None,
+                             watched_at: Optional[float] = None) -> bool:
+        # Inserts through the write-behind queue when it is enabled. With
+        # "queue" durability the result only says the event was queued.
+        # Inside a transaction the insert joins it instead, the queue could
+        # not write before the transaction ends.
+        if watched_at is None:
+            watched_at = time.time()
+        write_behind = cls.__write_behind
+        if write_behind is None or cls.__pool.in_transaction:
+            return cls.insert_watched_movie_to_watch_list(
+                username=username, title=title, watched_at=watched_at
+            )
+        return write_behind.submit(event=(username, title, watched_at))
 
-        with cls.__connection:
-            cls.__connection.execute(query.get_sql(), parameters)
+    @classmethod
+    def flush_watched_movies(cls) -> None:
+        # Waits until every queued watch event is written.
+        if cls.__write_behind is not None:
+            cls.__write_behind.flush()
 
     @classmethod
+    def __write_watched_movies(cls, watched_movies: List[Tuple] = None
+                               ) -> List[bool]:
+        with cls.__pool.writer():
+            return [
+                cls.insert_watched_movie_to_watch_list(
+                    username=username, title=title, watched_at=watched_at
+                )
+                for username, title, watched_at in watched_movies
+            ]
+
+    @classmethod
+    @Instrumentation.timed
+    def bulk_insert_users_to_users(cls, usernames: Iterable[str] = None
+                                   ) -> int:
+        def build() -> str:
+            table = Table("users")
+            query = Query.into(table=table).columns("username").\
+                insert(Parameter("?"))
+            # Pypika does not support on conflict for sqlite at the moment.
+            return query.get_sql() + " ON CONFLICT DO NOTHING"
+
+        query_string = Statements.get(key="bulk_insert_users_to_users",
+                                      builder=build)
+        parameters = ((username, ) for username in usernames)
+        return cls.__bulk_execute(query_string, parameters)
+
+    @classmethod
+    @Instrumentation.timed
+    def bulk_insert_movies_to_movies(
+        cls, movies: Iterable[Tuple[str, float, Optional[str]]] = None
+    ) -> int:
+        # Movies are (title, release_timestamp, release_date) tuples, the
+        # local release date may be None.
+        def build() -> str:
+            table = Table("movies")
+            query = Query.into(table=table).\
+                columns("title", "release_timestamp", "release_date").\
+                insert(Parameter("?"), Parameter("?"), Parameter("?"))
+            # Pypika does not support on conflict for sqlite at the moment.
+            return query.get_sql() + " ON CONFLICT DO NOTHING"
+
+        query_string = Statements.get(key="bulk_insert_movies_to_movies",
+                                      builder=build)
+        inserted = cls.__bulk_execute(query_string, movies)
+        # Cached titles may now resolve to one of the new movies.
+        if inserted > 0:
+            cls.__movie_ids.clear()
+            cls.__notify_reset()
+        return inserted
+
+    @classmethod
+    @Instrumentation.timed
+    def bulk_insert_watched_movies_to_watch_list(
+        cls, watched_movies: Iterable[Tuple] = None
+    ) -> int:
+        # Watched movies are (username, title) or (username, title,
+        # watched_at) tuples, watched_at defaults to now.
+        # Pypika does not support insert from select with on conflict
+        # for sqlite at the moment. Usernames and titles are resolved
+        # inside the statement, unknown ones simply produce no row.
+        query_string = (
+            'INSERT INTO "watch_list" ("user_id","movie_id","watched_at") '
+            'SELECT "users"."id","movies"."id",? FROM "users" '
+            'JOIN "movies" ON "movies"."id"='
+            '(SELECT "id" FROM "movies" WHERE "title"=? LIMIT 1) '
+            'WHERE "users"."username"=? '
+            'ON CONFLICT DO NOTHING'
+        )
+        now = time.time()
+
+        def create_parameters() -> Iterator[Tuple]:
+            for username, title, *optional in watched_movies:
+                watched_at = optional[0] if optional else None
+                if watched_at is None:
+                    watched_at = now
+                yield (watched_at, title, username)
+
+        parameters = create_parameters()
+        inserted = cls.__bulk_execute(query_string, parameters)
+        # Which rows were new is not known here, so the listeners rebuild.
+        if inserted > 0:
+            cls.__notify_reset()
+        return inserted
+
+    @classmethod
+    @Instrumentation.timed
+    def bulk_restore_rows(cls, table: str = None,
+                          rows: Iterable[Tuple] = None) -> int:
+        # Rows are tuples of TABLE_COLUMNS and keep their ids, so restored
+        # watch events point at the same users and movies as before. Only
+        # meant for empty databases.
+        columns = cls.__get_table_columns(table=table)
+
+        def build() -> str:
+            query = Query.into(table=Table(name=table)).columns(*columns).\
+                insert(*[Parameter("?")] * len(columns))
+            # Pypika does not support on conflict for sqlite at the moment.
+            return query.get_sql() + " ON CONFLICT DO NOTHING"
+
+        query_string = Statements.get(key=("bulk_restore_rows", table),
+                                      builder=build)
+        inserted = cls.__bulk_execute(query_string, rows)
+        if inserted > 0:
+            cls.clear_identity_caches()
+            cls.__notify_reset()
+        return inserted
+
+    @classmethod
+    @Instrumentation.timed
+    def count_rows(cls, table: str = None) -> int:
+        cls.__get_table_columns(table=table)
+
+        def build() -> str:
+            query = Query.from_(table=Table(name=table)).select(Count("*"))
+            return query.get_sql()
+
+        query_string = Statements.get(key=("count_rows", table),
+                                      builder=build)
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string)
+        return cursor.fetchone()[0]
+
+    @classmethod
+    def __get_table_columns(cls, table: str = None) -> Tuple[str, ...]:
+        if table not in cls.TABLE_COLUMNS:
+            raise ValueError(f"Unknown table {table}, expected one of "
+                             f"{', '.join(cls.TABLE_COLUMNS)}")
+        return cls.TABLE_COLUMNS[table]
+
+    @classmethod
+    def __bulk_execute(cls, query_string: str = None,
+                       parameters: Iterable[Tuple] = None) -> int:
+        # Rowcount only counts rows of the statement itself, unlike
+        # total_changes it leaves out rows written by triggers.
+        with cls.__pool.writer() as connection:
+            cursor = connection.executemany(query_string, parameters)
+            return cursor.rowcount
+
+    @classmethod
+    @Instrumentation.timed
     def select_users_from_users(cls, order: bool = False,
                                 order_by: str = "username",
-                                ascending: bool = True) -> sqlite3.Cursor:
-        table = Table("users")
-        query = Query.from_(table=table).select("*")
-
-        if order:
-            if order_by == "username":
-                orderby_column = table.username
-            elif order_by == "id":
-                orderby_column = table.id
-            if ascending:
-                order_pattern = Order.asc
-            else:
-                order_pattern = Order.desc
-            query = query.orderby(orderby_column, order=order_pattern)
+                                ascending: bool = True,
+                                after: Optional[Tuple] = None,
+                                before: Optional[Tuple] = None,
+                                limit: Optional[int] = None
+                                ) -> sqlite3.Cursor:
+        # after and before are (order_by value, id) keys of the last or
+        # first row of the current page, id alone when ordering by id.
+        paginated = after is not None or before is not None
+        if paginated and not order:
+            raise ValueError("Keyset pagination needs an ordered result")
+
+        def build() -> str:
+            table = Table("users")
+            query = Query.from_(table=table).select("*")
 
-        cursor = cls.__connection.cursor()
-        cursor.execute(query.get_sql())
+            if order:
+                if order_by == "username":
+                    orderby_column = table.username
+                elif order_by == "id":
+                    orderby_column = table.id
+                return cls.__build_keyset_page(
+                    query=query, table=table,
+                    orderby_column=orderby_column, ascending=ascending,
+                    after=after is not None, before=before is not None,
+                    limited=limit is not None
+                )
+            if limit is not None:
+                return query.get_sql() + " LIMIT ?"
+            return query.get_sql()
+
+        query_string = Statements.get(
+            key=("select_users_from_users", order, order_by, ascending,
+                 after is not None, before is not None, limit is not None),
+            builder=build
+        )
+        parameters = cls.__create_keyset_parameters(
+            order_by=order_by, after=after, before=before, limit=limit
+        )
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
         return cursor
 
     @classmethod
+    @Instrumentation.timed
     def select_movies_from_movies(cls, upcomming: bool = False,
                                   today_timestamp: float = None,
                                   order: bool = False,
                                   order_by: str = "date",
-                                  ascending: bool = True) -> sqlite3.Cursor:
+                                  ascending: bool = True,
+                                  after: Optional[Tuple] = None,
+                                  before: Optional[Tuple] = None,
+                                  limit: Optional[int] = None
+                                  ) -> sqlite3.Cursor:
+        # after and before are (order_by value, id) keys of the last or
+        # first row of the current page, id alone when ordering by id.
+        paginated = after is not None or before is not None
+        if paginated and not order:
+            raise ValueError("Keyset pagination needs an ordered result")
 
-        table = Table(name="movies")
+        def build() -> str:
+            table = Table(name="movies")
 
+            if upcomming:
+                query = Query.from_(table=table).select("*").\
+                    where(table.release_timestamp > Parameter("?"))
+            else:
+                query = Query.from_(table=table).select("*")
+
+            if order:
+                if order_by == "date":
+                    orderby_column = table.release_timestamp
+                elif order_by == "title":
+                    orderby_column = table.title
+                elif order_by == "id":
+                    orderby_column = table.id
+                return cls.__build_keyset_page(
+                    query=query, table=table,
+                    orderby_column=orderby_column, ascending=ascending,
+                    after=after is not None, before=before is not None,
+                    limited=limit is not None
+                )
+            if limit is not None:
+                return query.get_sql() + " LIMIT ?"
+            return query.get_sql()
+
+        query_string = Statements.get(
+            key=("select_movies_from_movies", upcomming, order, order_by,
+                 ascending, after is not None, before is not None,
+                 limit is not None),
+            builder=build
+        )
         if upcomming:
-            query = Query.from_(table=table).select("*").\
-                where(table.release_timestamp > Parameter("?"))
             parameters = (today_timestamp, )
         else:
-            query = Query.from_(table=table).select("*")
             parameters = tuple()
+        parameters += cls.__create_keyset_parameters(
+            order_by=order_by, after=after, before=before, limit=limit
+        )
 
-        if order:
-            if order_by == "date":
-                orderby_column = table.release_timestamp
-            elif order_by == "title":
-                orderby_column = table.title
-            elif order_by == "id":
-                orderby_column = table.id
-            if ascending:
-                order_pattern = Order.asc
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
+
+    @staticmethod
+    def __build_keyset_page(query: Query = None, table: Table = None,
+                            orderby_column: Field = None,
+                            ascending: bool = True, after: bool = False,
+                            before: bool = False, limited: bool = False
+                            ) -> str:
+        # Pages are selected by the key of a neighbouring row instead of
+        # an offset, so every page is an index range scan. Rows with
+        # equal order_by values are ordered by id to keep keys unique.
+        by_id = orderby_column.name == "id"
+        forward = not before
+
+        if after or before:
+            if ascending == forward:
+                compare = operator.gt
             else:
-                order_pattern = Order.desc
-            query = query.orderby(orderby_column, order=order_pattern)
+                compare = operator.lt
+            # A row value comparison lets sqlite range scan the index,
+            # the equivalent OR of two comparisons does not.
+            if by_id:
+                criterion = compare(table.id, Parameter("?"))
+            else:
+                criterion = compare(
+                    RowValue(orderby_column, table.id),
+                    RowValue(Parameter("?"), Parameter("?"))
+                )
+            query = query.where(criterion)
 
-        cursor = cls.__connection.cursor()
-        cursor.execute(query.get_sql(), parameters)
-        return cursor
+        # Previous pages are read backwards from the key and flipped back.
+        if ascending == forward:
+            order_pattern = Order.asc
+        else:
+            order_pattern = Order.desc
+        query = query.orderby(orderby_column, order=order_pattern)
+        if not by_id:
+            query = query.orderby(table.id, order=order_pattern)
+
+        query_string = query.get_sql()
+        if limited:
+            query_string += " LIMIT ?"
+        if forward:
+            return query_string
+
+        if ascending:
+            order_string = "ASC"
+        else:
+            order_string = "DESC"
+        order_strings = [f'"{orderby_column.name}" {order_string}']
+        if not by_id:
+            order_strings.append(f'"id" {order_string}')
+        return (f"SELECT * FROM ({query_string}) "
+                f"ORDER BY {','.join(order_strings)}")
+
+    @staticmethod
+    def __create_keyset_parameters(order_by: str = None,
+                                   after: Optional[Tuple] = None,
+                                   before: Optional[Tuple] = None,
+                                   limit: Optional[int] = None) -> Tuple:
+        key = after if after is not None else before
+        if key is None:
+            parameters = tuple()
+        elif order_by == "id":
+            parameters = (key[-1], )
+        else:
+            parameters = tuple(key)
+        if limit is not None:
+            parameters += (limit, )
+        return parameters
 
     @classmethod
+    @Instrumentation.timed
     def select_user_watched_movies(cls, username: str = None,
                                    order: bool = False,
                                    order_by: str = "date",
                                    ascending: bool = True
-                                   ) -> sqlite3.Cursor:
-        users_table = Table("users")
-        movies_table = Table("movies")
-        watch_list_table = Table("watch_list")
-
-        query = Query.from_(table=movies_table).\
-            select(movies_table.id, movies_table.title,
-                   movies_table.release_timestamp).\
-            join(watch_list_table, JoinType.inner).\
-            on(watch_list_table.movie_id == movies_table.id).\
-            join(users_table, JoinType.inner).\
-            on(watch_list_table.user_id == users_table.id).\
-            where(users_table.username == Parameter("?"))
+                                   ) -> Union[sqlite3.Cursor, CachedCursor]:
+        if Config.WATCHLIST_ENGINE["enabled"]:
+            engine = cls.__get_watchlist_engine()
+            user_id = engine.get_user_id(username=username)
+            if user_id is None:
+                return CachedCursor(rows=[])
+            return CachedCursor(rows=engine.select_user_movies(
+                user_id=user_id, order_by=order_by if order else None,
+                ascending=ascending
+            ))
+
+        def build() -> str:
+            users_table = Table("users")
+            movies_table = Table("movies")
+            watch_list_table = Table("watch_list")
+
+            query = Query.from_(table=movies_table).\
+                select(movies_table.id, movies_table.title,
+                       movies_table.release_timestamp,
+                       movies_table.release_date).\
+                join(watch_list_table, JoinType.inner).\
+                on(watch_list_table.movie_id == movies_table.id).\
+                join(users_table, JoinType.inner).\
+                on(watch_list_table.user_id == users_table.id).\
+                where(users_table.username == Parameter("?"))
+
+            if order:
+                if order_by == "title":
+                    orderby_column = movies_table.title
+                elif order_by == "date":
+                    orderby_column = movies_table.release_timestamp
+
+                if ascending:
+                    order_pattern = Order.asc
+                else:
+                    order_pattern = Order.desc
+                query = query.orderby(orderby_column, order=order_pattern)
+            return query.get_sql()
+
+        query_string = Statements.get(
+            key=("select_user_watched_movies", order, order_by, ascending),
+            builder=build
+        )
         parameters = (username, )
 
-        if order:
-            if order_by == "title":
-                orderby_column = movies_table.title
-            elif order_by == "date":
-                orderby_column = movies_table.release_timestamp
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
 
-            if ascending:
-                order_pattern = Order.asc
-            else:
-                order_pattern = Order.desc
-            query = query.orderby(orderby_column, order=order_pattern)
+    @classmethod
+    @Instrumentation.timed
+    def select_username_shard_bounds(cls, shard_size: int = None
+                                     ) -> List[str]:
+        # The first username of every run of shard_size users in username
+        # order, which splits users into shards of consecutive usernames.
+        def build() -> str:
+            table = Table(name="users")
+            query = Query.from_(table=table).select(table.username).\
+                orderby(table.username, order=Order.asc)
+            return query.get_sql()
+
+        query_string = Statements.get(key="select_username_shard_bounds",
+                                      builder=build)
+        cursor = cls.__select_tuples(connection=cls.__pool.reader(),
+                                     query_string=query_string)
+        return [username for (username, )
+                in itertools.islice(cursor, 0, None, shard_size)]
+
+    @classmethod
+    @Instrumentation.timed
+    def select_users_watched_movies(cls, lower: str = None,
+                                    upper: Optional[str] = None
+                                    ) -> sqlite3.Cursor:
+        # The watched movies of all users from username lower up to but
+        # excluding upper, or to the last one without upper, by username
+        # and title. Users who watched nothing have one row with NULL
+        # movie columns.
+        def build() -> str:
+            users_table = Table("users")
+            movies_table = Table("movies")
+            watch_list_table = Table("watch_list")
 
-        cursor = cls.__connection.cursor()
-        cursor.execute(query.get_sql(), parameters)
+            query = Query.from_(table=users_table).\
+                select(users_table.username, movies_table.id,
+                       movies_table.title, movies_table.release_timestamp,
+                       movies_table.release_date).\
+                join(watch_list_table, JoinType.left).\
+                on(watch_list_table.user_id == users_table.id).\
+                join(movies_table, JoinType.left).\
+                on(watch_list_table.movie_id == movies_table.id).\
+                where(users_table.username >= Parameter("?"))
+            if upper is not None:
+                query = query.where(users_table.username < Parameter("?"))
+            query = query.\
+                orderby(users_table.username, order=Order.asc).\
+                orderby(movies_table.title, order=Order.asc).\
+                orderby(movies_table.id, order=Order.asc)
+            return query.get_sql()
+
+        query_string = Statements.get(
+            key=("select_users_watched_movies", upper is not None),
+            builder=build
+        )
+        parameters = (lower, ) if upper is None else (lower, upper)
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
         return cursor
 
     @classmethod
+    @Instrumentation.timed
+    def select_movie_watchers(cls, title: str = None
+                              ) -> Union[sqlite3.Cursor, CachedCursor]:
+        # Users who watched the movie, by username.
+        if Config.WATCHLIST_ENGINE["enabled"]:
+            engine = cls.__get_watchlist_engine()
+            movie_id = engine.get_movie_id(title=title)
+            if movie_id is None:
+                return CachedCursor(rows=[])
+            return CachedCursor(rows=engine.select_movie_users(
+                movie_id=movie_id
+            ))
+
+        movie_id = cls.get_movie_id_by_title(title=title)
+
+        def build() -> str:
+            users_table = Table("users")
+            watch_list_table = Table("watch_list")
+            query = Query.from_(table=users_table).\
+                select(users_table.id, users_table.username).\
+                join(watch_list_table, JoinType.inner).\
+                on(watch_list_table.user_id == users_table.id).\
+                where(watch_list_table.movie_id == Parameter("?")).\
+                orderby(users_table.username, order=Order.asc)
+            return query.get_sql()
+
+        query_string = Statements.get(key="select_movie_watchers",
+                                      builder=build)
+        parameters = (movie_id, )
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
+
+    @classmethod
+    @Instrumentation.timed
+    def has_watched_movie(cls, username: str = None,
+                          title: str = None) -> bool:
+        if Config.WATCHLIST_ENGINE["enabled"]:
+            engine = cls.__get_watchlist_engine()
+            user_id = engine.get_user_id(username=username)
+            movie_id = engine.get_movie_id(title=title)
+            return user_id is not None and movie_id is not None and \
+                engine.has_watched(user_id=user_id, movie_id=movie_id)
+
+        user_id = cls.get_user_id_by_username(username=username)
+        movie_id = cls.get_movie_id_by_title(title=title)
+        if user_id is None or movie_id is None:
+            return False
+
+        def build() -> str:
+            table = Table("watch_list")
+            query = Query.from_(table=table).select(1).\
+                where(table.user_id == Parameter("?")).\
+                where(table.movie_id == Parameter("?"))
+            return query.get_sql()
+
+        query_string = Statements.get(key="has_watched_movie",
+                                      builder=build)
+        parameters = (user_id, movie_id)
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor.fetchone() is not None
+
+    @classmethod
+    def get_watchlist_engine_memory_usage(cls) -> Dict[str, int]:
+        # Loads the engine when it is not loaded yet.
+        return cls.__get_watchlist_engine().get_memory_usage()
+
+    @classmethod
+    def __get_watchlist_engine(cls) -> WatchlistEngine:
+        # Loaded under the write lock like the recommender, so no write
+        # can be committed between reading the tables and later events.
+        # Writes of other processes send no events, they reset it.
+        cls.__pool.check_external_writes()
+        if not cls.__watchlist_engine.built:
+            with cls.__pool.writer() as connection:
+                if not cls.__watchlist_engine.built:
+                    cls.__watchlist_engine.build(
+                        users=cls.__select_tuples(
+                            connection=connection,
+                            query_string='SELECT "id","username" '
+                                         'FROM "users" ORDER BY "id"'
+                        ),
+                        movies=cls.__select_tuples(
+                            connection=connection,
+                            query_string='SELECT "id","title",'
+                                         '"release_timestamp","release_date" '
+                                         'FROM "movies" ORDER BY "id"'
+                        ),
+                        watched_movies=cls.__select_tuples(
+                            connection=connection,
+                            query_string='SELECT "user_id","movie_id" '
+                                         'FROM "watch_list" '
+                                         'ORDER BY "user_id","movie_id"'
+                        )
+                    )
+        return cls.__watchlist_engine
+
+    @staticmethod
+    def __select_tuples(connection: sqlite3.Connection = None,
+                        query_string: str = None) -> sqlite3.Cursor:
+        # Plain tuples are much cheaper than sqlite3.Row for rows that are
+        # only unpacked.
+        cursor = connection.cursor()
+        cursor.row_factory = None
+        return cursor.execute(query_string)
+
+    @classmethod
+    @Instrumentation.timed
     def select_searched_movies(cls, search_term: str = None,
                                order: bool = False,
                                order_by: str = "title",
-                               ascending: bool = True
+                               ascending: bool = True,
+                               limit: Optional[int] = None,
+                               offset: int = 0
                                ) -> sqlite3.Cursor:
-        table = Table("movies")
+        match_expression = cls.__create_match_expression(
+            search_term=search_term
+        )
+        if cls.__full_text_search_enabled and match_expression:
+            return cls.__select_full_text_searched_movies(
+                match_expression=match_expression, order=order,
+                order_by=order_by, ascending=ascending,
+                limit=limit, offset=offset
+            )
 
-        query = Query.from_(table=table).select("*").\
-            where(Lower(table.title).like(Parameter("?")))
-        parameters = (f"%{search_term.lower()}%", )
+        if order_by == "rank":
+            order_by = "title"
 
-        if order:
-            if order_by == "title":
-                orderby_column = table.title
-            elif order_by == "date":
-                orderby_column = table.release_timestamp
+        def build() -> str:
+            table = Table("movies")
+
+            query = Query.from_(table=table).select("*").\
+                where(Lower(table.title).like(Parameter("?")))
+
+            if order:
+                if order_by == "title":
+                    orderby_column = table.title
+                elif order_by == "date":
+                    orderby_column = table.release_timestamp
+
+                if ascending:
+                    order_pattern = Order.asc
+                else:
+                    order_pattern = Order.desc
+                query = query.orderby(orderby_column, order=order_pattern)
+            # Pypika renders limit and offset as literals, we keep them
+            # as parameters so that every page reuses one statement.
+            return query.get_sql() + " LIMIT ? OFFSET ?"
+
+        query_string = Statements.get(
+            key=("select_searched_movies", order, order_by, ascending),
+            builder=build
+        )
+        parameters = (f"%{search_term.lower()}%",
+                      -1 if limit is None else limit, offset)
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
+
+    @staticmethod
+    def __create_match_expression(search_term: str = None) -> str:
+        # Every word of the search term is quoted to escape fts5 syntax
+        # and matched as a prefix of a word in the title.
+        words = re.findall(r"\w+", search_term)
+        return " ".join(f'"{word}"*' for word in words)
+
+    @classmethod
+    def __select_full_text_searched_movies(cls, match_expression: str = None,
+                                           order: bool = False,
+                                           order_by: str = "rank",
+                                           ascending: bool = True,
+                                           limit: Optional[int] = None,
+                                           offset: int = 0
+                                           ) -> sqlite3.Cursor:
+        def build() -> str:
+            # Pypika does not support the fts5 match operator at the moment.
+            query_string = (
+                'SELECT "movies".* FROM "movies_fts" '
+                'JOIN "movies" ON "movies"."id"="movies_fts"."rowid" '
+                'WHERE "movies_fts" MATCH ?'
+            )
+            if order:
+                if order_by == "rank":
+                    orderby_column = 'bm25("movies_fts")'
+                elif order_by == "title":
+                    orderby_column = '"movies"."title"'
+                elif order_by == "date":
+                    orderby_column = '"movies"."release_timestamp"'
+
+                if ascending:
+                    order_pattern = "ASC"
+                else:
+                    order_pattern = "DESC"
+                query_string += f" ORDER BY {orderby_column} {order_pattern}"
+            return query_string + " LIMIT ? OFFSET ?"
+
+        query_string = Statements.get(
+            key=("select_full_text_searched_movies", order, order_by,
+                 ascending),
+            builder=build
+        )
+        parameters = (match_expression, -1 if limit is None else limit,
+                      offset)
 
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
+
+    @classmethod
+    @Instrumentation.timed
+    def select_recommended_movies(cls, username: str = None,
+                                  limit: int = Recommender.DEFAULT_LIMIT
+                                  ) -> sqlite3.Cursor:
+        user_id = cls.get_user_id_by_username(username=username)
+        if user_id is None:
+            scored_movies = []
+        else:
+            scored_movies = cls.__get_recommender().recommend_movies(
+                user_id=user_id, limit=limit
+            )
+        return cls.__select_scored_movies(scored_movies=scored_movies)
+
+    @classmethod
+    @Instrumentation.timed
+    def select_similar_movies(cls, title: str = None,
+                              limit: int = Recommender.DEFAULT_LIMIT
+                              ) -> sqlite3.Cursor:
+        movie_id = cls.get_movie_id_by_title(title=title)
+        if movie_id is None:
+            scored_movies = []
+        else:
+            scored_movies = cls.__get_recommender().similar_movies(
+                movie_id=movie_id, limit=limit
+            )
+        return cls.__select_scored_movies(scored_movies=scored_movies)
+
+    @classmethod
+    def __get_recommender(cls) -> Recommender:
+        # Built under the write lock, so no watch event can be committed
+        # between reading watch_list and applying later events. Watch
+        # events of other processes reset it.
+        cls.__pool.check_external_writes()
+        if not cls.__recommender.built:
+            with cls.__pool.writer() as connection:
+                if not cls.__recommender.built:
+                    cursor = connection.execute(
+                        'SELECT "user_id","movie_id" FROM "watch_list"'
+                    )
+                    cls.__recommender.build(
+                        watched_movies=(tuple(row) for row in cursor)
+                    )
+        return cls.__recommender
+
+    @classmethod
+    @Instrumentation.timed
+    def select_fuzzy_matched_movies(cls, search_term: str = None,
+                                    limit: int = TitleIndex.DEFAULT_LIMIT
+                                    ) -> sqlite3.Cursor:
+        # Titles with every word of search_term, allowing a few typos per
+        # word. The score is the number of typos.
+        scored_movies = cls.__get_title_index().match(
+            term=search_term, limit=limit, substring=True
+        )
+        return cls.__select_scored_movies(scored_movies=scored_movies)
+
+    @classmethod
+    @Instrumentation.timed
+    def resolve_movie_title(cls, title: str = None) -> Union[str, None]:
+        # The title itself when a movie has it. Otherwise the closest
+        # titles are only offered, a watch is never written for a title
+        # the user did not enter.
+        if cls.__find_movie_id(title=title) is not None:
+            return title
+        scored_movies = cls.__get_title_index().match(
+            term=title, limit=cls.FUZZY_CANDIDATES
+        )
+        # Movies may share a title.
+        closest_titles = list(dict.fromkeys(
+            movie["title"] for movie
+            in cls.__select_scored_movies(scored_movies=scored_movies)
+        ))
+        if len(closest_titles) == 0:
+            print(f"{title} not found in database.")
+        else:
+            print(f"{title} not found in database, did you mean "
+                  f"{' or '.join(closest_titles)}?")
+        return None
+
+    @classmethod
+    def __get_title_index(cls) -> TitleIndex:
+        # Built under the write lock like the recommender, so no movie can
+        # be inserted between reading movies and applying later inserts.
+        # Movies of other processes reset it.
+        cls.__pool.check_external_writes()
+        if not cls.__title_index.built:
+            with cls.__pool.writer() as connection:
+                if not cls.__title_index.built:
+                    cursor = connection.execute(
+                        'SELECT "id","title" FROM "movies" ORDER BY "id"'
+                    )
+                    cls.__title_index.build(
+                        movies=(tuple(row) for row in cursor)
+                    )
+        return cls.__title_index
+
+    @classmethod
+    def __select_scored_movies(
+        cls, scored_movies: List[Tuple[int, float]] = None
+    ) -> sqlite3.Cursor:
+        # Movies come back in the order of scored_movies with their score.
+        def build() -> str:
+            columns = ('"movies"."id","movies"."title",'
+                       '"movies"."release_timestamp","movies"."release_date"')
+            if len(scored_movies) == 0:
+                return (f'SELECT {columns},NULL AS "score" FROM "movies" '
+                        'WHERE 0')
+            values = ",".join(["(?,?,?)"] * len(scored_movies))
+            return (
+                f'WITH "scored"("movie_id","score","position") AS '
+                f'(VALUES {values}) '
+                f'SELECT {columns},"scored"."score" FROM "scored" '
+                'JOIN "movies" ON "movies"."id"="scored"."movie_id" '
+                'ORDER BY "scored"."position"'
+            )
+
+        query_string = Statements.get(
+            key=("select_scored_movies", len(scored_movies)), builder=build
+        )
+        parameters = tuple(
+            value for position, (movie_id, score) in enumerate(scored_movies)
+            for value in (movie_id, score, position)
+        )
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
+
+    @classmethod
+    @Instrumentation.timed
+    def select_most_watched_movies(cls, limit: Optional[int] = None,
+                                   offset: int = 0) -> sqlite3.Cursor:
+        # Counts are maintained by triggers on watch_list, the index on
+        # them returns the top movies without aggregating or sorting.
+        def build() -> str:
+            movies_table = Table("movies")
+            counts_table = Table("movie_watch_counts")
+            query = Query.from_(table=counts_table).\
+                select(movies_table.id, movies_table.title,
+                       movies_table.release_timestamp,
+                       movies_table.release_date,
+                       counts_table.watch_count).\
+                join(movies_table, JoinType.inner).\
+                on(movies_table.id == counts_table.movie_id).\
+                where(counts_table.watch_count > 0).\
+                orderby(counts_table.watch_count, order=Order.desc).\
+                orderby(counts_table.movie_id, order=Order.asc)
+            return query.get_sql() + " LIMIT ? OFFSET ?"
+
+        query_string = Statements.get(key="select_most_watched_movies",
+                                      builder=build)
+        parameters = (-1 if limit is None else limit, offset)
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
+
+    @classmethod
+    @Instrumentation.timed
+    def select_most_active_users(cls, limit: Optional[int] = None,
+                                 offset: int = 0) -> sqlite3.Cursor:
+        def build() -> str:
+            users_table = Table("users")
+            counts_table = Table("user_watch_counts")
+            query = Query.from_(table=counts_table).\
+                select(users_table.id, users_table.username,
+                       counts_table.watch_count).\
+                join(users_table, JoinType.inner).\
+                on(users_table.id == counts_table.user_id).\
+                where(counts_table.watch_count > 0).\
+                orderby(counts_table.watch_count, order=Order.desc).\
+                orderby(counts_table.user_id, order=Order.asc)
+            return query.get_sql() + " LIMIT ? OFFSET ?"
+
+        query_string = Statements.get(key="select_most_active_users",
+                                      builder=build)
+        parameters = (-1 if limit is None else limit, offset)
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
+
+    @classmethod
+    @Instrumentation.timed
+    def select_watch_counts_by_release_month(cls, ascending: bool = True
+                                             ) -> sqlite3.Cursor:
+        def build() -> str:
+            table = Table("release_month_watch_counts")
             if ascending:
                 order_pattern = Order.asc
             else:
                 order_pattern = Order.desc
-            query = query.orderby(orderby_column, order=order_pattern)
+            query = Query.from_(table=table).\
+                select(table.release_month, table.watch_count).\
+                where(table.watch_count > 0).\
+                orderby(table.release_month, order=order_pattern)
+            return query.get_sql()
+
+        query_string = Statements.get(
+            key=("select_watch_counts_by_release_month", ascending),
+            builder=build
+        )
 
-        cursor = cls.__connection.cursor()
-        cursor.execute(query.get_sql(), parameters)
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string)
         return cursor
+
+    @classmethod
+    @Instrumentation.timed
+    def get_movie_watch_count(cls, title: str = None) -> Union[int, None]:
+        movie_id = cls.get_movie_id_by_title(title=title)
+        if movie_id is None:
+            return None
+
+        def build() -> str:
+            table = Table("movie_watch_counts")
+            query = Query.from_(table=table).select(table.watch_count).\
+                where(table.movie_id == Parameter("?"))
+            return query.get_sql()
+
+        query_string = Statements.get(key="get_movie_watch_count",
+                                      builder=build)
+        parameters = (movie_id, )
+
+        rows = cls.__pool.reader().execute(query_string, parameters).\
+            fetchall()
+        return rows[0]["watch_count"] if len(rows) > 0 else 0
+
+    @classmethod
+    @Instrumentation.timed
+    def get_user_watch_count(cls, username: str = None) -> Union[int, None]:
+        user_id = cls.get_user_id_by_username(username=username)
+        if user_id is None:
+            return None
+
+        def build() -> str:
+            table = Table("user_watch_counts")
+            query = Query.from_(table=table).select(table.watch_count).\
+                where(table.user_id == Parameter("?"))
+            return query.get_sql()
+
+        query_string = Statements.get(key="get_user_watch_count",
+                                      builder=build)
+        parameters = (user_id, )
+
+        rows = cls.__pool.reader().execute(query_string, parameters).\
+            fetchall()
+        return rows[0]["watch_count"] if len(rows) > 0 else 0
+
+    @classmethod
+    @Instrumentation.timed
+    def select_watch_history(cls, username: Optional[str] = None,
+                             start: Optional[float] = None,
+                             end: Optional[float] = None,
+                             ascending: bool = False,
+                             after: Optional[Tuple] = None,
+                             limit: int = WATCH_EVENTS_PAGE_SIZE
+                             ) -> sqlite3.Cursor:
+        # Watch events with start <= watched_at < end of one user, or of
+        # all users without a username, newest first unless ascending.
+        # Results come in pages of at most limit rows, after is the
+        # (watched_at, watch_id) key of the last row of the previous page.
+        by_user = username is not None
+        user_id = None
+        if by_user:
+            user_id = cls.get_user_id_by_username(username=username)
+
+        def build() -> str:
+            watch_list_table = Table("watch_list")
+            users_table = Table("users")
+            movies_table = Table("movies")
+            watched_at = watch_list_table.watched_at
+            watch_id = watch_list_table.rowid
+
+            query = Query.from_(table=watch_list_table).\
+                select(watch_id.as_("watch_id"), watched_at,
+                       users_table.username, movies_table.id,
+                       movies_table.title, movies_table.release_timestamp,
+                       movies_table.release_date).\
+                join(users_table, JoinType.inner).\
+                on(users_table.id == watch_list_table.user_id).\
+                join(movies_table, JoinType.inner).\
+                on(movies_table.id == watch_list_table.movie_id)
+
+            # Every condition is a range of the (user_id, watched_at) or
+            # the (watched_at) index, both end with the rowid.
+            if by_user:
+                query = query.where(
+                    watch_list_table.user_id == Parameter("?")
+                )
+            if start is not None:
+                query = query.where(watched_at >= Parameter("?"))
+            else:
+                query = query.where(watched_at.notnull())
+            if end is not None:
+                query = query.where(watched_at < Parameter("?"))
+            if after is not None:
+                if ascending:
+                    compare = operator.gt
+                else:
+                    compare = operator.lt
+                query = query.where(compare(
+                    RowValue(watched_at, watch_id),
+                    RowValue(Parameter("?"), Parameter("?"))
+                ))
+
+            if ascending:
+                order_pattern = Order.asc
+            else:
+                order_pattern = Order.desc
+            query = query.orderby(watched_at, order=order_pattern).\
+                orderby(watch_id, order=order_pattern)
+            return query.get_sql() + " LIMIT ?"
+
+        query_string = Statements.get(
+            key=("select_watch_history", by_user, start is not None,
+                 end is not None, ascending, after is not None),
+            builder=build
+        )
+        parameters = tuple()
+        if by_user:
+            parameters += (user_id, )
+        if start is not None:
+            parameters += (start, )
+        if end is not None:
+            parameters += (end, )
+        if after is not None:
+            parameters += tuple(after)
+        parameters += (limit, )
+
+        cursor = cls.__pool.reader().cursor()
+        cursor.execute(query_string, parameters)
+        return cursor
+
+    @classmethod
+    def select_recently_watched(cls, username: Optional[str] = None,
+                                after: Optional[Tuple] = None,
+                                limit: int = WATCH_EVENTS_PAGE_SIZE
+                                ) -> sqlite3.Cursor:
+        # Newest first feed of one user or of all users.
+        return cls.select_watch_history(username=username, ascending=False,
+                                        after=after, limit=limit)
+
+    @classmethod
+    @Instrumentation.timed
+    def select_upcomming_releases(cls, timezone: datetime.tzinfo = None,
+                                  days: Optional[int] = None,
+                                  month: Optional[str] = None,
+                                  limit: Optional[int] = None
+                                  ) -> CachedCursor:
+        # Movies released from the start of the local day on, within the
+        # next days or in a YYYY-MM month, soonest first. Results are
+        # cached until the day ends, a movie is added to the window or
+        # another process commits.
+        cls.__pool.check_external_writes()
+        start, end = cls.__release_calendar.get_window(
+            timezone=timezone, days=days, month=month
+        )
+        key = (start, end, limit)
+        rows = cls.__release_calendar.get(key=key)
+        if rows is not None:
+            return CachedCursor(rows=rows)
+
+        def build() -> str:
+            table = Table(name="movies")
+            query = Query.from_(table=table).select("*").\
+                where(table.release_timestamp >= Parameter("?"))
+            if end is not None:
+                query = query.where(
+                    table.release_timestamp < Parameter("?")
+                )
+            query = query.\
+                orderby(table.release_timestamp, order=Order.asc).\
+                orderby(table.id, order=Order.asc)
+            return query.get_sql() + " LIMIT ?"
+
+        query_string = Statements.get(
+            key=("select_upcomming_releases", end is not None),
+            builder=build
+        )
+        parameters = (start, ) if end is None else (start, end)
+        parameters += (-1 if limit is None else limit, )
+
+        # Read under the write lock, so a movie inserted meanwhile is
+        # either part of the cached rows or invalidates them afterwards.
+        with cls.__pool.writer() as connection:
+            rows = connection.execute(query_string, parameters).fetchall()
+            cls.__release_calendar.put(key=key, rows=rows)
+        return CachedCursor(rows=rows)
@@ -0,0 +1,27 @@
+from typing import Optional
+
+
+class DatabaseListener:
+
+    # Listeners keep state derived from the database up to date. Events
+    # are sent from inside the write transaction, listeners only implement
+    # the events they care about.
+
+    def on_user_inserted(self, user_id: int = None,
+                         username: str = None) -> None:
+        pass
+
+    def on_movie_inserted(self, movie_id: int = None, title: str = None,
+                          release_timestamp: float = None,
+                          release_date: Optional[str] = None) -> None:
+        pass
+
+    def on_watched_movie_inserted(self, user_id: int = None,
+                                  movie_id: int = None) -> None:
+        pass
+
+    def on_reset(self) -> None:
+        # Sent when rows changed without an event of their own, i.e. bulk
+        # inserts, rollbacks and connecting to another database. Derived
+        # state has to be rebuilt.
+        pass
@@ -13,6 +13,11 @@ class MenuFunctionalities(Enum):
     VIEW_WATCHED_MOVIES = 7
     SEARCH_MOVIE = 8
     EXIT = 9
+    # Added later, numbered after EXIT so existing selections keep theirs.
+    RECOMMEND_MOVIES = 10
+    VIEW_MOST_WATCHED_MOVIES = 11
+    VIEW_MOST_ACTIVE_USERS = 12
+    VIEW_WATCHES_PER_RELEASE_MONTH = 13
 
     @classmethod
     def get_sorted_functionalities(cls) -> List:
@@ -0,0 +1,47 @@
+import datetime
+import functools
+from typing import Optional
+
+
+class DateFormatter:
+
+    DATE_FORMAT = "%b %d %Y"
+    CACHE_SIZE = 4096
+
+    # Timestamps are cached as they are. Historic local mean time offsets
+    # are not whole minutes, so no coarser bucket is safe, and release
+    # timestamps are local midnights that repeat anyway.
+
+    @classmethod
+    def format_release_date(cls, release_timestamp: float = None,
+                            release_date: Optional[str] = None,
+                            timezone: datetime.tzinfo = None) -> str:
+        # The local release date stored next to the timestamp needs no
+        # timezone conversion at all.
+        if release_date is not None:
+            return cls.__format_iso_date(release_date)
+        return cls.format_timestamp(timestamp=release_timestamp,
+                                    timezone=timezone)
+
+    @classmethod
+    def format_timestamp(cls, timestamp: float = None,
+                         timezone: datetime.tzinfo = None) -> str:
+        return cls.__format_timestamp(timestamp, timezone)
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        cls.__format_timestamp.cache_clear()
+        cls.__format_iso_date.cache_clear()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def __format_timestamp(timestamp: float = None,
+                           timezone: datetime.tzinfo = None) -> str:
+        local_date = datetime.datetime.fromtimestamp(timestamp, timezone)
+        return local_date.strftime(DateFormatter.DATE_FORMAT)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def __format_iso_date(release_date: str = None) -> str:
+        local_date = datetime.date.fromisoformat(release_date)
+        return local_date.strftime(DateFormatter.DATE_FORMAT)
@@ -0,0 +1,40 @@
+import collections
+import threading
+from typing import Hashable, Optional
+
+
+class IdentityCache:
+
+    DEFAULT_MAX_SIZE = 100000
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        # Least recently used entries are evicted first once max_size
+        # entries are cached.
+        self.__max_size = max_size
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: Hashable = None) -> Optional[int]:
+        with self.__lock:
+            id_ = self.__entries.get(key)
+            if id_ is not None:
+                self.__entries.move_to_end(key)
+            return id_
+
+    def put(self, key: Hashable = None, id_: int = None) -> None:
+        with self.__lock:
+            self.__entries[key] = id_
+            self.__entries.move_to_end(key)
+            if len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable = None) -> None:
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
@@ -0,0 +1,270 @@
+import csv
+import datetime
+import gzip
+import itertools
+import json
+import math
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (Callable, Dict, Iterable, Iterator, List, Optional,
+                    TextIO, Tuple)
+
+from modules.database import Database
+from modules.npy import NpyFormat
+from modules.timezones import TimezoneService
+
+
+@dataclass
+class ImportReport:
+
+    table: str
+    rows: int = 0
+    inserted: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def skipped(self) -> int:
+        return self.rows - self.inserted
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.rows / self.elapsed_seconds
+
+    def __str__(self):
+        return (f"{self.table}: {self.rows} rows read, "
+                f"{self.inserted} inserted, {self.skipped} skipped "
+                f"(duplicates or unknown references) in "
+                f"{self.elapsed_seconds:.2f}s "
+                f"({self.rows_per_second:.0f} rows/sec)")
+
+
+class Importer:
+
+    TABLES = ("users", "movies", "watch_list")
+    FORMATS = ("csv", "jsonl")
+    DEFAULT_CHUNK_SIZE = 5000
+    MANIFEST_NAME = "manifest.json"
+    # Columns that are numbers in a restored export, empty csv fields of
+    # these and of release_date are NULL.
+    INTEGER_COLUMNS = ("id", "user_id", "movie_id")
+    REAL_COLUMNS = ("release_timestamp", "watched_at")
+
+    @classmethod
+    def import_file(cls, table: str = None, path: Path = None,
+                    file_format: Optional[str] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    timezone: datetime.tzinfo = None) -> ImportReport:
+        if table not in cls.TABLES:
+            raise ValueError(f"Unknown table {table}, expected one of "
+                             f"{', '.join(cls.TABLES)}")
+        path = Path(path)
+        if file_format is None:
+            file_format = cls.__guess_format(path=path)
+
+        report = ImportReport(table=table)
+        start_time = time.perf_counter()
+        with cls.__open_text(path=path) as input_file:
+            records = cls.__read_records(input_file=input_file,
+                                         file_format=file_format)
+            for chunk in cls.__chunk(records=records, chunk_size=chunk_size):
+                rows = cls.__convert_records(table=table, records=chunk,
+                                             timezone=timezone)
+                report.rows += len(rows)
+                report.inserted += cls.__insert_rows(table=table, rows=rows)
+        report.elapsed_seconds = time.perf_counter() - start_time
+        return report
+
+    @classmethod
+    def restore(cls, directory: Path = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[ImportReport]:
+        # Loads an export of Exporter with its ids, which is why the
+        # database has to be empty. Rows skip the name lookups of
+        # import_file.
+        directory = Path(directory)
+        with open(file=directory / cls.MANIFEST_NAME, mode="r") as manifest:
+            tables = json.load(fp=manifest)["tables"]
+        for table in cls.TABLES:
+            if Database.count_rows(table=table) > 0:
+                raise ValueError(f"Can not restore into a database with "
+                                 f"{table}, it has to be empty")
+
+        reports = []
+        for table in cls.TABLES:
+            entry = tables[table]
+            report = ImportReport(table=table)
+            start_time = time.perf_counter()
+            if entry["format"] == "npy":
+                rows = cls.__read_columns(directory=directory, entry=entry,
+                                          chunk_size=chunk_size)
+            else:
+                rows = cls.__read_rows(directory=directory, entry=entry)
+            for chunk in cls.__chunk(records=rows, chunk_size=chunk_size):
+                report.rows += len(chunk)
+                report.inserted += Database.bulk_restore_rows(table=table,
+                                                              rows=chunk)
+            report.elapsed_seconds = time.perf_counter() - start_time
+            reports.append(report)
+        return reports
+
+    @classmethod
+    def __read_rows(cls, directory: Path = None,
+                    entry: Dict = None) -> Iterator[Tuple]:
+        columns = entry["columns"]
+        converters = [cls.__get_converter(column=column)
+                      for column in columns]
+        with cls.__open_text(path=directory / entry["files"][0]) as input_file:
+            for record in cls.__read_records(input_file=input_file,
+                                             file_format=entry["format"]):
+                yield tuple(convert(record[column]) for convert, column
+                            in zip(converters, columns))
+
+    @classmethod
+    def __get_converter(cls, column: str = None) -> Callable:
+        if column in cls.INTEGER_COLUMNS:
+            number = int
+        elif column in cls.REAL_COLUMNS:
+            number = float
+        elif column == "release_date":
+            number = str
+        else:
+            return lambda value: value
+
+        def convert(value):
+            return None if value is None or value == "" else number(value)
+        return convert
+
+    @staticmethod
+    def __read_columns(directory: Path = None, entry: Dict = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE
+                       ) -> Iterator[Tuple]:
+        # The (n, 2) ids and (n, ) watch times of a columnar watch_list.
+        ids_path, watched_at_path = (directory / name
+                                     for name in entry["files"])
+        with open(file=ids_path, mode="rb") as ids_file, \
+                open(file=watched_at_path, mode="rb") as watched_at_file:
+            ids_descr, ids_shape = NpyFormat.read_header(input_file=ids_file)
+            watched_at_descr, watched_at_shape = NpyFormat.read_header(
+                input_file=watched_at_file
+            )
+            if ids_shape != (entry["rows"], 2) or \
+                    watched_at_shape != (entry["rows"], ):
+                raise ValueError(f"Arrays of {ids_path} and "
+                                 f"{watched_at_path} do not match")
+            ids_chunks = NpyFormat.read_items(
+                input_file=ids_file, descr=ids_descr,
+                count=2 * entry["rows"], chunk_size=2 * chunk_size
+            )
+            watched_at_chunks = NpyFormat.read_items(
+                input_file=watched_at_file, descr=watched_at_descr,
+                count=entry["rows"], chunk_size=chunk_size
+            )
+            for ids, watched_at in zip(ids_chunks, watched_at_chunks):
+                for index, watched in enumerate(watched_at):
+                    yield (ids[2 * index], ids[2 * index + 1],
+                           None if math.isnan(watched) else watched)
+
+    @staticmethod
+    def __open_text(path: Path = None) -> TextIO:
+        if path.suffix.lower() == ".gz":
+            return gzip.open(filename=path, mode="rt", newline="")
+        return open(file=path, mode="r", newline="")
+
+    @classmethod
+    def __guess_format(cls, path: Path = None) -> str:
+        if path.suffix.lower() == ".gz":
+            path = path.with_suffix("")
+        suffix = path.suffix.lower()
+        if suffix == ".csv":
+            return "csv"
+        if suffix in (".jsonl", ".ndjson"):
+            return "jsonl"
+        raise ValueError(f"Can not guess the format of {path}, expected "
+                         f"one of {', '.join(cls.FORMATS)}")
+
+    @staticmethod
+    def __read_records(input_file: Iterable[str] = None,
+                       file_format: str = None) -> Iterator[Dict]:
+        if file_format == "csv":
+            yield from csv.DictReader(input_file)
+        elif file_format == "jsonl":
+            for line in input_file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unknown format {file_format}")
+
+    @staticmethod
+    def __chunk(records: Iterator[Dict] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List]:
+        while chunk := list(itertools.islice(records, chunk_size)):
+            yield chunk
+
+    @classmethod
+    def __convert_records(cls, table: str = None, records: List[Dict] = None,
+                          timezone: datetime.tzinfo = None) -> List:
+        if table == "users":
+            return [record["username"] for record in records]
+        if table == "watch_list":
+            rows = [None] * len(records)
+            for index, record in enumerate(records):
+                watched_at = record.get("watched_at")
+                if watched_at in (None, ""):
+                    watched_at = None
+                else:
+                    watched_at = float(watched_at)
+                rows[index] = (record["username"], record["title"],
+                               watched_at)
+            return rows
+
+        # Release dates of the whole chunk are converted together, every
+        # distinct date once.
+        dated = [record for record in records
+                 if record.get("release_timestamp") in (None, "")]
+        converted = iter(TimezoneService.parse_local_dates(
+            date_strings=(record["release_date"] for record in dated),
+            timezone=timezone
+        ))
+        rows = [None] * len(records)
+        for index, record in enumerate(records):
+            release_timestamp = record.get("release_timestamp")
+            if release_timestamp in (None, ""):
+                release_timestamp, release_date = next(converted)
+            else:
+                release_timestamp = float(release_timestamp)
+                release_date = cls.__get_release_date(
+                    release_date=record.get("release_date"),
+                    release_timestamp=release_timestamp, timezone=timezone
+                )
+            rows[index] = (record["title"], release_timestamp, release_date)
+        return rows
+
+    @staticmethod
+    def __get_release_date(release_date: Optional[str] = None,
+                           release_timestamp: float = None,
+                           timezone: datetime.tzinfo = None) -> str:
+        # A given date is kept, exports write it as an ISO date and import
+        # files as dd-mm-YYYY. Otherwise it is the local day of the
+        # timestamp.
+        if release_date in (None, ""):
+            return datetime.datetime.fromtimestamp(
+                release_timestamp, timezone
+            ).date().isoformat()
+        try:
+            return datetime.date.fromisoformat(release_date).isoformat()
+        except ValueError:
+            return TimezoneService.parse_local_date(
+                date_string=release_date, timezone=timezone
+            )[1]
+
+    @staticmethod
+    def __insert_rows(table: str = None, rows: List = None) -> int:
+        if table == "users":
+            return Database.bulk_insert_users_to_users(usernames=rows)
+        if table == "movies":
+            return Database.bulk_insert_movies_to_movies(movies=rows)
+        return Database.bulk_insert_watched_movies_to_watch_list(
+            watched_movies=rows
+        )
@@ -0,0 +1,301 @@
+import bisect
+import functools
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class Sink:
+
+    # Sinks only implement the events they care about.
+
+    def record_query(self, sql: str = None, seconds: float = None,
+                     rows: int = None) -> None:
+        pass
+
+    def record_slow_query(self, sql: str = None, seconds: float = None,
+                          rows: int = None, plan: List[str] = None) -> None:
+        pass
+
+    def record_method(self, name: str = None, seconds: float = None) -> None:
+        pass
+
+
+class StatsSink(Sink):
+
+    # Upper bounds of the histogram buckets in milliseconds, the last
+    # bucket counts everything slower.
+    BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__queries: Dict[str, Dict] = {}
+        self.__methods: Dict[str, Dict] = {}
+
+    def record_query(self, sql: str = None, seconds: float = None,
+                     rows: int = None) -> None:
+        with self.__lock:
+            stats = self.__record(entries=self.__queries, key=sql,
+                                  seconds=seconds)
+            stats["rows"] += rows
+
+    def record_slow_query(self, sql: str = None, seconds: float = None,
+                          rows: int = None, plan: List[str] = None) -> None:
+        with self.__lock:
+            self.__queries[sql]["slow"] += 1
+
+    def record_method(self, name: str = None, seconds: float = None) -> None:
+        with self.__lock:
+            self.__record(entries=self.__methods, key=name, seconds=seconds)
+
+    def snapshot(self) -> Dict:
+        with self.__lock:
+            return {
+                "histogram_buckets_ms": list(self.BUCKETS_MS),
+                "queries": self.__copy(self.__queries),
+                "methods": self.__copy(self.__methods),
+            }
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__queries.clear()
+            self.__methods.clear()
+
+    def __record(self, entries: Dict[str, Dict] = None, key: str = None,
+                 seconds: float = None) -> Dict:
+        stats = entries.get(key)
+        if stats is None:
+            stats = {
+                "count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                "rows": 0, "slow": 0,
+                "histogram": [0] * (len(self.BUCKETS_MS) + 1),
+            }
+            entries[key] = stats
+        stats["count"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        bucket = bisect.bisect_left(self.BUCKETS_MS, seconds * 1000)
+        stats["histogram"][bucket] += 1
+        return stats
+
+    @staticmethod
+    def __copy(entries: Dict[str, Dict] = None) -> Dict[str, Dict]:
+        return {key: {**stats, "histogram": list(stats["histogram"])}
+                for key, stats in entries.items()}
+
+
+class LogFileSink(Sink):
+
+    def __init__(self, path: Path = None):
+        self.__lock = threading.Lock()
+        self.__file = open(file=path, mode="a", buffering=1)
+
+    def record_slow_query(self, sql: str = None, seconds: float = None,
+                          rows: int = None, plan: List[str] = None) -> None:
+        record = {
+            "time": time.time(), "sql": sql, "seconds": seconds,
+            "rows": rows, "plan": plan,
+        }
+        with self.__lock:
+            self.__file.write(json.dumps(record) + "\n")
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__file.close()
+
+
+class Instrumentation:
+
+    DEFAULT_SLOW_QUERY_THRESHOLD_MS = 50
+
+    enabled = False
+    slow_query_threshold = DEFAULT_SLOW_QUERY_THRESHOLD_MS / 1000
+    stats = StatsSink()
+
+    __sinks: List[Sink] = [stats]
+
+    @classmethod
+    def configure(cls, enabled: bool = False,
+                  slow_query_threshold_ms: float =
+                  DEFAULT_SLOW_QUERY_THRESHOLD_MS,
+                  log_path: Optional[Path] = None) -> None:
+        cls.enabled = enabled
+        cls.slow_query_threshold = slow_query_threshold_ms / 1000
+        for sink in cls.__sinks:
+            if isinstance(sink, LogFileSink):
+                sink.close()
+        cls.__sinks = [cls.stats]
+        if enabled and log_path is not None:
+            cls.__sinks.append(LogFileSink(path=log_path))
+
+    @classmethod
+    def add_sink(cls, sink: Sink = None) -> None:
+        cls.__sinks.append(sink)
+
+    @classmethod
+    def get_stats(cls) -> Dict:
+        return cls.stats.snapshot()
+
+    @classmethod
+    def timed(cls, function: Callable = None) -> Callable:
+        # Wraps the plain function of a classmethod, so it has to sit
+        # below the classmethod decorator.
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not cls.enabled:
+                return function(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start_time
+                for sink in cls.__sinks:
+                    sink.record_method(name=name, seconds=seconds)
+
+        return wrapper
+
+    @classmethod
+    def record_query(cls, connection: sqlite3.Connection = None,
+                     sql: str = None, parameters: Tuple = None,
+                     seconds: float = None, rows: int = None) -> None:
+        for sink in cls.__sinks:
+            sink.record_query(sql=sql, seconds=seconds, rows=rows)
+        if seconds < cls.slow_query_threshold:
+            return None
+
+        plan = cls.__explain(connection=connection, sql=sql,
+                             parameters=parameters)
+        for sink in cls.__sinks:
+            sink.record_slow_query(sql=sql, seconds=seconds, rows=rows,
+                                   plan=plan)
+
+    @staticmethod
+    def __explain(connection: sqlite3.Connection = None, sql: str = None,
+                  parameters: Tuple = None) -> List[str]:
+        # The plan is read through the base class so that it is not
+        # instrumented itself. executemany is explained with its first
+        # parameters.
+        try:
+            cursor = sqlite3.Connection.execute(
+                connection, "EXPLAIN QUERY PLAN " + sql, parameters or ()
+            )
+            return [row[-1] for row in cursor.fetchall()]
+        except sqlite3.Error as error:
+            return [f"EXPLAIN failed: {error}"]
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+
+    # A query is recorded once its result is exhausted, the cursor is
+    # closed, reused or dropped, the latter covers results read with a
+    # single fetchone. Its wall time only adds up the time spent inside
+    # execute and fetch calls, not the time the caller spends per row.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__sql = None
+        self.__parameters = None
+        self.__seconds = 0.0
+        self.__rows = 0
+
+    def execute(self, sql, parameters=()):
+        self.__finish()
+        self.__sql = sql
+        self.__parameters = parameters
+        start_time = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.__seconds += time.perf_counter() - start_time
+            if self.description is None:
+                self.__rows = max(self.rowcount, 0)
+                self.__finish()
+
+    def executemany(self, sql, seq_of_parameters):
+        self.__finish()
+        self.__sql = sql
+        seq_of_parameters = iter(seq_of_parameters)
+        self.__parameters = next(seq_of_parameters, None)
+        if self.__parameters is not None:
+            seq_of_parameters = itertools.chain((self.__parameters, ),
+                                                seq_of_parameters)
+        start_time = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.__seconds += time.perf_counter() - start_time
+            self.__rows = max(self.rowcount, 0)
+            self.__finish()
+
+    def fetchone(self):
+        start_time = time.perf_counter()
+        row = super().fetchone()
+        self.__seconds += time.perf_counter() - start_time
+        if row is None:
+            self.__finish()
+        else:
+            self.__rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        start_time = time.perf_counter()
+        rows = super().fetchmany(size)
+        self.__seconds += time.perf_counter() - start_time
+        self.__rows += len(rows)
+        if len(rows) < size:
+            self.__finish()
+        return rows
+
+    def fetchall(self):
+        start_time = time.perf_counter()
+        rows = super().fetchall()
+        self.__seconds += time.perf_counter() - start_time
+        self.__rows += len(rows)
+        self.__finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self.__finish()
+        super().close()
+
+    def __del__(self):
+        self.__finish()
+
+    def __finish(self) -> None:
+        if self.__sql is None:
+            return None
+        Instrumentation.record_query(
+            connection=self.connection, sql=self.__sql,
+            parameters=self.__parameters, seconds=self.__seconds,
+            rows=self.__rows
+        )
+        self.__sql = None
+        self.__parameters = None
+        self.__seconds = 0.0
+        self.__rows = 0
+
+
+class InstrumentedConnection(sqlite3.Connection):
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,35 @@
+import importlib
+from typing import Any, Optional
+
+
+class LazyImport:
+
+    # Stands in for a module or one of its attributes and imports it on
+    # first use, so modules that only need a dependency on some code paths
+    # do not pay for importing it at startup.
+
+    def __init__(self, module_name: str = None,
+                 attribute: Optional[str] = None):
+        self.__module_name = module_name
+        self.__attribute = attribute
+        self.__target = None
+
+    def load(self) -> Any:
+        if self.__target is None:
+            target = importlib.import_module(self.__module_name)
+            if self.__attribute is not None:
+                target = getattr(target, self.__attribute)
+            self.__target = target
+        return self.__target
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        name = self.__module_name
+        if self.__attribute is not None:
+            name = f"{name}.{self.__attribute}"
+        return f"<LazyImport {name}>"
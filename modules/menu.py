@@ -1,119 +1,201 @@
 import datetime
 import sqlite3
-from typing import List
-
-import pytz
+from typing import Callable, List, NamedTuple, Optional, Tuple
 
 from modules.database import Database
 from modules.enums import MenuFunctionalities
-from modules.utilities import Utilities
+from modules.formatting import DateFormatter
+from modules.timezones import TimezoneService
+
+
+class Page(NamedTuple):
+
+    count: int = 0
+    first_key: Optional[Tuple] = None
+    last_key: Optional[Tuple] = None
 
 
 class MenuUtilities:
 
+    FETCH_SIZE = 100
+
     @staticmethod
     def view_movies(cursor: sqlite3.Cursor = None,
-                    timezone: pytz.BaseTzInfo = None,
-                    header: str = None, indent: int = 4) -> None:
-        cursor_data = cursor.fetchall()
-        if len(cursor_data) > 0:
-            indentation = " " * indent
-            print(f"\n{indentation}-- {header} --\n")
-            for movie in cursor_data:
-                id_ = movie["id"]
-                title = movie["title"]
-                release_date = datetime.datetime.fromtimestamp(
-                    movie["release_timestamp"], timezone
-                )
-                release_date_string = release_date.strftime("%b %d %Y")
-                output_string = \
-                    f"{indentation}{id_}:  {title},    {release_date_string}"
-                print(output_string)
+                    timezone: datetime.tzinfo = None,
+                    header: str = None, indent: int = 4,
+                    fetch_size: int = FETCH_SIZE,
+                    page_key: Callable[[sqlite3.Row], Tuple] = None
+                    ) -> Page:
+        def format_movie(movie: sqlite3.Row) -> str:
+            id_ = movie["id"]
+            title = movie["title"]
+            release_date_string = DateFormatter.format_release_date(
+                release_timestamp=movie["release_timestamp"],
+                release_date=movie["release_date"], timezone=timezone
+            )
+            return f"{indentation}{id_}:  {title},    {release_date_string}"
+
+        indentation = " " * indent
+        return MenuUtilities.__view_rows(
+            cursor=cursor, header=header, indentation=indentation,
+            format_row=format_movie, fetch_size=fetch_size,
+            page_key=page_key
+        )
 
     @staticmethod
     def view_users(cursor: sqlite3.Cursor = None, header: str = None,
-                   indent: int = 4) -> None:
-        cursor_data = cursor.fetchall()
-        if len(cursor_data) > 0:
-            indentation = " " * indent
-            print(f"\n{indentation}-- {header} --\n")
-            for user in cursor_data:
-                id_ = user["id"]
-                username = user["username"]
-                output_string = \
-                    f"{indentation}{id_}:  {username}"
-                print(output_string)
+                   indent: int = 4, fetch_size: int = FETCH_SIZE,
+                   page_key: Callable[[sqlite3.Row], Tuple] = None
+                   ) -> Page:
+        def format_user(user: sqlite3.Row) -> str:
+            id_ = user["id"]
+            username = user["username"]
+            return f"{indentation}{id_}:  {username}"
+
+        indentation = " " * indent
+        return MenuUtilities.__view_rows(
+            cursor=cursor, header=header, indentation=indentation,
+            format_row=format_user, fetch_size=fetch_size,
+            page_key=page_key
+        )
+
+    @staticmethod
+    def view_watch_counts(cursor: sqlite3.Cursor = None,
+                          header: str = None, indent: int = 4,
+                          fetch_size: int = FETCH_SIZE,
+                          format_label: Callable[[sqlite3.Row], str] = None
+                          ) -> Page:
+        def format_watch_count(row: sqlite3.Row) -> str:
+            label = format_label(row)
+            watch_count = row["watch_count"]
+            return f"{indentation}{label},    {watch_count} watched"
+
+        indentation = " " * indent
+        return MenuUtilities.__view_rows(
+            cursor=cursor, header=header, indentation=indentation,
+            format_row=format_watch_count, fetch_size=fetch_size
+        )
+
+    @staticmethod
+    def __view_rows(cursor: sqlite3.Cursor = None, header: str = None,
+                    indentation: str = None,
+                    format_row: Callable[[sqlite3.Row], str] = None,
+                    fetch_size: int = FETCH_SIZE,
+                    page_key: Callable[[sqlite3.Row], Tuple] = None
+                    ) -> Page:
+        # Rows are printed batch by batch as they are fetched, so the first
+        # rows show up immediately and memory does not grow with results.
+        count = 0
+        first_row = last_row = None
+        while rows := cursor.fetchmany(fetch_size):
+            if count == 0:
+                print(f"\n{indentation}-- {header} --\n")
+                first_row = rows[0]
+            print("\n".join(format_row(row) for row in rows))
+            count += len(rows)
+            last_row = rows[-1]
+
+        if count == 0 or page_key is None:
+            return Page(count=count)
+        return Page(count=count, first_key=page_key(first_row),
+                    last_key=page_key(last_row))
 
 
 class MenuFunctions:
 
+    SEARCH_PAGE_SIZE = 20
+    PAGE_SIZE = 20
+    RECOMMENDATION_LIMIT = 10
+    SUGGESTION_LIMIT = 5
+    TOP_LIST_SIZE = 10
+    # Window of the batch and api upcomming listings, the menu lists every
+    # upcomming release.
+    UPCOMMING_DAYS = 90
+    UPCOMMING_LIMIT = 100
+
     @classmethod
-    def add_user(cls, username: str = None):
-        Database.insert_user_to_users(username=username)
+    def add_user(cls, username: str = None) -> bool:
+        return Database.insert_user_to_users(username=username)
 
     @classmethod
     def add_movie(cls, title: str = None, release_date_string: str = None,
-                  timezone: pytz.BaseTzInfo = None) -> None:
-        release_date_local = \
-            datetime.datetime.strptime(release_date_string, "%d-%m-%Y")
-        release_date_utc = Utilities.convert_date_time_local_to_utc(
-            local_dt=release_date_local, timezone=timezone
-        )
-        release_date_timestamp = release_date_utc.timestamp()
-        Database.insert_movie_to_movies(
+                  timezone: datetime.tzinfo = None) -> bool:
+        release_date_timestamp, release_date = \
+            TimezoneService.parse_local_date(
+                date_string=release_date_string, timezone=timezone
+            )
+        return Database.insert_movie_to_movies(
             title=title,
-            release_date_timestamp=release_date_timestamp
+            release_date_timestamp=release_date_timestamp,
+            release_date=release_date
         )
 
     @classmethod
-    def watch_movie(cls, username: str = None, title: str = None):
-        Database.insert_watched_movie_to_watch_list(
+    def watch_movie(cls, username: str = None, title: str = None) -> bool:
+        title = Database.resolve_movie_title(title=title)
+        if title is None:
+            return False
+        return Database.submit_watched_movie(
             username=username, title=title
         )
 
     @classmethod
-    def view_all_users(cls, indent: int = 4) -> None:
-        cursor = Database.select_users_from_users()
+    def view_all_users(cls, indent: int = 4,
+                       page_size: Optional[int] = None,
+                       after: Optional[Tuple] = None,
+                       before: Optional[Tuple] = None) -> Page:
+        cursor = Database.select_users_from_users(
+            order=True, order_by="username", ascending=True,
+            after=after, before=before, limit=page_size
+        )
         header = "Users"
-        MenuUtilities.view_users(
+        return MenuUtilities.view_users(
             cursor=cursor, header=header,
-            indent=indent
+            indent=indent,
+            page_key=(lambda user: (user["username"], user["id"]))
         )
 
     @classmethod
-    def view_upcomming_movies(cls, timezone: pytz.BaseTzInfo = None,
-                              indent: int = 4) -> None:
-        today_date_local = datetime.datetime.today()
-        today_date = Utilities.convert_date_time_local_to_utc(
-            local_dt=today_date_local, timezone=timezone
+    def view_upcomming_movies(cls, timezone: datetime.tzinfo = None,
+                              indent: int = 4,
+                              days: Optional[int] = None,
+                              month: Optional[str] = None,
+                              limit: Optional[int] = None
+                              ) -> None:
+        cursor = Database.select_upcomming_releases(
+            timezone=timezone, days=days, month=month, limit=limit
         )
-        today_timestamp = today_date.timestamp()
-        cursor = Database.select_movies_from_movies(
-            upcomming=True, today_timestamp=today_timestamp,
-            order=True, order_by="date", ascending=True
-        )
-        header = "Upcomming Movies"
+        if month is not None:
+            header = f"Upcomming Movies in {month}"
+        elif days is not None:
+            header = f"Upcomming Movies in the next {days} days"
+        else:
+            header = "Upcomming Movies"
         MenuUtilities.view_movies(
             cursor=cursor, timezone=timezone,
             header=header, indent=indent
         )
 
     @classmethod
-    def view_all_movies(cls, timezone: pytz.BaseTzInfo = None,
-                        indent: int = 4) -> None:
+    def view_all_movies(cls, timezone: datetime.tzinfo = None,
+                        indent: int = 4, page_size: Optional[int] = None,
+                        after: Optional[Tuple] = None,
+                        before: Optional[Tuple] = None) -> Page:
         cursor = Database.select_movies_from_movies(
             upcomming=False, order=True,
-            order_by="title", ascending=True
+            order_by="title", ascending=True,
+            after=after, before=before, limit=page_size
         )
         header = "All Movies"
-        MenuUtilities.view_movies(
+        return MenuUtilities.view_movies(
             cursor=cursor, timezone=timezone,
-            header=header, indent=indent
+            header=header, indent=indent,
+            page_key=(lambda movie: (movie["title"], movie["id"]))
         )
 
     @classmethod
     def view_watched_movies(cls, username: str = None,
-                            timezone: pytz.BaseTzInfo = None,
+                            timezone: datetime.tzinfo = None,
                             indent: int = 4) -> None:
         cursor = Database.select_user_watched_movies(
             username=username, order=True, order_by="title",
@@ -127,18 +209,74 @@ class MenuFunctions:
 
     @classmethod
     def search_movie(cls, search_term: str = None,
-                     timezone: pytz.BaseTzInfo = None,
-                     indent: int = 4):
+                     timezone: datetime.tzinfo = None,
+                     indent: int = 4, limit: int = SEARCH_PAGE_SIZE,
+                     offset: int = 0) -> Page:
         cursor = Database.select_searched_movies(
             search_term=search_term, order=True,
-            order_by="title", ascending=True
+            order_by="rank", ascending=True,
+            limit=limit, offset=offset
         )
         header = f"Found Movies like {search_term}"
+        page = MenuUtilities.view_movies(
+            cursor=cursor, timezone=timezone,
+            header=header, indent=indent
+        )
+        if page.count > 0 or offset > 0:
+            return page
+
+        # Nothing contains the search term, maybe it is misspelled.
+        cursor = Database.select_fuzzy_matched_movies(
+            search_term=search_term, limit=cls.SUGGESTION_LIMIT
+        )
+        header = f"No Movies like {search_term}, did you mean"
+        return MenuUtilities.view_movies(
+            cursor=cursor, timezone=timezone,
+            header=header, indent=indent
+        )
+
+    @classmethod
+    def recommend_movies(cls, username: str = None,
+                         timezone: datetime.tzinfo = None,
+                         indent: int = 4,
+                         limit: int = RECOMMENDATION_LIMIT) -> None:
+        cursor = Database.select_recommended_movies(username=username,
+                                                    limit=limit)
+        header = f"Recommended Movies for {username}"
         MenuUtilities.view_movies(
             cursor=cursor, timezone=timezone,
             header=header, indent=indent
         )
 
+    @classmethod
+    def view_most_watched_movies(cls, indent: int = 4,
+                                 limit: int = TOP_LIST_SIZE) -> None:
+        cursor = Database.select_most_watched_movies(limit=limit)
+        header = "Most Watched Movies"
+        MenuUtilities.view_watch_counts(
+            cursor=cursor, header=header, indent=indent,
+            format_label=(lambda movie: f"{movie['id']}:  {movie['title']}")
+        )
+
+    @classmethod
+    def view_most_active_users(cls, indent: int = 4,
+                               limit: int = TOP_LIST_SIZE) -> None:
+        cursor = Database.select_most_active_users(limit=limit)
+        header = "Most Active Users"
+        MenuUtilities.view_watch_counts(
+            cursor=cursor, header=header, indent=indent,
+            format_label=(lambda user: f"{user['id']}:  {user['username']}")
+        )
+
+    @classmethod
+    def view_watches_per_release_month(cls, indent: int = 4) -> None:
+        cursor = Database.select_watch_counts_by_release_month()
+        header = "Watches per Release Month"
+        MenuUtilities.view_watch_counts(
+            cursor=cursor, header=header, indent=indent,
+            format_label=(lambda month: month["release_month"])
+        )
+
 
 class Menu:
 
@@ -0,0 +1,304 @@
+import sqlite3
+from typing import Callable, List
+
+from modules.lazy_import import LazyImport
+
+# Pypika is only needed when there are pending migrations.
+Column = LazyImport("pypika", "Column")
+Query = LazyImport("pypika", "Query")
+Table = LazyImport("pypika", "Table")
+
+
+class Migrations:
+
+    @classmethod
+    def migrate(cls, connection: sqlite3.Connection = None) -> int:
+        migrations = cls.__get_migrations()
+        latest_version = len(migrations)
+
+        # Already current databases only pay for reading the version.
+        if cls.get_version(connection=connection) >= latest_version:
+            return latest_version
+
+        with connection:
+            # Sqlite3 module does not open transactions for DDL statements.
+            connection.execute("BEGIN IMMEDIATE")
+            # Another process may have migrated while we waited for the lock
+            current_version = cls.get_version(connection=connection)
+            for migration in migrations[current_version:]:
+                migration(connection)
+            connection.execute(f"PRAGMA user_version = {latest_version}")
+
+        return latest_version
+
+    @staticmethod
+    def get_version(connection: sqlite3.Connection = None) -> int:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+
+    @classmethod
+    def __get_migrations(cls) -> List[Callable[[sqlite3.Connection], None]]:
+        # Index i holds the migration that brings the schema to version i+1.
+        # New migrations are only ever appended.
+        return [
+            cls.__create_tables,
+            cls.__create_search_index_on_movies,
+            cls.__create_index_on_watch_list_movie_id,
+            cls.__add_release_date_column_to_movies,
+            cls.__create_index_on_movies_title,
+            cls.__create_watch_count_tables,
+            cls.__add_watched_at_column_to_watch_list,
+        ]
+
+    @classmethod
+    def __create_tables(cls, connection: sqlite3.Connection = None) -> None:
+        # Databases created before versioning already have these, hence
+        # the if not exists clauses.
+        cls.__create_users_table(connection=connection)
+        cls.__create_movies_table(connection=connection)
+        cls.__create_watch_list_table(connection=connection)
+        cls.__create_index_on_movies(connection=connection)
+
+    @staticmethod
+    def __create_users_table(connection: sqlite3.Connection = None) -> None:
+        table = Table("users")
+        columns = [
+            Column(column_name="id", column_type="INTEGER"),
+            Column(column_name="username", column_type="TEXT")
+        ]
+        query = Query.create_table(table=table).if_not_exists().\
+            columns(*columns).primary_key("id").unique("username")
+        connection.execute(query.get_sql())
+
+    @staticmethod
+    def __create_movies_table(connection: sqlite3.Connection = None) -> None:
+        table = Table(name="movies")
+        columns = [
+            Column(column_name="id", column_type="INTEGER"),
+            Column(column_name="title", column_type="TEXT"),
+            Column(column_name="release_timestamp", column_type="REAL"),
+        ]
+        query = Query.create_table(table).if_not_exists().\
+            columns(*columns).primary_key("id").\
+            unique("title", "release_timestamp")
+        connection.execute(query.get_sql())
+
+    @staticmethod
+    def __create_watch_list_table(
+        connection: sqlite3.Connection = None
+    ) -> None:
+        table = Table("watch_list")
+        columns = [
+            Column(column_name="user_id", column_type="INTEGER"),
+            Column(column_name="movie_id", column_type="INTEGER")
+        ]
+        query = Query.create_table(table=table).if_not_exists().\
+            columns(*columns).\
+            unique("user_id", "movie_id")
+        # There is a bug in pypika to have more than one foreign keys
+        # We bypass this bug as the following
+        query_string = query.get_sql()
+        query_string = query_string[:-1] +\
+            ', FOREIGN KEY ("user_id") REFERENCES "users" ("id")' +\
+            ', FOREIGN KEY ("movie_id") REFERENCES "movies" ("id")' +\
+            ')'
+        connection.execute(query_string)
+
+    @staticmethod
+    def __create_index_on_movies(
+        connection: sqlite3.Connection = None
+    ) -> None:
+        # Pypika does not support create index at the moment.
+        query = (
+            "CREATE INDEX IF NOT EXISTS idx_movies_release_timestamp "
+            "ON movies(release_timestamp)"
+        )
+        connection.execute(query)
+
+    @staticmethod
+    def __create_search_index_on_movies(
+        connection: sqlite3.Connection = None
+    ) -> None:
+        # Pypika does not support virtual tables and triggers at the moment.
+        # The fts5 table only stores the index, titles are read from movies
+        # through content_rowid and kept in sync by the triggers below.
+        try:
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5("
+                "title, content='movies', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+        except sqlite3.OperationalError:
+            # This sqlite build lacks fts5, searching falls back to LIKE.
+            return None
+
+        queries = [
+            (
+                "CREATE TRIGGER IF NOT EXISTS movies_fts_after_insert "
+                "AFTER INSERT ON movies BEGIN "
+                "INSERT INTO movies_fts(rowid, title) "
+                "VALUES (new.id, new.title); END"
+            ),
+            (
+                "CREATE TRIGGER IF NOT EXISTS movies_fts_after_delete "
+                "AFTER DELETE ON movies BEGIN "
+                "INSERT INTO movies_fts(movies_fts, rowid, title) "
+                "VALUES ('delete', old.id, old.title); END"
+            ),
+            (
+                "CREATE TRIGGER IF NOT EXISTS movies_fts_after_update "
+                "AFTER UPDATE OF title ON movies BEGIN "
+                "INSERT INTO movies_fts(movies_fts, rowid, title) "
+                "VALUES ('delete', old.id, old.title); "
+                "INSERT INTO movies_fts(rowid, title) "
+                "VALUES (new.id, new.title); END"
+            ),
+            # Titles inserted before the index existed are indexed once.
+            "INSERT INTO movies_fts(movies_fts) VALUES ('rebuild')",
+        ]
+        for query in queries:
+            connection.execute(query)
+
+    @staticmethod
+    def __create_index_on_watch_list_movie_id(
+        connection: sqlite3.Connection = None
+    ) -> None:
+        # Lookups by title are already served by the covering unique index
+        # on movies(title, release_timestamp) and lookups by user by the
+        # one on watch_list(user_id, movie_id). Lookups by movie had none.
+        query = (
+            "CREATE INDEX IF NOT EXISTS idx_watch_list_movie_id_user_id "
+            "ON watch_list(movie_id, user_id)"
+        )
+        connection.execute(query)
+
+    @staticmethod
+    def __add_release_date_column_to_movies(
+        connection: sqlite3.Connection = None
+    ) -> None:
+        # Local release date (YYYY-MM-DD) as entered, so listings do not
+        # need a timezone conversion per row. Older rows keep NULL and are
+        # formatted from release_timestamp.
+        query = 'ALTER TABLE "movies" ADD COLUMN "release_date" TEXT'
+        connection.execute(query)
+
+    @staticmethod
+    def __create_index_on_movies_title(
+        connection: sqlite3.Connection = None
+    ) -> None:
+        # Keyset pages of movies are ordered by (title, id). The unique
+        # index on (title, release_timestamp) can not return that order,
+        # an index on title alone can since it ends with the rowid.
+        query = (
+            "CREATE INDEX IF NOT EXISTS idx_movies_title "
+            "ON movies(title)"
+        )
+        connection.execute(query)
+
+    @staticmethod
+    def __create_watch_count_tables(
+        connection: sqlite3.Connection = None
+    ) -> None:
+        # Watch counts per movie, per user and per release month, kept up
+        # to date by triggers on watch_list so reading them never has to
+        # aggregate watch_list. The indexes on the counts serve top lists,
+        # ties going to the older row. Release months are local when the
+        # local release date is known and utc otherwise.
+        release_month = (
+            "COALESCE(substr(movies.release_date, 1, 7), "
+            "strftime('%Y-%m', movies.release_timestamp, 'unixepoch'), "
+            "'unknown')"
+        )
+        queries = [
+            (
+                "CREATE TABLE IF NOT EXISTS movie_watch_counts ("
+                "movie_id INTEGER PRIMARY KEY REFERENCES movies(id), "
+                "watch_count INTEGER NOT NULL)"
+            ),
+            (
+                "CREATE INDEX IF NOT EXISTS idx_movie_watch_counts_count "
+                "ON movie_watch_counts(watch_count DESC, movie_id)"
+            ),
+            (
+                "CREATE TABLE IF NOT EXISTS user_watch_counts ("
+                "user_id INTEGER PRIMARY KEY REFERENCES users(id), "
+                "watch_count INTEGER NOT NULL)"
+            ),
+            (
+                "CREATE INDEX IF NOT EXISTS idx_user_watch_counts_count "
+                "ON user_watch_counts(watch_count DESC, user_id)"
+            ),
+            (
+                "CREATE TABLE IF NOT EXISTS release_month_watch_counts ("
+                "release_month TEXT PRIMARY KEY, "
+                "watch_count INTEGER NOT NULL) WITHOUT ROWID"
+            ),
+            (
+                "CREATE TRIGGER IF NOT EXISTS watch_counts_after_insert "
+                "AFTER INSERT ON watch_list BEGIN "
+                "INSERT INTO movie_watch_counts(movie_id, watch_count) "
+                "VALUES (new.movie_id, 1) ON CONFLICT(movie_id) "
+                "DO UPDATE SET watch_count = watch_count + 1; "
+                "INSERT INTO user_watch_counts(user_id, watch_count) "
+                "VALUES (new.user_id, 1) ON CONFLICT(user_id) "
+                "DO UPDATE SET watch_count = watch_count + 1; "
+                "INSERT INTO release_month_watch_counts"
+                "(release_month, watch_count) "
+                f"SELECT {release_month}, 1 FROM movies "
+                "WHERE movies.id = new.movie_id "
+                "ON CONFLICT(release_month) "
+                "DO UPDATE SET watch_count = watch_count + 1; END"
+            ),
+            (
+                "CREATE TRIGGER IF NOT EXISTS watch_counts_after_delete "
+                "AFTER DELETE ON watch_list BEGIN "
+                "UPDATE movie_watch_counts SET watch_count = watch_count - 1 "
+                "WHERE movie_id = old.movie_id; "
+                "UPDATE user_watch_counts SET watch_count = watch_count - 1 "
+                "WHERE user_id = old.user_id; "
+                "UPDATE release_month_watch_counts "
+                "SET watch_count = watch_count - 1 "
+                f"WHERE release_month = (SELECT {release_month} FROM movies "
+                "WHERE movies.id = old.movie_id); END"
+            ),
+            # Watch events inserted before the triggers existed are counted
+            # once.
+            (
+                "INSERT INTO movie_watch_counts(movie_id, watch_count) "
+                "SELECT movie_id, count(*) FROM watch_list GROUP BY movie_id"
+            ),
+            (
+                "INSERT INTO user_watch_counts(user_id, watch_count) "
+                "SELECT user_id, count(*) FROM watch_list GROUP BY user_id"
+            ),
+            (
+                "INSERT INTO release_month_watch_counts"
+                "(release_month, watch_count) "
+                f"SELECT {release_month}, count(*) FROM watch_list "
+                "JOIN movies ON movies.id = watch_list.movie_id "
+                "GROUP BY 1"
+            ),
+        ]
+        for query in queries:
+            connection.execute(query)
+
+    @staticmethod
+    def __add_watched_at_column_to_watch_list(
+        connection: sqlite3.Connection = None
+    ) -> None:
+        # Unix timestamp of the watch event. When rows from before this
+        # column were watched is unknown, they keep NULL and are left out
+        # of time range queries. The indexes serve ranges and recent
+        # feeds per user and over all users.
+        queries = [
+            'ALTER TABLE "watch_list" ADD COLUMN "watched_at" REAL',
+            (
+                "CREATE INDEX IF NOT EXISTS idx_watch_list_user_id_watched_at "
+                "ON watch_list(user_id, watched_at)"
+            ),
+            (
+                "CREATE INDEX IF NOT EXISTS idx_watch_list_watched_at "
+                "ON watch_list(watched_at)"
+            ),
+        ]
+        for query in queries:
+            connection.execute(query)
@@ -0,0 +1,67 @@
+import array
+import ast
+import struct
+import sys
+from typing import BinaryIO, Iterator, Tuple
+
+
+class NpyFormat:
+
+    # Version 1.0 of the NumPy .npy format, written and read without NumPy.
+    # A file is a short header describing a C ordered little endian array
+    # followed by its raw items, so other tools can memory map it.
+    MAGIC = b"\x93NUMPY"
+    VERSION = b"\x01\x00"
+    ALIGNMENT = 64
+    # array typecodes of the supported dtypes.
+    TYPECODES = {"<i8": "q", "<f8": "d"}
+
+    @classmethod
+    def write_header(cls, output_file: BinaryIO = None, descr: str = None,
+                     shape: Tuple[int, ...] = None) -> None:
+        header = repr({"descr": descr, "fortran_order": False,
+                       "shape": tuple(shape)})
+        # The header ends with a newline and is padded with spaces so the
+        # data starts at a multiple of ALIGNMENT.
+        prefix_size = len(cls.MAGIC) + len(cls.VERSION) + 2
+        padding = -(prefix_size + len(header) + 1) % cls.ALIGNMENT
+        header = (header + " " * padding + "\n").encode("latin1")
+        output_file.write(cls.MAGIC + cls.VERSION +
+                          struct.pack("<H", len(header)) + header)
+
+    @classmethod
+    def write_items(cls, output_file: BinaryIO = None,
+                    items: array.array = None) -> None:
+        if sys.byteorder == "big":
+            items = array.array(items.typecode, items)
+            items.byteswap()
+        items.tofile(output_file)
+
+    @classmethod
+    def read_header(cls, input_file: BinaryIO = None
+                    ) -> Tuple[str, Tuple[int, ...]]:
+        # Returns the dtype and shape, leaving the file at the first item.
+        if input_file.read(len(cls.MAGIC)) != cls.MAGIC:
+            raise ValueError("Not a .npy file")
+        major_version = input_file.read(2)[0]
+        size_format = "<H" if major_version == 1 else "<I"
+        size_length = struct.calcsize(size_format)
+        (header_size, ) = struct.unpack(size_format,
+                                        input_file.read(size_length))
+        header = ast.literal_eval(input_file.read(header_size).decode())
+        if header["fortran_order"] or header["descr"] not in cls.TYPECODES:
+            raise ValueError(f"Unsupported .npy array {header}")
+        return header["descr"], tuple(header["shape"])
+
+    @classmethod
+    def read_items(cls, input_file: BinaryIO = None, descr: str = None,
+                   count: int = None, chunk_size: int = None
+                   ) -> Iterator[array.array]:
+        # Yields the next count items in arrays of at most chunk_size.
+        while count > 0:
+            items = array.array(cls.TYPECODES[descr])
+            items.fromfile(input_file, min(count, chunk_size))
+            if sys.byteorder == "big":
+                items.byteswap()
+            count -= len(items)
+            yield items
@@ -0,0 +1,206 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+import weakref
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+class ConnectionPool:
+
+    DEFAULT_MAX_READERS = 4
+    DEFAULT_TIMEOUT = 30.0
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection] = None,
+                 max_readers: int = DEFAULT_MAX_READERS,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT,
+                 on_rollback: Optional[Callable[[], None]] = None,
+                 on_external_write: Optional[Callable[[], None]] = None):
+        # Connections are created with check_same_thread disabled by the
+        # factory, the pool makes sure only one thread uses each of them.
+        # Without readers everything goes through the writer, which can
+        # not be shared with the reads of other threads, so the pool then
+        # belongs to the thread that created it.
+        self.__factory = factory
+        self.__owner = threading.get_ident()
+        self.__max_readers = max_readers
+        self.__timeout = timeout
+        self.__on_rollback = on_rollback
+        self.__on_external_write = on_external_write
+
+        self.__lock = threading.Lock()
+        self.__connections: List[sqlite3.Connection] = []
+
+        self.__writer = None
+        self.__writer_lock = threading.RLock()
+        self.__writer_owner = None
+        self.__transaction_depth = 0
+        self.__generation = 0
+        # Commits of other processes, seen through the data_version of the
+        # writer, which does not change with its own commits.
+        self.__external_generation = 0
+        self.__writer_data_version = None
+
+        self.__idle_readers = queue.LifoQueue()
+        self.__reader_slots = threading.BoundedSemaphore(max(max_readers, 1))
+        self.__local = threading.local()
+
+    def reader(self) -> sqlite3.Connection:
+        # A thread inside a write transaction has to see its own
+        # uncommitted changes, so it reads through the writer.
+        if self.__writer_owner == threading.get_ident():
+            return self.__get_writer()
+        if self.__max_readers == 0:
+            self.__check_owner()
+            return self.__get_writer()
+
+        # Readers are never shared between threads. Statements of another
+        # thread would run inside the read transaction of an unfinished
+        # cursor and miss rows committed since it started.
+        connection = getattr(self.__local, "reader", None)
+        if connection is None:
+            connection = self.__acquire_reader()
+            self.__local.reader = connection
+            self.__local.data_version = None
+            # The reader goes back to the pool with release_reader or at
+            # the latest when its thread is gone.
+            self.__local.release = weakref.finalize(
+                threading.current_thread(), self.__release_reader, connection
+            )
+        return connection
+
+    def release_reader(self) -> None:
+        # Gives the reader of the calling thread back to the pool, threads
+        # that read now and then call it when they go idle. Its cursors
+        # must be exhausted or closed.
+        release = getattr(self.__local, "release", None)
+        if release is not None:
+            self.__local.reader = None
+            self.__local.release = None
+            release()
+
+    @property
+    def generation(self) -> int:
+        # Number of committed write transactions that changed rows.
+        return self.__generation
+
+    def get_version(self) -> Tuple[int, int]:
+        # The generation and the number of commits seen from other
+        # processes, together they change with every commit.
+        return self.__generation, self.check_external_writes()
+
+    def check_external_writes(self) -> int:
+        # Calls on_external_write under the write lock when another
+        # process committed, and returns the external generation. The
+        # data_version of the reader changes with every commit of another
+        # connection, the writer of this pool included, so only then the
+        # writer is asked whether the commit was its own. That is skipped
+        # while a write is in progress, which checks itself as it starts,
+        # so reads never wait for writes.
+        if self.in_transaction:
+            return self.__external_generation
+        data_version = self.reader().execute(
+            "PRAGMA data_version"
+        ).fetchone()[0]
+        if data_version != getattr(self.__local, "data_version", None) and \
+                self.__writer_lock.acquire(blocking=False):
+            try:
+                self.__check_writer(connection=self.__get_writer())
+                self.__local.data_version = data_version
+            finally:
+                self.__writer_lock.release()
+        return self.__external_generation
+
+    @property
+    def in_transaction(self) -> bool:
+        # Whether the calling thread is inside a writer block.
+        return self.__writer_owner == threading.get_ident()
+
+    @contextlib.contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        # Writes are serialized on a single connection. Nested writer
+        # blocks of the same thread join the outermost transaction.
+        if self.__max_readers == 0:
+            self.__check_owner()
+        with self.__writer_lock:
+            connection = self.__get_writer()
+            if self.__transaction_depth > 0:
+                self.__transaction_depth += 1
+                try:
+                    yield connection
+                finally:
+                    self.__transaction_depth -= 1
+                return
+
+            self.__check_writer(connection=connection)
+            self.__transaction_depth = 1
+            self.__writer_owner = threading.get_ident()
+            total_changes = connection.total_changes
+            try:
+                with connection:
+                    yield connection
+                if connection.total_changes != total_changes:
+                    self.__generation += 1
+            except BaseException:
+                if self.__on_rollback is not None:
+                    self.__on_rollback()
+                raise
+            finally:
+                self.__writer_owner = None
+                self.__transaction_depth = 0
+
+    def close(self) -> None:
+        with self.__writer_lock, self.__lock:
+            for connection in self.__connections:
+                connection.close()
+            self.__connections.clear()
+            self.__writer = None
+
+    def __get_writer(self) -> sqlite3.Connection:
+        if self.__writer is None:
+            with self.__lock:
+                if self.__writer is None:
+                    self.__writer = self.__factory()
+                    self.__connections.append(self.__writer)
+        return self.__writer
+
+    def __check_writer(self, connection: sqlite3.Connection = None) -> None:
+        # Called with the write lock held.
+        data_version = connection.execute(
+            "PRAGMA data_version"
+        ).fetchone()[0]
+        if self.__writer_data_version is not None and \
+                data_version != self.__writer_data_version:
+            self.__external_generation += 1
+            if self.__on_external_write is not None:
+                self.__on_external_write()
+        self.__writer_data_version = data_version
+
+    def __check_owner(self) -> None:
+        if threading.get_ident() != self.__owner:
+            raise sqlite3.ProgrammingError(
+                "A database without reader connections, e.g. an in-memory "
+                "one, can only be used by the thread that opened it"
+            )
+
+    def __acquire_reader(self) -> sqlite3.Connection:
+        # At most max_readers threads hold a reader at the same time, so
+        # there are never more than max_readers reader connections.
+        if not self.__reader_slots.acquire(timeout=self.__timeout):
+            raise sqlite3.OperationalError(
+                f"No reader connection became available in {self.__timeout}s"
+            )
+        try:
+            return self.__idle_readers.get_nowait()
+        except queue.Empty:
+            connection = self.__factory()
+            with self.__lock:
+                self.__connections.append(connection)
+            return connection
+
+    def __release_reader(self, connection: sqlite3.Connection = None) -> None:
+        # Readers of a closed pool are not reused.
+        with self.__lock:
+            if connection in self.__connections:
+                self.__idle_readers.put(connection)
+        self.__reader_slots.release()
@@ -0,0 +1,114 @@
+import collections
+import heapq
+import math
+import threading
+from typing import Dict, Iterable, List, Set, Tuple
+
+from modules.database_listener import DatabaseListener
+
+
+class Recommender(DatabaseListener):
+
+    DEFAULT_LIMIT = 10
+
+    # Item based collaborative filtering on the user x movie watch matrix.
+    # Two movies are similar by the cosine of their watcher sets,
+    #     similarity(x, y) = both(x, y) / sqrt(watchers(x) * watchers(y))
+    # and a user is recommended the unwatched movies with the highest
+    # summed similarity to the movies they watched. The matrix is kept as
+    # adjacency sets in both directions instead of a co-occurrence matrix,
+    # which would grow with the square of the history lengths. Co-occurrence
+    # counts are accumulated per request over the neighbourhood of the user
+    # only, so a watch event is a constant time update. Summed over the
+    # watched movies x, the score of y regroups by neighbour user v into
+    #     sum(weight(v) for v watching y) / sqrt(watchers(y))
+    #     weight(v) = sum(1 / sqrt(watchers(x)) for x watched by both)
+    # so every neighbour's history is walked once.
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__built = False
+        self.__user_movies: Dict[int, Set[int]] = {}
+        self.__movie_users: Dict[int, Set[int]] = {}
+
+    @property
+    def built(self) -> bool:
+        return self.__built
+
+    def build(self, watched_movies: Iterable[Tuple[int, int]] = None) -> None:
+        user_movies = collections.defaultdict(set)
+        movie_users = collections.defaultdict(set)
+        for user_id, movie_id in watched_movies:
+            user_movies[user_id].add(movie_id)
+            movie_users[movie_id].add(user_id)
+        with self.__lock:
+            self.__user_movies = dict(user_movies)
+            self.__movie_users = dict(movie_users)
+            self.__built = True
+
+    def on_watched_movie_inserted(self, user_id: int = None,
+                                  movie_id: int = None) -> None:
+        with self.__lock:
+            if not self.__built:
+                return None
+            self.__user_movies.setdefault(user_id, set()).add(movie_id)
+            self.__movie_users.setdefault(movie_id, set()).add(user_id)
+
+    def on_reset(self) -> None:
+        with self.__lock:
+            self.__built = False
+            self.__user_movies = {}
+            self.__movie_users = {}
+
+    def recommend_movies(self, user_id: int = None,
+                         limit: int = DEFAULT_LIMIT
+                         ) -> List[Tuple[int, float]]:
+        # Returns (movie id, score) pairs, best first.
+        with self.__lock:
+            watched = self.__user_movies.get(user_id, set())
+            weights = collections.defaultdict(float)
+            for movie_id in watched:
+                watchers = self.__movie_users[movie_id]
+                weight = 1 / math.sqrt(len(watchers))
+                for other_user_id in watchers:
+                    weights[other_user_id] += weight
+            weights.pop(user_id, None)
+
+            sums = collections.defaultdict(float)
+            for other_user_id, weight in weights.items():
+                for other_id in self.__user_movies[other_user_id]:
+                    sums[other_id] += weight
+            scores = {
+                other_id: total / math.sqrt(len(self.__movie_users[other_id]))
+                for other_id, total in sums.items()
+                if other_id not in watched
+            }
+        return self.__top(scores=scores, limit=limit)
+
+    def similar_movies(self, movie_id: int = None,
+                       limit: int = DEFAULT_LIMIT
+                       ) -> List[Tuple[int, float]]:
+        # Users who watched movie_id also watched these, as (movie id,
+        # similarity) pairs, most similar first.
+        with self.__lock:
+            watchers = self.__movie_users.get(movie_id)
+            if not watchers:
+                return []
+            counts = collections.Counter()
+            for user_id in watchers:
+                counts.update(self.__user_movies[user_id])
+            del counts[movie_id]
+            scores = {
+                other_id: count / math.sqrt(
+                    len(watchers) * len(self.__movie_users[other_id])
+                )
+                for other_id, count in counts.items()
+            }
+        return self.__top(scores=scores, limit=limit)
+
+    @staticmethod
+    def __top(scores: Dict[int, float] = None,
+              limit: int = DEFAULT_LIMIT) -> List[Tuple[int, float]]:
+        # Ties go to the older movie so results are stable.
+        return heapq.nlargest(limit, scores.items(),
+                              key=(lambda item: (item[1], -item[0])))
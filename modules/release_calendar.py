@@ -0,0 +1,122 @@
+import collections
+import datetime
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from modules.database_listener import DatabaseListener
+from modules.timezones import TimezoneService
+
+
+class ReleaseCalendar(DatabaseListener):
+
+    CACHE_SIZE = 64
+
+    # Upcomming releases are read per window [start, end) of release
+    # timestamps. Windows start at the beginning of the local day, so
+    # results are cached for the rest of the day and only dropped when a
+    # movie is released inside their window.
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__entries = collections.OrderedDict()
+        self.__days: Dict[Hashable, Tuple[float, float]] = {}
+        self.__windows: Dict[Hashable, Tuple[float, Tuple]] = {}
+
+    def get_today(self, timezone: datetime.tzinfo = None
+                  ) -> Tuple[float, float]:
+        # Start and end of the local day, converted once per day.
+        now = time.time()
+        with self.__lock:
+            day = self.__days.get(timezone)
+        if day is not None and day[0] <= now < day[1]:
+            return day
+
+        today = datetime.datetime.fromtimestamp(now, timezone).date()
+        day = (self.__get_local_midnight(date=today, timezone=timezone),
+               self.__get_local_midnight(
+                   date=today + datetime.timedelta(days=1),
+                   timezone=timezone
+               ))
+        with self.__lock:
+            self.__days[timezone] = day
+        return day
+
+    def get_window(self, timezone: datetime.tzinfo = None,
+                   days: Optional[int] = None,
+                   month: Optional[str] = None
+                   ) -> Tuple[float, Optional[float]]:
+        # The next days starting today, the rest of a YYYY-MM month or,
+        # without either, everything from today on.
+        today_start, _ = self.get_today(timezone=timezone)
+        key = (timezone, days, month)
+        with self.__lock:
+            window = self.__windows.get(key)
+        if window is not None and window[0] == today_start:
+            return window[1]
+
+        window = self.__create_window(today_start=today_start,
+                                      timezone=timezone, days=days,
+                                      month=month)
+        with self.__lock:
+            self.__windows[key] = (today_start, window)
+        return window
+
+    def __create_window(self, today_start: float = None,
+                        timezone: datetime.tzinfo = None,
+                        days: Optional[int] = None,
+                        month: Optional[str] = None
+                        ) -> Tuple[float, Optional[float]]:
+        if month is not None:
+            month_start = datetime.datetime.strptime(month, "%Y-%m").date()
+            next_month_start = (month_start + datetime.timedelta(days=31)).\
+                replace(day=1)
+            start = max(today_start, self.__get_local_midnight(
+                date=month_start, timezone=timezone
+            ))
+            end = self.__get_local_midnight(date=next_month_start,
+                                            timezone=timezone)
+            return start, max(start, end)
+        if days is not None:
+            today = datetime.datetime.fromtimestamp(today_start,
+                                                    timezone).date()
+            end = self.__get_local_midnight(
+                date=today + datetime.timedelta(days=days),
+                timezone=timezone
+            )
+            return today_start, end
+        return today_start, None
+
+    def get(self, key: Hashable = None) -> Optional[List]:
+        with self.__lock:
+            rows = self.__entries.get(key)
+            if rows is not None:
+                self.__entries.move_to_end(key)
+            return rows
+
+    def put(self, key: Hashable = None, rows: List = None) -> None:
+        # Keys start with the (start, end) window.
+        with self.__lock:
+            self.__entries[key] = rows
+            self.__entries.move_to_end(key)
+            if len(self.__entries) > self.CACHE_SIZE:
+                self.__entries.popitem(last=False)
+
+    def on_movie_inserted(self, movie_id: int = None, title: str = None,
+                          release_timestamp: float = None,
+                          release_date: Optional[str] = None) -> None:
+        with self.__lock:
+            for key in list(self.__entries):
+                start, end = key[:2]
+                if start <= release_timestamp and \
+                        (end is None or release_timestamp < end):
+                    del self.__entries[key]
+
+    def on_reset(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    @staticmethod
+    def __get_local_midnight(date: datetime.date = None,
+                             timezone: datetime.tzinfo = None) -> float:
+        return TimezoneService.get_day_start(date=date, timezone=timezone)
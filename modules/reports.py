@@ -0,0 +1,133 @@
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional, TextIO, Tuple
+
+from modules.config import Config
+from modules.database import Database
+
+
+@dataclass
+class ReportSummary:
+
+    name: str
+    users: int = 0
+    rows: int = 0
+    shards: int = 0
+    workers: int = 0
+    elapsed_seconds: float = 0.0
+
+    def __str__(self):
+        return (f"{self.name}: {self.users} users, {self.rows} rows in "
+                f"{self.shards} shards on {self.workers} workers in "
+                f"{self.elapsed_seconds:.2f}s")
+
+
+class ReportRunner:
+
+    DEFAULT_SHARD_SIZE = 1000
+    # Shards queued per worker ahead of the one being written, so workers
+    # never wait for the writer and finished shards do not pile up.
+    PREFETCH_PER_WORKER = 2
+
+    # Reports over every user are split into shards of consecutive
+    # usernames, each read with a single query by a worker process with
+    # its own read-only connection and encoded there. The shards follow
+    # each other in username order, so merging them is writing each one
+    # as soon as it and the ones before it are done. Workers are spawned
+    # rather than forked, a connection must not be shared with a child.
+
+    def __init__(self, workers: Optional[int] = None,
+                 shard_size: int = DEFAULT_SHARD_SIZE,
+                 config_path: Optional[Path] = None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.shard_size = shard_size
+        self.config_path = None if config_path is None else \
+            Path(config_path).resolve()
+
+    def write_watched_movies(self, output: TextIO = None) -> ReportSummary:
+        # One JSON line per user, {"username": ..., "movies": [...]}, by
+        # username, with the movies of select_user_watched_movies by title.
+        summary = ReportSummary(name="watched_movies", workers=self.workers)
+        start_time = time.perf_counter()
+        bounds = Database.select_username_shard_bounds(
+            shard_size=self.shard_size
+        )
+        shards = list(zip(bounds, bounds[1:] + [None]))
+        summary.shards = len(shards)
+        for users, rows, lines in self.__run_shards(shards=shards):
+            output.write(lines)
+            summary.users += users
+            summary.rows += rows
+        summary.elapsed_seconds = time.perf_counter() - start_time
+        return summary
+
+    def __run_shards(self, shards: List[Tuple[str, Optional[str]]] = None
+                     ) -> Iterator[Tuple[int, int, str]]:
+        if not shards:
+            return None
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(shards)), mp_context=context,
+            initializer=self.connect_worker,
+            initargs=(self.config_path, Config.DATABASE_PATH)
+        ) as executor:
+            shards = iter(shards)
+            pending: Deque[Future] = collections.deque(
+                executor.submit(self.encode_watched_movies, lower, upper)
+                for lower, upper in itertools.islice(
+                    shards, self.workers * self.PREFETCH_PER_WORKER
+                )
+            )
+            while pending:
+                result = pending.popleft().result()
+                for lower, upper in itertools.islice(shards, 1):
+                    pending.append(executor.submit(
+                        self.encode_watched_movies, lower, upper
+                    ))
+                yield result
+
+    # Run in the worker processes, which is why they are public.
+
+    @staticmethod
+    def connect_worker(config_path: Optional[Path] = None,
+                       database_path: str = None) -> None:
+        Config.load_configs(config_path=config_path)
+        Config.DATABASE_PATH = database_path
+        # Each shard is a single query, loading the engine would only
+        # cost time and memory in every worker.
+        Config.WATCHLIST_ENGINE = {**Config.WATCHLIST_ENGINE,
+                                   "enabled": False}
+        Database.connect_to_database(read_only=True)
+
+    @staticmethod
+    def encode_watched_movies(lower: str = None, upper: Optional[str] = None
+                              ) -> Tuple[int, int, str]:
+        # Returns the number of users and movies and the JSON lines.
+        cursor = Database.select_users_watched_movies(lower=lower,
+                                                      upper=upper)
+        users = 0
+        rows = 0
+        lines = []
+        for username, user_rows in itertools.groupby(
+            cursor, key=(lambda row: row["username"])
+        ):
+            movies = [
+                {"id": row["id"], "title": row["title"],
+                 "release_timestamp": row["release_timestamp"],
+                 "release_date": row["release_date"]}
+                for row in user_rows if row["id"] is not None
+            ]
+            lines.append(json.dumps({"username": username,
+                                     "movies": movies}) + "\n")
+            users += 1
+            rows += len(movies)
+        return users, rows, "".join(lines)
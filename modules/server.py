@@ -0,0 +1,335 @@
+import datetime
+import http.server
+import json
+import re
+import sqlite3
+import sys
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from modules.database import Database
+from modules.menu import MenuFunctions
+
+
+class ApiRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    # HTTP/1.1 keeps connections alive, every response therefore carries a
+    # Content-Length or is sent in chunks.
+    protocol_version = "HTTP/1.1"
+    server_version = "MyMovieWatchlist/1.0"
+    # Idle keep-alive connections give their worker back after this long.
+    timeout = 1
+
+    STREAM_BATCH_SIZE = 500
+    MAX_BODY_SIZE = 1 << 20
+
+    ROUTES = [
+        ("GET", re.compile(r"/users"), "list_users"),
+        ("POST", re.compile(r"/users"), "add_user"),
+        ("GET", re.compile(r"/users/(?P<username>[^/]+)/watched"),
+         "list_watched_movies"),
+        ("GET", re.compile(r"/users/(?P<username>[^/]+)/recommendations"),
+         "list_recommended_movies"),
+        ("GET", re.compile(r"/movies"), "list_movies"),
+        ("POST", re.compile(r"/movies"), "add_movie"),
+        ("GET", re.compile(r"/movies/search"), "search_movies"),
+        ("GET", re.compile(r"/movies/upcomming"), "list_upcomming_movies"),
+        ("GET", re.compile(r"/movies/(?P<title>[^/]+)/watchers"),
+         "list_movie_watchers"),
+        ("POST", re.compile(r"/watch_list"), "watch_movie"),
+    ]
+
+    def handle_one_request(self) -> None:
+        # The reader goes back to the pool after every request, an idle
+        # keep-alive connection only holds its worker.
+        try:
+            super().handle_one_request()
+        finally:
+            Database.release_reader()
+
+    def do_GET(self) -> None:
+        self.__dispatch(method="GET")
+
+    def do_POST(self) -> None:
+        self.__dispatch(method="POST")
+
+    def __dispatch(self, method: str = None) -> None:
+        # A body left unread would be taken for the next request on the
+        # connection, so it is discarded after the response.
+        self.__unread = self.__get_content_length()
+        try:
+            self.__route(method=method)
+        finally:
+            if self.__unread and not self.close_connection:
+                self.rfile.read(self.__unread)
+
+    def __route(self, method: str = None) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        self.query = {name: values[-1] for name, values in
+                      urllib.parse.parse_qs(url.query).items()}
+        path = url.path.rstrip("/") or "/"
+
+        allowed = False
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            arguments = {key: urllib.parse.unquote(value)
+                         for key, value in match.groupdict().items()}
+            try:
+                getattr(self, name)(**arguments)
+            except KeyError as error:
+                self.__send_json(status=400,
+                                 data={"error": f"Missing {error.args[0]}"})
+            except (TypeError, ValueError) as error:
+                self.__send_json(status=400, data={"error": str(error)})
+            except sqlite3.Error as error:
+                self.log_error("Database error: %s", error)
+                self.__send_json(status=500, data={"error": str(error)})
+            return None
+
+        if allowed:
+            self.__send_json(status=405, data={"error": "Method not allowed"})
+        else:
+            self.__send_json(status=404, data={"error": "Not found"})
+
+    # Write endpoints, answering 201 when a row was added and 200 when it
+    # already existed or referenced an unknown user or movie.
+
+    def add_user(self) -> None:
+        body = self.__read_json()
+        inserted = MenuFunctions.add_user(username=body["username"])
+        self.__send_inserted(inserted=inserted)
+
+    def add_movie(self) -> None:
+        # The release date is a local dd-mm-YYYY date, like in the menu.
+        body = self.__read_json()
+        inserted = MenuFunctions.add_movie(
+            title=body["title"], release_date_string=body["release_date"],
+            timezone=self.server.timezone
+        )
+        self.__send_inserted(inserted=inserted)
+
+    def watch_movie(self) -> None:
+        body = self.__read_json()
+        inserted = Database.submit_watched_movie(
+            username=body["username"], title=body["title"],
+            watched_at=body.get("watched_at")
+        )
+        self.__send_inserted(inserted=inserted)
+
+    # List endpoints, pages continue after the (username or title, id)
+    # key of the last row of the previous page.
+
+    def list_users(self) -> None:
+        self.__send_rows(select=lambda: Database.select_users_from_users(
+            order=True, order_by="username", ascending=True,
+            after=self.__get_key(name="after_username"),
+            limit=self.__get_int(name="limit",
+                                 default=MenuFunctions.PAGE_SIZE)
+        ))
+
+    def list_movies(self) -> None:
+        self.__send_rows(select=lambda: Database.select_movies_from_movies(
+            upcomming=False, order=True, order_by="title", ascending=True,
+            after=self.__get_key(name="after_title"),
+            limit=self.__get_int(name="limit",
+                                 default=MenuFunctions.PAGE_SIZE)
+        ))
+
+    def list_watched_movies(self, username: str = None) -> None:
+        self.__send_rows(select=lambda: Database.select_user_watched_movies(
+            username=username, order=True, order_by="title", ascending=True
+        ))
+
+    def list_movie_watchers(self, title: str = None) -> None:
+        self.__send_rows(select=lambda: Database.select_movie_watchers(
+            title=title
+        ))
+
+    def list_recommended_movies(self, username: str = None) -> None:
+        self.__send_rows(select=lambda: Database.select_recommended_movies(
+            username=username,
+            limit=self.__get_int(name="limit",
+                                 default=MenuFunctions.RECOMMENDATION_LIMIT)
+        ))
+
+    def search_movies(self) -> None:
+        self.__send_rows(select=lambda: Database.select_searched_movies(
+            search_term=self.query["q"], order=True, order_by="rank",
+            ascending=True,
+            limit=self.__get_int(name="limit",
+                                 default=MenuFunctions.SEARCH_PAGE_SIZE),
+            offset=self.__get_int(name="offset", default=0)
+        ))
+
+    def list_upcomming_movies(self) -> None:
+        month = self.query.get("month")
+        days = self.__get_int(
+            name="days",
+            default=None if month else MenuFunctions.UPCOMMING_DAYS
+        )
+        # The window moves with the local day, so does the tag.
+        today = datetime.datetime.now(self.server.timezone).date()
+        self.__send_rows(select=lambda: Database.select_upcomming_releases(
+            timezone=self.server.timezone, days=days, month=month,
+            limit=self.__get_int(name="limit",
+                                 default=MenuFunctions.UPCOMMING_LIMIT)
+        ), tag=f"-{today.isoformat()}")
+
+    def __get_int(self, name: str = None,
+                  default: Optional[int] = None) -> Optional[int]:
+        value = self.query.get(name)
+        if value is None:
+            return default
+        return int(value)
+
+    def __get_key(self, name: str = None) -> Optional[Tuple]:
+        if name not in self.query:
+            return None
+        return (self.query[name], int(self.query["after_id"]))
+
+    def __get_content_length(self) -> Optional[int]:
+        # None when the length is invalid, the body can not be skipped then.
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            return None
+        return length if length >= 0 else None
+
+    def __read_json(self) -> Dict:
+        length = self.__unread
+        if length is None:
+            raise ValueError("Invalid Content-Length")
+        if length > self.MAX_BODY_SIZE:
+            raise ValueError("Request body too large")
+        self.__unread = 0
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    def __send_inserted(self, inserted: bool = None) -> None:
+        self.__send_json(status=201 if inserted else 200,
+                         data={"inserted": inserted})
+
+    def __send_json(self, status: int = 200, data=None) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.__end_headers()
+        self.wfile.write(body)
+
+    def __send_rows(self, select: Callable[[], sqlite3.Cursor] = None,
+                    tag: str = "") -> None:
+        # Lists are tagged with the data version, which is read before the
+        # query so a concurrent write can only make the tag older than the
+        # rows and never the other way round.
+        etag = f'"{Database.get_data_version()}{tag}"'
+        if etag in self.__get_if_none_match():
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.__end_headers()
+            return None
+
+        cursor = select()
+        try:
+            # Rows are encoded and sent batch by batch in chunks, so large
+            # lists are neither built in memory nor delayed until the end.
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.__end_headers()
+            try:
+                self.__write_rows(cursor=cursor)
+            except ConnectionError:
+                raise
+            except Exception as error:
+                # The status is sent already, the client can only tell
+                # from the connection closing before the last chunk.
+                self.log_error("Response aborted: %s", error)
+                self.close_connection = True
+                raise ConnectionAbortedError(str(error)) from error
+        finally:
+            cursor.close()
+
+    def __write_rows(self, cursor: sqlite3.Cursor = None) -> None:
+        separator = "["
+        while rows := cursor.fetchmany(self.STREAM_BATCH_SIZE):
+            self.__write_chunk(separator + ",".join(
+                json.dumps(dict(row)) for row in rows
+            ))
+            separator = ","
+        self.__write_chunk("[]" if separator == "[" else "]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def __end_headers(self) -> None:
+        # Bodies too large to be discarded close the connection.
+        if self.__unread is None or self.__unread > self.MAX_BODY_SIZE:
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+    def __get_if_none_match(self) -> List[str]:
+        header = self.headers.get("If-None-Match", "")
+        return [tag.strip() for tag in header.split(",")]
+
+    def __write_chunk(self, data: str = None) -> None:
+        encoded = data.encode()
+        self.wfile.write(f"{len(encoded):X}\r\n".encode() + encoded +
+                         b"\r\n")
+
+    def log_message(self, format: str = None, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ApiServer(http.server.HTTPServer):
+
+    DEFAULT_HOST = "127.0.0.1"
+    DEFAULT_PORT = 8000
+    DEFAULT_MAX_WORKERS = 64
+
+    request_queue_size = 128
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 timezone: datetime.tzinfo = None,
+                 max_workers: Optional[int] = None, verbose: bool = False):
+        # Workers only hold a reader while they answer a request, so
+        # there can be more of them than readers. A keep-alive connection
+        # holds its worker until it goes idle.
+        if max_workers is None:
+            max_workers = self.DEFAULT_MAX_WORKERS
+        super().__init__((host, port), ApiRequestHandler)
+        self.timezone = timezone
+        self.verbose = verbose
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers,
+                                             thread_name_prefix="http")
+
+    def process_request(self, request, client_address) -> None:
+        self.__executor.submit(self.__process_request, request,
+                               client_address)
+
+    def __process_request(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.__executor.shutdown(wait=True)
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients hanging up mid response are not worth a traceback.
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return None
+        super().handle_error(request, client_address)
@@ -0,0 +1,111 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class StartupProfiler:
+
+    DEFAULT_RUNS = 5
+    DEFAULT_TOP = 15
+
+    ROOT_PATH = Path(__file__).resolve().parent.parent
+
+    # Runs in a fresh interpreter, every run starts with cold module
+    # imports but warm bytecode caches.
+    CHILD_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start_time = time.perf_counter()
+import app
+from modules.config import Config
+from modules.database import Database
+imported_time = time.perf_counter()
+Config.load_configs(config_path={config_path!r})
+Database.connect_to_database()
+Database.close_database()
+connected_time = time.perf_counter()
+print(json.dumps({{
+    "import_ms": 1000 * (imported_time - start_time),
+    "connect_ms": 1000 * (connected_time - imported_time),
+}}))
+"""
+
+    def __init__(self, runs: int = DEFAULT_RUNS, top: int = DEFAULT_TOP,
+                 config_path: Optional[Path] = None):
+        self.runs = runs
+        self.top = top
+        self.config_path = None if config_path is None else \
+            str(Path(config_path).resolve())
+
+    def run(self) -> Dict:
+        samples = [self.__run_child() for _ in range(self.runs)]
+        modules = self.__median_modules(samples=samples)
+        slowest = sorted(modules.items(), key=(lambda item: item[1][0]),
+                         reverse=True)[:self.top]
+        return {
+            "runs": self.runs,
+            "process_ms": self.__median(samples, "process_ms"),
+            "import_ms": self.__median(samples, "import_ms"),
+            "connect_ms": self.__median(samples, "connect_ms"),
+            "slowest_imports": [
+                {"module": name, "self_ms": self_ms,
+                 "cumulative_ms": cumulative_ms}
+                for name, (self_ms, cumulative_ms) in slowest
+            ],
+        }
+
+    def __run_child(self) -> Dict:
+        script = self.CHILD_SCRIPT.format(root=str(self.ROOT_PATH),
+                                          config_path=self.config_path)
+        start_time = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            capture_output=True, text=True, check=True
+        )
+        process_ms = 1000 * (time.perf_counter() - start_time)
+
+        sample = json.loads(completed.stdout.strip().splitlines()[-1])
+        sample["process_ms"] = process_ms
+        sample["modules"] = self.__parse_import_times(
+            report=completed.stderr
+        )
+        return sample
+
+    @staticmethod
+    def __parse_import_times(report: str = None) -> Dict[str, List[float]]:
+        # Lines look like "import time:  self [us] | cumulative | name",
+        # the first one is the header.
+        modules = {}
+        for line in report.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            fields = line[len("import time:"):].split("|")
+            if len(fields) != 3 or not fields[0].strip().isdigit():
+                continue
+            name = fields[2].strip()
+            modules[name] = [int(fields[0]) / 1000, int(fields[1]) / 1000]
+        return modules
+
+    @staticmethod
+    def __median_modules(samples: List[Dict] = None
+                         ) -> Dict[str, List[float]]:
+        names = set()
+        for sample in samples:
+            names.update(sample["modules"])
+        medians = {}
+        for name in names:
+            times = [sample["modules"][name] for sample in samples
+                     if name in sample["modules"]]
+            medians[name] = [
+                statistics.median(time_[0] for time_ in times),
+                statistics.median(time_[1] for time_ in times),
+            ]
+        return medians
+
+    @staticmethod
+    def __median(samples: List[Dict] = None, key: str = None) -> float:
+        return statistics.median(sample[key] for sample in samples)
@@ -0,0 +1,25 @@
+from typing import Callable, Dict, Hashable
+
+
+class Statements:
+
+    # SQL strings only depend on the method and a few shape flags, so
+    # they are built once with pypika and reused for every later call.
+    __registry: Dict[Hashable, str] = {}
+
+    @classmethod
+    def get(cls, key: Hashable = None,
+            builder: Callable[[], str] = None) -> str:
+        statement = cls.__registry.get(key)
+        if statement is None:
+            statement = builder()
+            cls.__registry[key] = statement
+        return statement
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.__registry.clear()
+
+    @classmethod
+    def size(cls) -> int:
+        return len(cls.__registry)
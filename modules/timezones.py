@@ -0,0 +1,92 @@
+import datetime
+import functools
+from typing import Iterable, List, Tuple
+
+from modules.config import Config
+
+# zoneinfo is only part of python 3.9 and later, pytz serves older ones.
+try:
+    import zoneinfo
+except ImportError:
+    zoneinfo = None
+
+
+class TimezoneService:
+
+    DATE_FORMAT = "%d-%m-%Y"
+    CACHE_SIZE = 4096
+
+    # Zones are resolved once per name, with zoneinfo where the system has
+    # tz data and pytz otherwise. Local midnights are converted once per
+    # day and zone, and parsed dates once per string, so bulk imports and
+    # listings repeating the same days convert each of them only once.
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_timezone(name: str = None) -> datetime.tzinfo:
+        if zoneinfo is not None:
+            try:
+                return zoneinfo.ZoneInfo(name)
+            except zoneinfo.ZoneInfoNotFoundError:
+                pass
+        import pytz
+        return pytz.timezone(name)
+
+    @classmethod
+    def get_default_timezone(cls) -> datetime.tzinfo:
+        return cls.get_timezone(name=Config.TIMEZONE)
+
+    @staticmethod
+    def to_utc(local_dt: datetime.datetime = None,
+               timezone: datetime.tzinfo = None) -> datetime.datetime:
+        # pytz zones have to localize, attaching them picks their first
+        # historic offset.
+        localize = getattr(timezone, "localize", None)
+        if localize is not None:
+            local_dt = localize(local_dt)
+        else:
+            local_dt = local_dt.replace(tzinfo=timezone)
+        return local_dt.astimezone(datetime.timezone.utc)
+
+    @classmethod
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def get_day_start(cls, date: datetime.date = None,
+                      timezone: datetime.tzinfo = None) -> float:
+        # Timestamp of the local midnight starting date.
+        midnight = datetime.datetime.combine(date, datetime.time())
+        return cls.to_utc(local_dt=midnight, timezone=timezone).timestamp()
+
+    @classmethod
+    def parse_local_date(cls, date_string: str = None,
+                         timezone: datetime.tzinfo = None
+                         ) -> Tuple[float, str]:
+        # A dd-mm-YYYY date as the timestamp of its local midnight and as
+        # an ISO date.
+        date = cls.__parse_date(date_string)
+        return cls.get_day_start(date=date, timezone=timezone), \
+            date.isoformat()
+
+    @classmethod
+    def parse_local_dates(cls, date_strings: Iterable[str] = None,
+                          timezone: datetime.tzinfo = None
+                          ) -> List[Tuple[float, str]]:
+        # parse_local_date for many strings, each distinct one parsed once.
+        date_strings = list(date_strings)
+        converted = {
+            date_string: cls.parse_local_date(date_string=date_string,
+                                              timezone=timezone)
+            for date_string in set(date_strings)
+        }
+        return [converted[date_string] for date_string in date_strings]
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        cls.get_day_start.cache_clear()
+        cls.__parse_date.cache_clear()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def __parse_date(date_string: str = None) -> datetime.date:
+        return datetime.datetime.strptime(
+            date_string, TimezoneService.DATE_FORMAT
+        ).date()
@@ -0,0 +1,251 @@
+import array
+import bisect
+import collections
+import heapq
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from modules.database_listener import DatabaseListener
+
+
+class TitleIndex(DatabaseListener):
+
+    DEFAULT_LIMIT = 5
+    # Typos allowed per character, at least one per word. Swapping two
+    # neighbouring characters is one typo. Words shorter than
+    # MIN_TYPO_LENGTH are taken as spelled right when some title has them,
+    # they are common and close to too many other words otherwise.
+    DISTANCE_RATIO = 0.25
+    MIN_TYPO_LENGTH = 4
+    GRAM_SIZE = 3
+    # Terms with words that match no word of any title are only looked up
+    # when their other words narrow the titles down to this many.
+    MAX_SCANNED_TITLES = 2000
+
+    # Typo tolerant title lookups. Titles are split into words, every word
+    # has a sorted posting list of the movies containing it and the
+    # vocabulary has a trigram inverted index. A term matches the titles
+    # that contain, for each of its words, a word within a few edits.
+    # Misspelled words are resolved in the vocabulary, which is far
+    # smaller than the catalog, and only the posting lists of the rarest
+    # term word are scanned, the others are probed by binary search.
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__built = False
+        self.__titles: Dict[int, str] = {}
+        self.__words: Dict[str, array.array] = {}
+        self.__grams: Dict[str, List[str]] = {}
+
+    @property
+    def built(self) -> bool:
+        return self.__built
+
+    def build(self, movies: Iterable[Tuple[int, str]] = None) -> None:
+        # Movies have to come in id order, posting lists stay sorted.
+        titles = {}
+        words = collections.defaultdict(lambda: array.array("q"))
+        for movie_id, title in movies:
+            normalized = self.normalize(title=title)
+            titles[movie_id] = normalized
+            for word in set(normalized.split()):
+                words[word].append(movie_id)
+        grams = collections.defaultdict(list)
+        for word in words:
+            for gram in self.__get_grams(word=word):
+                grams[gram].append(word)
+        with self.__lock:
+            self.__titles = titles
+            self.__words = dict(words)
+            self.__grams = dict(grams)
+            self.__built = True
+
+    def on_movie_inserted(self, movie_id: int = None, title: str = None,
+                          release_timestamp: float = None,
+                          release_date: Optional[str] = None) -> None:
+        with self.__lock:
+            if not self.__built:
+                return None
+            normalized = self.normalize(title=title)
+            self.__titles[movie_id] = normalized
+            for word in set(normalized.split()):
+                posting = self.__words.get(word)
+                if posting is None:
+                    posting = self.__words[word] = array.array("q")
+                    for gram in self.__get_grams(word=word):
+                        self.__grams.setdefault(gram, []).append(word)
+                # Ids mostly grow, so this is an append.
+                posting.insert(bisect.bisect(posting, movie_id), movie_id)
+
+    def on_reset(self) -> None:
+        with self.__lock:
+            self.__built = False
+            self.__titles = {}
+            self.__words = {}
+            self.__grams = {}
+
+    def match(self, term: str = None, limit: int = DEFAULT_LIMIT,
+              substring: bool = False) -> List[Tuple[int, int]]:
+        # Returns (movie id, edit distance) pairs, closest first. The
+        # distance is to the whole title, with substring it is the sum over
+        # the words of the term, so titles may have other words as well.
+        normalized = self.normalize(title=term)
+        if not normalized:
+            return []
+
+        with self.__lock:
+            groups = []
+            skipped = False
+            for word in set(normalized.split()):
+                close_words = self.__match_word(word=word)
+                # Whole titles are compared in the end, so a word that
+                # matches nothing only has to be left out.
+                if not close_words and substring:
+                    return []
+                if not close_words:
+                    skipped = True
+                    continue
+                groups.append([(self.__words[close_word], distance)
+                               for close_word, distance
+                               in close_words.items()])
+            sizes = [sum(len(posting) for posting, _ in group)
+                     for group in groups]
+            if not groups or skipped and \
+                    min(sizes) > self.MAX_SCANNED_TITLES:
+                return []
+            groups = [group for _, group in sorted(
+                zip(sizes, groups), key=(lambda item: item[0])
+            )]
+
+            distances = {}
+            for posting, distance in groups[0]:
+                for movie_id in posting:
+                    if distances.get(movie_id, distance) >= distance:
+                        distances[movie_id] = distance
+            for group in groups[1:]:
+                distances = {
+                    movie_id: total + distance
+                    for movie_id, total in distances.items()
+                    if (distance := self.__get_group_distance(
+                        group=group, movie_id=movie_id
+                    )) is not None
+                }
+
+            if not substring:
+                max_distance = max(1, int(len(normalized) *
+                                          self.DISTANCE_RATIO))
+                lengths = range(len(normalized) - max_distance,
+                                len(normalized) + max_distance + 1)
+                # Every title word no term word matched costs at least two
+                # edits, one for the space and one per character.
+                spaces = range(normalized.count(" ") + max_distance // 2 + 1)
+                titles = ((movie_id, self.__titles[movie_id])
+                          for movie_id in distances)
+                distances = {
+                    movie_id: distance
+                    for movie_id, title in titles
+                    if len(title) in lengths and title.count(" ") in spaces
+                    and (distance := self.__get_distance(
+                            term=normalized, title=title,
+                            max_distance=max_distance
+                        )
+                    ) <= max_distance
+                }
+
+        return [(movie_id, distance) for distance, movie_id
+                in heapq.nsmallest(limit, ((distance, movie_id)
+                                           for movie_id, distance
+                                           in distances.items()))]
+
+    @staticmethod
+    def normalize(title: str = None) -> str:
+        # Case, punctuation and repeated spaces are not typos.
+        return re.sub(r"[\W_]+", " ", title.casefold()).strip()
+
+    def __match_word(self, word: str = None) -> Dict[str, int]:
+        # Vocabulary words within the allowed distance of word. A word
+        # within d edits lacks at most 3 * d of the trigrams of word, which
+        # rules out most candidates before computing any distance. A swap
+        # can change four trigrams, so words one swap away are looked up
+        # directly instead.
+        if len(word) < self.MIN_TYPO_LENGTH and word in self.__words:
+            return {word: 0}
+        max_distance = max(1, int(len(word) * self.DISTANCE_RATIO))
+        grams = self.__get_grams(word=word)
+        required = len(grams) - self.GRAM_SIZE * max_distance
+        lengths = range(len(word) - max_distance,
+                        len(word) + max_distance + 1)
+        counts = collections.Counter()
+        for gram in grams:
+            counts.update(self.__grams.get(gram, ()))
+        candidates = {candidate for candidate, count in counts.items()
+                      if count >= required and len(candidate) in lengths}
+        for index in range(len(word) - 1):
+            swapped = word[:index] + word[index + 1] + word[index] + \
+                word[index + 2:]
+            if swapped in self.__words:
+                candidates.add(swapped)
+        close_words = {}
+        for candidate in candidates:
+            distance = self.__get_distance(term=word, title=candidate,
+                                           max_distance=max_distance)
+            if distance <= max_distance:
+                close_words[candidate] = distance
+        return close_words
+
+    @staticmethod
+    def __get_group_distance(group: List[Tuple[array.array, int]] = None,
+                             movie_id: int = None) -> int:
+        # The smallest distance of the words of group in the title.
+        closest = None
+        for posting, distance in group:
+            if closest is not None and closest <= distance:
+                continue
+            index = bisect.bisect_left(posting, movie_id)
+            if index < len(posting) and posting[index] == movie_id:
+                closest = distance
+        return closest
+
+    @classmethod
+    def __get_grams(cls, word: str = None) -> Set[str]:
+        padded = f" {word} "
+        return {padded[index:index + cls.GRAM_SIZE]
+                for index in range(len(padded) - cls.GRAM_SIZE + 1)}
+
+    @staticmethod
+    def __get_distance(term: str = None, title: str = None,
+                       max_distance: int = None) -> int:
+        # Optimal string alignment distance, Levenshtein with swaps of two
+        # neighbouring characters as one edit, row by row over the term.
+        # Only cells within max_distance of the diagonal can stay within
+        # max_distance, the others are capped at max_distance + 1, which
+        # is also returned once a whole row exceeds max_distance.
+        outside = max_distance + 1
+        if abs(len(term) - len(title)) > max_distance:
+            return outside
+        width = len(title)
+        before = None
+        previous = [column if column <= max_distance else outside
+                    for column in range(width + 1)]
+        for row, term_char in enumerate(term, 1):
+            current = [outside] * (width + 1)
+            if row <= max_distance:
+                current[0] = row
+            low = max(1, row - max_distance)
+            high = min(width, row + max_distance)
+            for column in range(low, high + 1):
+                distance = min(
+                    previous[column] + 1, current[column - 1] + 1,
+                    previous[column - 1] + (term_char != title[column - 1])
+                )
+                if row > 1 and column > 1 and \
+                        term_char == title[column - 2] and \
+                        term[row - 2] == title[column - 1]:
+                    distance = min(distance, before[column - 2] + 1)
+                current[column] = distance
+            if min(current[low - 1:high + 1]) > max_distance:
+                return outside
+            before = previous
+            previous = current
+        return min(previous[-1], outside)
@@ -1,6 +1,6 @@
 import datetime
 
-import pytz
+from modules.timezones import TimezoneService
 
 
 class Utilities:
@@ -8,7 +8,6 @@ class Utilities:
     @staticmethod
     def convert_date_time_local_to_utc(
         local_dt: datetime.datetime = None,
-        timezone: pytz.BaseTzInfo = None
+        timezone: datetime.tzinfo = None
     ) -> datetime.datetime:
-        utc_dt = timezone.localize(local_dt).astimezone(pytz.utc)
-        return utc_dt
+        return TimezoneService.to_utc(local_dt=local_dt, timezone=timezone)
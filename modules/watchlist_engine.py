@@ -0,0 +1,349 @@
+import array
+import bisect
+import collections
+import itertools
+import operator
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from modules.database_listener import DatabaseListener
+
+
+class Record:
+
+    # Rows held in memory, with the part of the sqlite3.Row interface the
+    # callers of Database select methods use.
+    __slots__ = ()
+
+    def keys(self) -> List[str]:
+        return list(self.__slots__)
+
+    def __getitem__(self, key: Union[int, str] = None):
+        if isinstance(key, int):
+            key = self.__slots__[key]
+        return getattr(self, key)
+
+
+class UserRecord(Record):
+
+    __slots__ = ("id", "username")
+
+    def __init__(self, id_: int = None, username: str = None):
+        self.id = id_
+        self.username = username
+
+
+class MovieRecord(Record):
+
+    __slots__ = ("id", "title", "release_timestamp", "release_date")
+
+    def __init__(self, id_: int = None, title: str = None,
+                 release_timestamp: float = None,
+                 release_date: Optional[str] = None):
+        self.id = id_
+        self.title = title
+        self.release_timestamp = release_timestamp
+        self.release_date = release_date
+
+
+class Adjacency:
+
+    # Pending edges are merged into the rows once there are this many
+    # relative to the compressed ones.
+    COMPACT_RATIO = 0.125
+    MIN_COMPACT_SIZE = 4096
+
+    # Compressed sparse rows, the targets of source s are the sorted slice
+    # targets[offsets[s]:offsets[s + 1]] of one int64 array. Sources are
+    # ids, so a row is found without hashing and costs 8 bytes per source
+    # and per edge. Added edges wait in small sorted arrays per source
+    # until compact merges them in.
+
+    def __init__(self, offsets: Optional[array.array] = None,
+                 targets: Optional[array.array] = None):
+        self.__offsets = array.array("q", [0]) if offsets is None \
+            else offsets
+        self.__targets = array.array("q") if targets is None else targets
+        self.__pending: Dict[int, array.array] = {}
+        self.__pending_size = 0
+
+    @classmethod
+    def from_edges(cls, sources: array.array = None,
+                   targets: array.array = None,
+                   size: int = None) -> "Adjacency":
+        # Sources are below size. Edges of a source have to come sorted by
+        # target, the stable sort by source keeps them that way. Counting,
+        # checking and sorting run in C, only the offsets loop over the
+        # sources is python.
+        counts = collections.Counter(sources)
+        offsets = array.array("q", [0]) * (size + 1)
+        total = 0
+        for source in range(size):
+            total += counts[source]
+            offsets[source + 1] = total
+        if not all(map(operator.le, sources,
+                       itertools.islice(sources, 1, None))):
+            order = sorted(range(len(sources)), key=sources.__getitem__)
+            targets = array.array("q", map(targets.__getitem__, order))
+        return cls(offsets=offsets, targets=targets)
+
+    def __len__(self) -> int:
+        return len(self.__targets) + self.__pending_size
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.__offsets) + \
+            sys.getsizeof(self.__targets) + \
+            sys.getsizeof(self.__pending) + \
+            sum(sys.getsizeof(row) for row in self.__pending.values())
+
+    def neighbours(self, source: int = None) -> List[int]:
+        row = self.__get_row(source=source)
+        pending = self.__pending.get(source)
+        if pending is None:
+            return row.tolist()
+        return sorted(row + pending)
+
+    def contains(self, source: int = None, target: int = None) -> bool:
+        if source + 1 < len(self.__offsets):
+            low = self.__offsets[source]
+            high = self.__offsets[source + 1]
+            index = bisect.bisect_left(self.__targets, target, low, high)
+            if index < high and self.__targets[index] == target:
+                return True
+        return target in self.__pending.get(source, ())
+
+    def add(self, source: int = None, target: int = None) -> None:
+        pending = self.__pending.get(source)
+        if pending is None:
+            pending = self.__pending[source] = array.array("q")
+        pending.insert(bisect.bisect(pending, target), target)
+        self.__pending_size += 1
+        if self.__pending_size > max(self.MIN_COMPACT_SIZE,
+                                     self.COMPACT_RATIO *
+                                     len(self.__targets)):
+            self.compact()
+
+    def compact(self) -> None:
+        # Copies every row slice once, the python loop is over sources and
+        # not over edges.
+        if not self.__pending:
+            return None
+        size = max(len(self.__offsets) - 1, max(self.__pending) + 1)
+        offsets = array.array("q", [0]) * (size + 1)
+        targets = array.array("q")
+        for source in range(size):
+            row = self.__get_row(source=source)
+            pending = self.__pending.get(source)
+            if pending is not None:
+                row = array.array("q", sorted(row + pending))
+            targets.extend(row)
+            offsets[source + 1] = len(targets)
+        self.__offsets = offsets
+        self.__targets = targets
+        self.__pending = {}
+        self.__pending_size = 0
+
+    def __get_row(self, source: int = None) -> array.array:
+        if source + 1 >= len(self.__offsets):
+            return array.array("q")
+        return self.__targets[self.__offsets[source]:
+                              self.__offsets[source + 1]]
+
+
+class WatchlistEngine(DatabaseListener):
+
+    # Watch events are read from the database this many at a time.
+    BUILD_CHUNK_SIZE = 10000
+
+    # Answers who watched what from memory. watch_list is held as
+    # compressed sparse rows in both directions, user to movies and movie
+    # to users, and users and movies as slotted records in lists indexed
+    # by id, with name lookups resolving to the lowest id like the
+    # database does. Loaded from the database in one pass and kept up to
+    # date by its events afterwards.
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__built = False
+        self.__users: List[Optional[UserRecord]] = []
+        self.__movies: List[Optional[MovieRecord]] = []
+        self.__user_ids: Dict[str, int] = {}
+        self.__movie_ids: Dict[str, int] = {}
+        self.__user_movies = Adjacency()
+        self.__movie_users = Adjacency()
+
+    @property
+    def built(self) -> bool:
+        return self.__built
+
+    def build(self, users: Iterable[Tuple[int, str]] = None,
+              movies: Iterable[Tuple[int, str, float, Optional[str]]] = None,
+              watched_movies: Iterable[Tuple[int, int]] = None) -> None:
+        # Users and movies have to come in id order and watched movies in
+        # (user id, movie id) order, rows then come out sorted.
+        user_records = []
+        user_ids = {}
+        for user_id, username in users:
+            self.__put(records=user_records, id_=user_id,
+                       record=UserRecord(id_=user_id, username=username))
+            user_ids.setdefault(username, user_id)
+        movie_records = []
+        movie_ids = {}
+        for movie_id, title, release_timestamp, release_date in movies:
+            self.__put(records=movie_records, id_=movie_id,
+                       record=MovieRecord(
+                           id_=movie_id, title=title,
+                           release_timestamp=release_timestamp,
+                           release_date=release_date
+                       ))
+            movie_ids.setdefault(title, movie_id)
+        user_column = array.array("q")
+        movie_column = array.array("q")
+        watched_movies = iter(watched_movies)
+        while chunk := list(itertools.islice(watched_movies,
+                                             self.BUILD_CHUNK_SIZE)):
+            user_column.extend(map(operator.itemgetter(0), chunk))
+            movie_column.extend(map(operator.itemgetter(1), chunk))
+        # Foreign keys are not enforced, rows may point at missing ids.
+        user_movies = Adjacency.from_edges(
+            sources=user_column, targets=movie_column,
+            size=max(len(user_records), max(user_column, default=-1) + 1)
+        )
+        movie_users = Adjacency.from_edges(
+            sources=movie_column, targets=user_column,
+            size=max(len(movie_records), max(movie_column, default=-1) + 1)
+        )
+        with self.__lock:
+            self.__users = user_records
+            self.__movies = movie_records
+            self.__user_ids = user_ids
+            self.__movie_ids = movie_ids
+            self.__user_movies = user_movies
+            self.__movie_users = movie_users
+            self.__built = True
+
+    def on_user_inserted(self, user_id: int = None,
+                         username: str = None) -> None:
+        with self.__lock:
+            if not self.__built:
+                return None
+            self.__put(records=self.__users, id_=user_id,
+                       record=UserRecord(id_=user_id, username=username))
+            self.__user_ids.setdefault(username, user_id)
+
+    def on_movie_inserted(self, movie_id: int = None, title: str = None,
+                          release_timestamp: float = None,
+                          release_date: Optional[str] = None) -> None:
+        with self.__lock:
+            if not self.__built:
+                return None
+            self.__put(records=self.__movies, id_=movie_id,
+                       record=MovieRecord(
+                           id_=movie_id, title=title,
+                           release_timestamp=release_timestamp,
+                           release_date=release_date
+                       ))
+            self.__movie_ids.setdefault(title, movie_id)
+
+    def on_watched_movie_inserted(self, user_id: int = None,
+                                  movie_id: int = None) -> None:
+        with self.__lock:
+            if not self.__built:
+                return None
+            self.__user_movies.add(source=user_id, target=movie_id)
+            self.__movie_users.add(source=movie_id, target=user_id)
+
+    def on_reset(self) -> None:
+        with self.__lock:
+            self.__built = False
+            self.__users = []
+            self.__movies = []
+            self.__user_ids = {}
+            self.__movie_ids = {}
+            self.__user_movies = Adjacency()
+            self.__movie_users = Adjacency()
+
+    def get_user_id(self, username: str = None) -> Optional[int]:
+        return self.__user_ids.get(username)
+
+    def get_movie_id(self, title: str = None) -> Optional[int]:
+        return self.__movie_ids.get(title)
+
+    def has_watched(self, user_id: int = None, movie_id: int = None) -> bool:
+        with self.__lock:
+            return self.__user_movies.contains(source=user_id,
+                                               target=movie_id)
+
+    def select_user_movies(self, user_id: int = None,
+                           order_by: Optional[str] = None,
+                           ascending: bool = True) -> List[MovieRecord]:
+        # Ordered like the database orders them, by title or release date
+        # with unknown dates first, or by id without order_by.
+        with self.__lock:
+            movies = [self.__get_record(records=self.__movies, id_=movie_id)
+                      for movie_id
+                      in self.__user_movies.neighbours(source=user_id)]
+        movies = [movie for movie in movies if movie is not None]
+        if order_by == "title":
+            movies.sort(key=(lambda movie: (movie.title, movie.id)),
+                        reverse=not ascending)
+        elif order_by == "date":
+            movies.sort(key=(lambda movie: (
+                movie.release_timestamp is not None,
+                movie.release_timestamp or 0.0, movie.id
+            )), reverse=not ascending)
+        return movies
+
+    def select_movie_users(self, movie_id: int = None) -> List[UserRecord]:
+        # Watchers by username.
+        with self.__lock:
+            users = [self.__get_record(records=self.__users, id_=user_id)
+                     for user_id
+                     in self.__movie_users.neighbours(source=movie_id)]
+        users = [user for user in users if user is not None]
+        users.sort(key=(lambda user: user.username))
+        return users
+
+    def get_memory_usage(self) -> Dict[str, int]:
+        # Approximate bytes held, strings and numbers of the records
+        # included.
+        with self.__lock:
+            records = [record for records in (self.__users, self.__movies)
+                       for record in records if record is not None]
+            records_bytes = sys.getsizeof(self.__users) + \
+                sys.getsizeof(self.__movies) + sum(
+                    sys.getsizeof(record) +
+                    sum(sys.getsizeof(getattr(record, name))
+                        for name in record.__slots__
+                        if getattr(record, name) is not None)
+                    for record in records
+                )
+            names_bytes = sys.getsizeof(self.__user_ids) + \
+                sys.getsizeof(self.__movie_ids)
+            adjacency_bytes = self.__user_movies.nbytes + \
+                self.__movie_users.nbytes
+            return {
+                "users": len(self.__user_ids),
+                "movies": len(self.__movies) - self.__movies.count(None),
+                "watch_events": len(self.__user_movies),
+                "records_bytes": records_bytes,
+                "names_bytes": names_bytes,
+                "adjacency_bytes": adjacency_bytes,
+                "total_bytes": records_bytes + names_bytes +
+                adjacency_bytes,
+            }
+
+    @staticmethod
+    def __get_record(records: List[Optional[Record]] = None,
+                     id_: int = None) -> Optional[Record]:
+        return records[id_] if id_ < len(records) else None
+
+    @staticmethod
+    def __put(records: List[Optional[Record]] = None, id_: int = None,
+              record: Record = None) -> None:
+        # Ids are dense apart from deleted or skipped ones, which are None.
+        if id_ >= len(records):
+            records.extend([None] * (id_ + 1 - len(records)))
+        records[id_] = record
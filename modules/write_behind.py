@@ -0,0 +1,134 @@
+import atexit
+import queue
+import sys
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from modules.lazy_import import LazyImport
+
+# concurrent.futures loads logging, it is only needed once an event is
+# submitted for commit.
+Future = LazyImport("concurrent.futures", "Future")
+
+
+class WriteBehindQueue:
+
+    DEFAULT_MAX_BATCH_SIZE = 1000
+    DEFAULT_MAX_DELAY_MS = 20
+    DEFAULT_MAX_QUEUE_SIZE = 100000
+    # "commit" returns once the event is committed, "queue" as soon as it
+    # is queued, losing queued events if the process dies.
+    DURABILITY_LEVELS = ("commit", "queue")
+
+    # Queue markers, stopping the writer and writing the current batch
+    # without waiting for it to fill up.
+    __STOP = "stop"
+    __FLUSH = "flush"
+
+    # Events are written by a background thread in one transaction per
+    # batch, a batch is written when it is full or its first event waited
+    # max_delay_ms. Concurrent writers share a commit instead of paying for
+    # one each.
+
+    def __init__(self, write: Callable[[List[Tuple]], List[bool]] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_delay_ms: float = DEFAULT_MAX_DELAY_MS,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 durability: str = "commit"):
+        if durability not in self.DURABILITY_LEVELS:
+            raise ValueError(
+                f"Invalid write-behind durability {durability!r}, expected "
+                f"one of {', '.join(self.DURABILITY_LEVELS)}"
+            )
+        self.__write = write
+        self.__max_batch_size = max(max_batch_size, 1)
+        self.__max_delay = max_delay_ms / 1000
+        self.__durability = durability
+        # A full queue blocks producers until the writer catches up.
+        self.__queue = queue.Queue(maxsize=max_queue_size)
+        self.__thread = threading.Thread(target=self.__run,
+                                         name="write-behind", daemon=True)
+        # Events are queued under the lock close takes, so none can land
+        # behind the stop marker and never be written.
+        self.__lock = threading.Lock()
+        self.__closed = False
+
+    def start(self) -> None:
+        self.__thread.start()
+        # Queued events are written before the interpreter exits, even
+        # when the database is never closed.
+        atexit.register(self.close)
+
+    def submit(self, event: Tuple = None) -> bool:
+        future = None if self.__durability == "queue" else Future()
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError("The write-behind queue is closed")
+            self.__queue.put((event, future))
+        if future is None:
+            return True
+        return future.result()
+
+    def flush(self) -> None:
+        # Waits until every event queued so far is written.
+        self.__queue.put(self.__FLUSH)
+        self.__queue.join()
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__closed:
+                return None
+            self.__closed = True
+            self.__queue.put(self.__STOP)
+        atexit.unregister(self.close)
+        self.__thread.join()
+
+    def __run(self) -> None:
+        batch = []
+        deadline = None
+        while True:
+            # Waits for the first event of a batch and until the deadline
+            # for the others, item is None once the deadline passed.
+            timeout = None if not batch else \
+                max(deadline - time.monotonic(), 0)
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is None or item is self.__FLUSH or item is self.__STOP:
+                if batch:
+                    self.__write_batch(batch=batch)
+                    batch = []
+                if item is not None:
+                    self.__queue.task_done()
+                if item is self.__STOP:
+                    return None
+                continue
+
+            if not batch:
+                deadline = time.monotonic() + self.__max_delay
+            batch.append(item)
+            if len(batch) >= self.__max_batch_size:
+                self.__write_batch(batch=batch)
+                batch = []
+
+    def __write_batch(self,
+                      batch: List[Tuple[Tuple, Optional["Future"]]] = None
+                      ) -> None:
+        try:
+            results = self.__write([event for event, _ in batch])
+        except Exception as error:
+            print(f"Failed to write {len(batch)} queued events: {error}",
+                  file=sys.stderr)
+            for _, future in batch:
+                if future is not None:
+                    future.set_exception(error)
+        else:
+            for (_, future), result in zip(batch, results):
+                if future is not None:
+                    future.set_result(result)
+        finally:
+            for _ in batch:
+                self.__queue.task_done()